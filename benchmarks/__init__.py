@@ -0,0 +1,9 @@
+"""
+Offline benchmarks for the app's LLM plumbing.
+
+`benchmarks.mock_server` is a local OpenAI-compatible server with tunable
+latency, token rate and error injection; `python -m benchmarks` drives
+query_llm and the project prompt builders against it at increasing
+concurrency and saves the results as JSON, so runs on different commits
+can be compared with `python -m benchmarks compare`.
+"""
@@ -0,0 +1,148 @@
+"""
+Command line for the benchmarks.
+
+    python -m benchmarks run --levels 1,4,16,64 --requests 128
+    python -m benchmarks run --latency 0.5 --token-rate 30 --throttle-rate 0.05
+    python -m benchmarks compare benchmarks/results/old.json benchmarks/results/new.json
+
+`run` starts a mock server (or uses --endpoint), runs the scenarios and
+writes a JSON file, with the prompt tokens the mock's prefix cache saved
+per scenario; `compare` prints the change between two such files and
+exits with 1 if throughput or p95 latency got worse than --threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from benchmarks import mock_server, scenarios
+from krikri import admission, cache, hedging, metrics, singleflight
+
+def run(args) -> int:
+    # Measure the plumbing, not the limits it is configured with (unless asked to)
+    if not args.rate_limit:
+        admission.configure(enabled=False)
+    cache.configure(enabled=args.cache, path="")
+    hedging.configure(enabled=False)
+    singleflight.configure(enabled=not args.no_coalesce)
+
+    server = None
+    api_endpoint = args.endpoint
+    if not api_endpoint:
+        settings = {name: getattr(args, name) for name in mock_server.DEFAULTS}
+        server = mock_server.MockServer(**settings).start()
+        api_endpoint = server.url
+
+    run_id = uuid.uuid4().hex[:8]
+    report = {
+        "commit": scenarios.git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "endpoint": "mock" if server else api_endpoint,
+        "mock": server.settings if server else None,
+        "app": {"rate_limit": args.rate_limit, "cache": args.cache, "coalesce": not args.no_coalesce},
+        "registry": scenarios.time_registry(),
+        "prompt_builders_us": scenarios.time_prompt_builders(),
+        "scenarios": {},
+        "prefill": {},
+    }
+
+    try:
+        scenarios.warm_up(args.api_key, api_endpoint)
+        for scenario in args.scenarios.split(","):
+            print(f"{scenario}:")
+            cache.clear()
+            metrics.reset()
+            before = dict(server.stats) if server else None
+            report["scenarios"][scenario] = scenarios.run_scenario(
+                scenario, [int(level) for level in args.levels.split(",")], args.requests,
+                args.api_key, api_endpoint, run_id, on_level=print_level)
+            if server is not None:
+                report["prefill"][scenario] = prefill(before, server.stats)
+                print_prefill(report["prefill"][scenario])
+    finally:
+        if server is not None:
+            server.stop()
+    report["metrics"] = metrics.snapshot()
+
+    output = args.output or scenarios.RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Results written to {output}")
+    return 0
+
+
+def print_level(result: dict):
+    latency = result["latency"] or {}
+    ttft = f", first token p50 {result['ttft']['p50'] * 1000:.0f}ms" if result["ttft"] else ""
+    print(f"  x{result['concurrency']:<4} {result['throughput']:8.1f} req/s  "
+          f"p50 {latency.get('p50', 0) * 1000:.0f}ms  p95 {latency.get('p95', 0) * 1000:.0f}ms  "
+          f"p99 {latency.get('p99', 0) * 1000:.0f}ms{ttft}  {result['errors']} errors  "
+          f"{result['memory_per_session_kb']:.0f} KB/session")
+
+
+def prefill(before: dict, after: dict) -> dict:
+    # Prompt tokens the mock received during a scenario, and how many its prefix cache served
+    prompt_tokens = after["prompt_tokens"] - before["prompt_tokens"]
+    cached = after["cached_prompt_tokens"] - before["cached_prompt_tokens"]
+    return {"prompt_tokens": prompt_tokens, "cached_prompt_tokens": cached,
+            "saved": round(cached / prompt_tokens, 3) if prompt_tokens else 0.0}
+
+
+def print_prefill(result: dict):
+    print(f"  prefill: {result['prompt_tokens']} prompt tokens, {result['cached_prompt_tokens']} "
+          f"from the prefix cache ({result['saved']:.0%} saved)")
+
+
+def compare(args) -> int:
+    old = json.loads(args.old.read_text(encoding="utf-8"))
+    new = json.loads(args.new.read_text(encoding="utf-8"))
+    print(f"{old['commit']} -> {new['commit']}")
+    regressions = 0
+    for scenario, levels in new["scenarios"].items():
+        before = {level["concurrency"]: level for level in old["scenarios"].get(scenario, [])}
+        for level in levels:
+            previous = before.get(level["concurrency"])
+            if previous is None or not previous["latency"] or not level["latency"]:
+                continue
+            throughput = level["throughput"] / previous["throughput"] - 1 if previous["throughput"] else 0.0
+            p95 = level["latency"]["p95"] / previous["latency"]["p95"] - 1 if previous["latency"]["p95"] else 0.0
+            worse = throughput < -args.threshold or p95 > args.threshold
+            regressions += worse
+            print(f"  {scenario:<10} x{level['concurrency']:<4} throughput {throughput:+.1%}  p95 {p95:+.1%}"
+                  f"{'  REGRESSION' if worse else ''}")
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the LLM plumbing offline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the scenarios and save the results")
+    run_parser.add_argument("--scenarios", default=",".join(scenarios.SCENARIOS),
+                            help=f"Comma-separated, from: {', '.join(scenarios.SCENARIOS)}")
+    run_parser.add_argument("--levels", default="1,4,16,64", help="Comma-separated concurrency levels")
+    run_parser.add_argument("--requests", type=int, default=128, help="Requests per level")
+    run_parser.add_argument("--output", type=Path, default=None)
+    run_parser.add_argument("--endpoint", default="", help="Benchmark this endpoint instead of the mock server")
+    run_parser.add_argument("--api-key", default="benchmark")
+    run_parser.add_argument("--rate-limit", action="store_true", help="Keep the app's admission limits on")
+    run_parser.add_argument("--cache", action="store_true", help="Keep the response cache on (in memory)")
+    run_parser.add_argument("--no-coalesce", action="store_true", help="Turn off request coalescing")
+    mock_server.add_arguments(run_parser)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old", type=Path)
+    compare_parser.add_argument("new", type=Path)
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
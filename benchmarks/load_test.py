@@ -0,0 +1,349 @@
+"""
+Multi-user load test of the Streamlit app, end to end.
+
+Starts `streamlit run streamlit_app.py` as a separate process, pointed at
+the mock server through a temporary secrets file, and connects N simulated
+users to it over the same websocket protocol the browser uses. Each user
+picks a page, fills its inputs and clicks its button, with some think time
+in between, and every rerun is timed from the message that triggers it to
+the server's "script finished".
+
+The number of users is raised level by level. For each level the report
+has the reruns per second, rerun latency and payload by kind (navigate,
+input, generate), the server's CPU use and its memory per session, and
+the run ends with the saturation point: the last level before throughput
+stopped growing or navigation p95 broke the SLO.
+
+    python -m benchmarks.load_test --users 1,2,4,8,16,32 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from tornado.websocket import websocket_connect
+
+from benchmarks import mock_server
+from benchmarks.scenarios import RESULTS_DIR, git_commit, percentiles
+
+APP_PATH = Path(__file__).resolve().parent.parent / "streamlit_app.py"
+
+# What a user types into any text box they find on a page
+SAMPLE_TEXT = {"text_area": "My cat keeps sneezing after dinner, what could it be?", "text_input": "12"}
+
+
+class Session:
+    """
+    One simulated browser tab: a websocket, the widgets of the last run and
+    the values this user has set.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+        self.widgets = []   # (element type, element proto, fragment id) on screen, in order
+        self.states = {}    # widget id -> (value field, value)
+        self.connection = None
+
+    async def connect(self):
+        self.connection = await websocket_connect(self.url, subprotocols=["streamlit"])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+    async def rerun(self, trigger: str | None = None, fragment_id: str = "") -> tuple[float, bool, int]:
+        """
+        Sends the current widget values (and a button press, if any) and
+        waits for the run to finish. Like the browser, a change to a widget
+        inside a fragment reruns just that fragment. Returns the run's
+        duration, whether the page showed an exception, and the bytes the
+        server sent.
+        """
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_script_hash = ""
+        message.rerun_script.fragment_id = fragment_id
+        for widget_id, (field, value) in self.states.items():
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            setattr(state, field, value)
+        if trigger is not None:
+            state = message.rerun_script.widget_states.widgets.add()
+            state.id = trigger
+            state.trigger_value = True
+
+        started = time.perf_counter()
+        await self.connection.write_message(message.SerializeToString(), binary=True)
+        widgets = []
+        failed = False
+        received = 0
+        while True:
+            data = await asyncio.wait_for(self.connection.read_message(), self.timeout)
+            if data is None:
+                raise ConnectionError("The server closed the websocket")
+            received += len(data)
+            incoming = ForwardMsg()
+            incoming.ParseFromString(data)
+            kind = incoming.WhichOneof("type")
+            if kind == "delta" and incoming.delta.WhichOneof("type") == "new_element":
+                element = incoming.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    failed = True
+                elif element_type in ("radio", "text_input", "text_area", "button"):
+                    widgets.append((element_type, getattr(element, element_type), incoming.delta.fragment_id))
+            elif kind == "script_finished":
+                if incoming.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if incoming.script_finished == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY:
+                    # Only the fragment was redrawn; the rest of the page stays as it was
+                    widgets = [widget for widget in self.widgets if widget[2] != fragment_id] + widgets
+                self.widgets = widgets
+                return time.perf_counter() - started, failed, received
+
+    def find(self, element_type: str) -> list[tuple]:
+        """
+        The enabled widgets of a type, as (proto, fragment id) pairs.
+        """
+        return [(proto, fragment_id) for kind, proto, fragment_id in self.widgets
+                if kind == element_type and not getattr(proto, "disabled", False)]
+
+
+async def simulate_user(url: str, deadline: float, think: float, timeout: float, samples: list,
+                        rng: random.Random):
+    """
+    One user: opens the app, then navigates, types and generates until the
+    deadline. Appends (kind, seconds, failed, bytes) per rerun to `samples`.
+    """
+    session = Session(url, timeout)
+    try:
+        await session.connect()
+        samples.append(("open", *await session.rerun()))
+        while time.monotonic() < deadline:
+            pages = session.find("radio")
+            if not pages:
+                break
+            selector, _ = pages[0]
+            session.states[selector.id] = ("int_value", rng.randrange(len(selector.options)))
+            samples.append(("navigate", *await session.rerun()))
+
+            for kind in ("text_area", "text_input"):
+                for box, fragment_id in session.find(kind):
+                    await asyncio.sleep(rng.expovariate(1 / think) if think else 0)
+                    session.states[box.id] = ("string_value", SAMPLE_TEXT[kind])
+                    samples.append(("input", *await session.rerun(fragment_id=fragment_id)))
+
+            buttons = session.find("button")
+            if buttons:
+                button, fragment_id = buttons[0]
+                await asyncio.sleep(rng.expovariate(1 / think) if think else 0)
+                samples.append(("generate", *await session.rerun(trigger=button.id, fragment_id=fragment_id)))
+            await asyncio.sleep(rng.expovariate(1 / think) if think else 0)
+    except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+        samples.append(("error", timeout, True, 0))
+        print(f"    user disconnected: {e!r}")
+    finally:
+        session.close()
+
+
+async def warm_up(url: str, timeout: float):
+    """
+    Visits every page once, so imports and per-process caches are not
+    billed to the first level.
+    """
+    session = Session(url, timeout)
+    try:
+        await session.connect()
+        await session.rerun()
+        selector, _ = session.find("radio")[0]
+        for index in range(len(selector.options)):
+            session.states[selector.id] = ("int_value", index)
+            await session.rerun()
+    finally:
+        session.close()
+
+
+async def run_level(url: str, users: int, duration: float, think: float, timeout: float,
+                    server_pid: int, seed: int) -> dict:
+    samples = []
+    rng = random.Random(seed)
+    rss_before = _rss(server_pid)
+    rss_peak = rss_before
+
+    async def sample_rss():
+        # Sessions are released when users disconnect, so the peak is taken while they are connected
+        nonlocal rss_peak
+        while True:
+            await asyncio.sleep(0.25)
+            rss_peak = max(rss_peak or 0, _rss(server_pid) or 0)
+
+    sampler = asyncio.ensure_future(sample_rss())
+    cpu_before = _cpu_seconds(server_pid)
+    started = time.perf_counter()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(simulate_user(url, deadline, think, timeout, samples, random.Random(rng.random()))
+                           for _ in range(users)))
+    elapsed = time.perf_counter() - started
+    cpu_after = _cpu_seconds(server_pid)
+    sampler.cancel()
+
+    by_kind = {}
+    received = {}
+    for kind, seconds, _, nbytes in samples:
+        by_kind.setdefault(kind, []).append(seconds)
+        received.setdefault(kind, []).append(nbytes)
+    return {
+        "users": users,
+        "reruns": len(samples),
+        "errors": sum(failed for _, _, failed, _ in samples),
+        "elapsed": round(elapsed, 3),
+        "reruns_per_second": round(len(samples) / elapsed, 2),
+        "latency": {kind: percentiles(values) for kind, values in sorted(by_kind.items()) if kind != "error"},
+        "kb_per_rerun": {kind: round(sum(values) / len(values) / 1024, 1)
+                         for kind, values in sorted(received.items()) if kind != "error"},
+        "server_cpu_percent": (round((cpu_after - cpu_before) / elapsed * 100, 1)
+                               if cpu_before is not None and cpu_after is not None else None),
+        "server_rss_mb": round(rss_peak / 2 ** 20, 1) if rss_peak else None,
+        "server_rss_per_session_kb": (round(max(0, rss_peak - rss_before) / users / 1024, 1)
+                                      if rss_peak and rss_before else None),
+    }
+
+
+def saturation(levels: list[dict], slo: float) -> dict:
+    """
+    The last level that still scaled: reruns/s grew by at least 10% over the
+    previous level and navigation p95 stayed within `slo` seconds.
+    """
+    best = None
+    for index, level in enumerate(levels):
+        navigate = (level["latency"].get("navigate") or {}).get("p95")
+        if navigate is not None and navigate > slo:
+            return {"users": best, "reason": f"navigation p95 {navigate:.2f}s over the {slo:.2f}s SLO "
+                                             f"at {level['users']} users"}
+        if index and level["reruns_per_second"] < levels[index - 1]["reruns_per_second"] * 1.1:
+            return {"users": best, "reason": f"throughput stopped growing at {level['users']} users"}
+        best = level["users"]
+    return {"users": best, "reason": "not reached"}
+
+
+def print_level(level: dict):
+    print(f"  {level['users']:>4} users  {level['reruns_per_second']:7.1f} reruns/s  "
+          f"cpu {level['server_cpu_percent']}%  {level['server_rss_per_session_kb']} KB/session  "
+          f"{level['errors']} errors")
+    for kind, stats in level["latency"].items():
+        if stats:
+            print(f"        {kind:<9} p50 {stats['p50'] * 1000:6.0f}ms  p95 {stats['p95'] * 1000:6.0f}ms  "
+                  f"p99 {stats['p99'] * 1000:6.0f}ms  {level['kb_per_rerun'][kind]:6.1f} KB/rerun")
+
+
+def start_app(port: int, secrets_path: Path) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(APP_PATH),
+         "--server.headless", "true", "--server.port", str(port), "--server.fileWatcherType", "none",
+         "--browser.gatherUsageStats", "false", "--secrets.files", str(secrets_path)],
+        cwd=APP_PATH.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("streamlit did not become healthy within 60s")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float | None:
+    # user + system CPU time of the server process, from /proc (Linux only)
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _rss(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test",
+                                     description="Load-test the Streamlit app with simulated users.")
+    parser.add_argument("--users", default="1,2,4,8,16,32", help="Comma-separated numbers of concurrent users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per level")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean seconds between a user's actions")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds a rerun may take")
+    parser.add_argument("--slo", type=float, default=1.0, help="Navigation p95 in seconds that counts as saturated")
+    parser.add_argument("--settings", type=Path, default=None,
+                        help="TOML with extra secrets.toml sections for the app (e.g. [LLM_RATE_LIMIT])")
+    parser.add_argument("--output", type=Path, default=None)
+    mock_server.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = mock_server.MockServer(**{name: getattr(args, name) for name in mock_server.DEFAULTS}).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        secrets_path = Path(tmp) / "secrets.toml"
+        extra = args.settings.read_text(encoding="utf-8") if args.settings else ""
+        secrets_path.write_text(
+            f'[LLM_CREDENTIALS]\nAPI_KEY = "load-test"\nAPI_ENDPOINT = "{server.url}"\n\n'
+            f'[LLM_CACHE]\npath = ""\n\n{extra}', encoding="utf-8")
+        port = _free_port()
+        app = start_app(port, secrets_path)
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        levels = []
+        try:
+            asyncio.run(warm_up(url, args.timeout))
+            for users in (int(value) for value in args.users.split(",")):
+                level = asyncio.run(run_level(url, users, args.duration, args.think, args.timeout,
+                                              app.pid, args.seed + users))
+                levels.append(level)
+                print_level(level)
+        finally:
+            app.terminate()
+            app.wait(10)
+            server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "mock": server.settings,
+        "think": args.think,
+        "duration": args.duration,
+        "levels": levels,
+        "saturation": saturation(levels, args.slo),
+    }
+    print(f"Saturation: {report['saturation']['users']} users ({report['saturation']['reason']})")
+    output = args.output or RESULTS_DIR / f"load-{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+A local OpenAI-compatible server for benchmarks and offline development.
+
+It answers GET /v1/models and POST /v1/chat/completions (blocking and
+streaming, with usage) after a configurable time to first token, then
+produces tokens at a configurable rate. Requests with `n` get that many
+choices of random lengths, streamed side by side; above `max_n` they are
+rejected with a 400, as servers without `n` do. A fraction of requests can fail
+with a 500 or be throttled with a 429 and Retry-After.
+
+Like vLLM's automatic prefix caching, it remembers the prompts it has seen
+in blocks of `prefix_block` tokens: the leading blocks a request shares
+with an earlier one are reported as `usage.prompt_tokens_details.cached_tokens`
+and skip the prefill time (`prefill_rate` prompt tokens per second).
+
+Run it on its own to point the app at it:
+
+    python -m benchmarks.mock_server --port 8001 --latency 0.3 --token-rate 40
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULTS = {
+    "latency": 0.05,          # Seconds before the first token
+    "jitter": 0.0,            # Up to this many extra seconds, at random
+    "token_rate": 200.0,      # Completion tokens per second
+    "completion_tokens": 50,
+    "error_rate": 0.0,        # Fraction of requests answered with a 500
+    "throttle_rate": 0.0,     # Fraction of requests answered with a 429
+    "retry_after": 1.0,       # Retry-After of the 429s, in seconds
+    "seed": 0,
+    "prefix_block": 16,       # Tokens per prefix cache block (0: no prefix cache)
+    "prefill_rate": 0.0,      # Uncached prompt tokens processed per second (0: prefill is free)
+    "max_n": 16,              # Choices per request, at most (1: n is not supported)
+}
+# Prefix cache blocks kept, least recently used dropped first
+PREFIX_CACHE_BLOCKS = 4096
+
+WORDS = ("the", "model", "answers", "καλημέρα", "with", "a", "short", "reply", "για", "την", "τάξη")
+
+
+class MockServer:
+    """
+    The server and its settings; `stats` counts what it has answered.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **settings):
+        unknown = set(settings) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown mock server settings: {sorted(unknown)}")
+        self.settings = dict(DEFAULTS, **settings)
+        self.stats = {"requests": 0, "streamed": 0, "errors": 0, "throttled": 0, "disconnects": 0,
+                      "prompt_tokens": 0, "cached_prompt_tokens": 0}
+        self._random = random.Random(self.settings["seed"])
+        self._lock = threading.Lock()
+        self._blocks = OrderedDict()  # Chained block hash -> None, in LRU order
+        self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        threading.Thread(target=self._httpd.serve_forever, name="mock-llm", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _words(self, count: int, choices: int) -> list[list[str]]:
+        # Random answers, so that the choices of one request differ; only the first has the full length
+        with self._lock:
+            lengths = [count] + [self._random.randint(max(1, count // 2), count) for _ in range(choices - 1)]
+            return [[self._random.choice(WORDS) + " " for _ in range(length)] for length in lengths]
+
+    def _draw(self) -> tuple[str | None, float]:
+        # Decides the fate of one request: (None, ok) | ("error"|"throttle", ...), plus its delay
+        with self._lock:
+            self.stats["requests"] += 1
+            roll = self._random.random()
+            delay = self.settings["latency"] + self._random.uniform(0, self.settings["jitter"])
+            if roll < self.settings["error_rate"]:
+                self.stats["errors"] += 1
+                return "error", delay
+            if roll < self.settings["error_rate"] + self.settings["throttle_rate"]:
+                self.stats["throttled"] += 1
+                return "throttle", 0.0
+            return None, delay
+
+    def _prefill(self, messages: list[dict], answer: str = "") -> tuple[int, int]:
+        """
+        (prompt tokens, of which cached) for a request's messages, and
+        remembers its blocks, followed by those of the answer (as vLLM keeps
+        the generated ones, which a follow-up sends back). A token is a word
+        tagged with its message's role; a block matches only if every block
+        before it matched too.
+        """
+        tokens = [(message.get("role", ""), word) for message in messages
+                  for word in str(message.get("content", "")).split()]
+        prompt_tokens = len(tokens)
+        tokens += [("assistant", word) for word in answer.split()]
+        size = self.settings["prefix_block"]
+        if size <= 0:
+            return prompt_tokens, 0
+        cached, key, hit = 0, None, True
+        with self._lock:
+            # Only full blocks are cached, and the last token is always computed
+            for start in range(0, len(tokens) - size, size):
+                key = hash((key, tuple(tokens[start:start + size])))
+                if hit and key in self._blocks and start + size < prompt_tokens:
+                    cached += size
+                    self._blocks.move_to_end(key)
+                    continue
+                hit = False
+                self._blocks[key] = None
+                if len(self._blocks) > PREFIX_CACHE_BLOCKS:
+                    self._blocks.popitem(last=False)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["cached_prompt_tokens"] += cached
+        return prompt_tokens, cached
+
+
+def _handler(server: MockServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client closed the connection between requests
+
+        def do_GET(self):
+            if not self.path.rstrip("/").endswith("/models"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            self._json(200, {"object": "list", "data": [
+                {"id": "krikri-dpo-context", "object": "model", "created": 0, "owned_by": "mock"}]})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": {"message": "not found"}})
+                return
+
+            n = int(request.get("n") or 1)
+            if n > server.settings["max_n"]:
+                self._json(400, {"error": {"message": f"n must be at most {server.settings['max_n']} (mock)"}})
+                return
+            fate, delay = server._draw()
+            if fate == "throttle":
+                self._json(429, {"error": {"message": "Rate limit exceeded (mock)"}},
+                           {"Retry-After": f"{server.settings['retry_after']:g}"})
+                return
+            if fate == "error":
+                time.sleep(delay)
+                self._json(500, {"error": {"message": "Internal error (mock)"}})
+                return
+
+            count = min(server.settings["completion_tokens"], request.get("max_tokens") or 10 ** 9)
+            # Only the first choice has the full length, so only it can be cut off
+            finish_reason = "length" if count < server.settings["completion_tokens"] else "stop"
+            choices = server._words(count, n)
+            prompt_tokens, cached = server._prefill(request.get("messages", []), "".join(choices[0]))
+            if server.settings["prefill_rate"] > 0:
+                delay += (prompt_tokens - cached) / server.settings["prefill_rate"]
+            if request.get("stream"):
+                self._start_stream()  # Like real servers, before the first token is ready
+            time.sleep(delay)
+            completion_tokens = sum(len(tokens) for tokens in choices)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens,
+                     "prompt_tokens_details": {"cached_tokens": cached}}
+            if request.get("stream"):
+                with server._lock:
+                    server.stats["streamed"] += 1
+                self._stream(request, choices, usage, finish_reason)
+                return
+            time.sleep(count / server.settings["token_rate"])
+            self._json(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", ""),
+                "choices": [{"index": index, "finish_reason": finish_reason if index == 0 else "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}
+                            for index, tokens in enumerate(choices)],
+                "usage": usage,
+            })
+
+        def _start_stream(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+
+        def _stream(self, request: dict, choices: list[list[str]], usage: dict, finish_reason: str):
+            base = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": request.get("model", "")}
+            pause = 1 / server.settings["token_rate"]
+            try:
+                # One token of every unfinished choice per step; each choice ends right after its last token
+                for step in range(max(len(tokens) for tokens in choices)):
+                    if step:
+                        time.sleep(pause)
+                    for index, tokens in enumerate(choices):
+                        if step < len(tokens):
+                            self._event(dict(base, choices=[
+                                {"index": index, "delta": {"content": tokens[step]}, "finish_reason": None}]))
+                        if step == len(tokens) - 1:
+                            reason = finish_reason if index == 0 else "stop"
+                            self._event(dict(base, choices=[{"index": index, "delta": {}, "finish_reason": reason}]))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._event(dict(base, choices=[], usage=usage))
+                self._chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading: a cancelled answer or the losing attempt of a hedged request
+                with server._lock:
+                    server.stats["disconnects"] += 1
+                self.close_connection = True
+
+        def _event(self, payload: dict):
+            self._chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _json(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds one --option per mock server setting (shared with the benchmark CLI).
+    """
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=type(default), default=default)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = vars(parser.parse_args(argv))
+    server = MockServer(args.pop("host"), args.pop("port"), **args)
+    print(f"Mock server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
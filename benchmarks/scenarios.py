@@ -0,0 +1,259 @@
+"""
+Benchmark scenarios: each one sends `requests` calls through the app's
+LLM plumbing with `concurrency` simulated sessions, and measures latency,
+throughput and memory.
+"""
+import itertools
+import os
+import statistics
+import subprocess
+import threading
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import projects
+from krikri import batch
+from krikri.llm import current_session, query_llm, query_llm_stream
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Minimal inputs for every prompt builder; the rest use their defaults
+SAMPLE_INPUTS = {
+    "project_symptom_explainer": {"symptoms_input": "headache and a runny nose"},
+    "ideal_sport_advisor": {"info": "I like running and being outdoors"},
+    "project_how_to_persuade_my_parents": {"my_desire": "a new bicycle"},
+    "dress_code": {"occasion": "a wedding"},
+    "project_coding_assistant": {"user_input": "def add(a, b):\n    return a + b"},
+    "project_translator": {"text": "Καλημέρα σε όλους"},
+    "project_jokes": {"text": "cats"},
+    "project_orderlist": {"text": "milk, bread, eggs"},
+    "project_concept_explainer": {"topic_input": "photosynthesis"},
+    "zodiac_signs": {"situation": "a new school year"},
+    "project_excuse_generator": {"situation": "I forgot my homework"},
+    "music_recommendator": {},
+    "project_christmas_wishlist": {"age": "10-15"},
+}
+
+
+def time_prompt_builders(number: int = 2000) -> dict:
+    """
+    Microseconds per call of every project's prompt builder.
+    """
+    return {
+        project: round(timeit.timeit(lambda: builder(**SAMPLE_INPUTS[project]), number=number) / number * 1e6, 2)
+        for project, builder in _prompt_builders().items()
+    }
+
+
+def time_registry() -> dict:
+    """
+    Milliseconds spent reading the project metadata and importing each project.
+    """
+    started = time.perf_counter()
+    plugins = projects.discover()
+    discover_ms = (time.perf_counter() - started) * 1000
+    for plugin in plugins.values():
+        plugin.load()
+    return {
+        "projects": len(plugins),
+        "discover_ms": round(discover_ms, 2),
+        "import_ms": {row["project"]: row["import_ms"] for row in projects.stats()},
+    }
+
+
+def _prompt_builders() -> dict:
+    return {project: projects.prompt_builder(project) for project in projects.discover() if project in SAMPLE_INPUTS}
+
+
+def _unique_prompts(run_id: str):
+    # A fresh prompt per request, so the cache and coalescing never kick in
+    counter = itertools.count()
+    return lambda: (f"Benchmark {run_id} request {next(counter)}: say something.", None)
+
+
+def _project_prompts(run_id: str):
+    # Every project's sample prompt, round-robin: repeats are served by the cache or coalesced
+    cycle = itertools.cycle(list(_prompt_builders().items()))
+    lock = threading.Lock()
+
+    def next_prompt():
+        with lock:
+            project, builder = next(cycle)
+        return builder(**SAMPLE_INPUTS[project]), project
+    return next_prompt
+
+
+def _varied_prompts(run_id: str):
+    # Every project's prompt, round-robin, with a fresh value in its first text input each time:
+    # nothing repeats whole, so only the server's prefix cache can reuse work across requests
+    builders = [(project, builder) for project, builder in _prompt_builders().items()
+                if any(isinstance(value, str) for value in SAMPLE_INPUTS[project].values())]
+    cycle = itertools.cycle(builders)
+    counter = itertools.count()
+    lock = threading.Lock()
+
+    def next_prompt():
+        with lock:
+            (project, builder), index = next(cycle), next(counter)
+        inputs = dict(SAMPLE_INPUTS[project])
+        name = next(name for name, value in inputs.items() if isinstance(value, str))
+        inputs[name] = f"{inputs[name]} ({run_id} #{index})"
+        return builder(**inputs), project
+    return next_prompt
+
+
+def _blocking(prompt, project, api_key, api_endpoint):
+    started = time.perf_counter()
+    answer = query_llm(prompt, api_key, api_endpoint, project=project)
+    ok = not answer.startswith(("API Error", "The service is busy", "An unexpected error"))
+    return ok, time.perf_counter() - started, None
+
+
+def _streaming(prompt, project, api_key, api_endpoint):
+    timings = {}
+    parts = list(query_llm_stream(prompt, api_key, api_endpoint, timings=timings, project=project))
+    ok = bool(parts) and not parts[-1].lstrip().startswith(("API Error", "The service is busy", "An unexpected error"))
+    return ok, timings["total"], timings["ttft"]
+
+
+SCENARIOS = {
+    # name -> (prompt source, call)
+    "blocking": (_unique_prompts, _blocking),
+    "streaming": (_unique_prompts, _streaming),
+    "projects": (_project_prompts, _streaming),
+    "prefix": (_varied_prompts, _streaming),
+    "batch": (_unique_prompts, None),
+}
+
+
+def run_level(scenario: str, concurrency: int, requests: int, api_key: str, api_endpoint: str,
+              run_id: str) -> dict:
+    """
+    Runs one scenario at one concurrency level and summarizes it.
+    """
+    make_prompts, call = SCENARIOS[scenario]
+    next_prompt = make_prompts(f"{run_id}-{scenario}-{concurrency}")
+    work = [next_prompt() for _ in range(requests)]
+
+    sampler = _RssSampler().start()
+    started = time.perf_counter()
+    if call is None:
+        results = batch.query_llm_batch([prompt for prompt, _ in work], api_key, api_endpoint,
+                                        concurrency=concurrency, session=f"bench-{run_id}")
+        outcomes = [(result["ok"], result["latency"], None) for result in results]
+    else:
+        queue = iter(work)
+        lock = threading.Lock()
+
+        def session_worker(index):
+            # One thread per simulated session, taking requests until none are left
+            current_session.set(f"bench-{run_id}-{index}")
+            done = []
+            while True:
+                with lock:
+                    item = next(queue, None)
+                if item is None:
+                    return done
+                done.append(call(item[0], item[1], api_key, api_endpoint))
+
+        with ThreadPoolExecutor(concurrency, thread_name_prefix="bench-session") as pool:
+            outcomes = [outcome for done in pool.map(session_worker, range(concurrency)) for outcome in done]
+    elapsed = time.perf_counter() - started
+    baseline, peak = sampler.stop()
+
+    ok = [outcome for outcome in outcomes if outcome[0]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "errors": len(outcomes) - len(ok),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles([outcome[1] for outcome in ok]),
+        "ttft": percentiles([outcome[2] for outcome in ok if outcome[2] is not None]),
+        "rss_mb": round(peak / 2 ** 20, 1),
+        "memory_per_session_kb": round(max(0, peak - baseline) / concurrency / 1024, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentiles(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    values = sorted(values)
+    if len(values) == 1:
+        return {"p50": round(values[0], 4), "p95": round(values[0], 4), "p99": round(values[0], 4),
+                "max": round(values[0], 4)}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": round(cuts[49], 4), "p95": round(cuts[94], 4), "p99": round(cuts[98], 4),
+            "max": round(values[-1], 4)}
+
+
+class _RssSampler:
+    """
+    Samples the process's resident memory every few milliseconds, keeping
+    the value at start and the peak.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.baseline = self.peak = _rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-rss", daemon=True)
+
+    def start(self) -> "_RssSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> tuple[int, int]:
+        self._stop.set()
+        self._thread.join()
+        return self.baseline, max(self.peak, _rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss())
+
+
+def _rss() -> int:
+    # Current resident set size in bytes; Linux exposes it in /proc, elsewhere fall back to the peak
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource  # Unix only
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        return 0
+
+
+def warm_up(api_key: str, api_endpoint: str):
+    """
+    Creates the pooled clients and the batch event loop, so that one-off
+    setup is not billed to the first level measured.
+    """
+    query_llm("Benchmark warm-up", api_key, api_endpoint)
+    list(query_llm_stream("Benchmark warm-up", api_key, api_endpoint))
+    batch.query_llm_batch(["Benchmark warm-up"], api_key, api_endpoint)
+
+
+def run_scenario(scenario: str, levels: list[int], requests: int, api_key: str, api_endpoint: str,
+                 run_id: str, on_level: Callable[[dict], None] | None = None) -> list[dict]:
+    results = []
+    for concurrency in levels:
+        result = run_level(scenario, concurrency, max(requests, concurrency), api_key, api_endpoint, run_id)
+        results.append(result)
+        if on_level is not None:
+            on_level(result)
+    return results
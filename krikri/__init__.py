@@ -0,0 +1,7 @@
+"""
+Shared plumbing between the Streamlit pages and the Krikri LLM API.
+
+Streamlit re-executes streamlit_app.py on every widget interaction, but
+modules imported from here stay in sys.modules, so any state they hold is
+created once per server process and shared by every session.
+"""
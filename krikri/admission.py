@@ -0,0 +1,262 @@
+"""
+Admission control in front of the Krikri endpoint.
+
+Every upstream call takes a slot here first. Slots are limited by a token
+bucket (requests per second, with a burst allowance) and by a cap on
+concurrent requests. Waiting requests are queued per session and served
+round-robin, so one user clicking "Laugh!" ten times waits behind their own
+clicks instead of in front of everybody else's.
+
+When the endpoint answers 429/503 with Retry-After, admissions pause for
+that long for everyone, and the failed call is retried with exponential
+backoff and jitter.
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAIError
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_RATE_LIMIT] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "rate": 10.0,                  # Requests admitted per second
+    "burst": 20,                   # Requests admitted at once after a quiet period
+    "max_concurrent": 32,          # Upstream requests in flight
+    "max_queued_per_session": 3,   # Pending requests one session may have
+    "queue_timeout": 120.0,        # Seconds a request may wait for a slot
+    "retries": 3,                  # Extra attempts on 429/503/connection errors
+    "backoff": 1.0,                # Base retry delay, doubled on every attempt
+    "max_backoff": 30.0,
+}
+
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class AdmissionError(Exception):
+    pass
+
+
+class QueueFull(AdmissionError):
+    pass
+
+
+class QueueTimeout(AdmissionError):
+    pass
+
+
+_cond = threading.Condition()
+_queues = OrderedDict()  # session -> deque of waiting tickets, in round-robin order
+_active = 0
+_tokens = float(SETTINGS["burst"])
+_refilled_at = time.monotonic()
+_paused_until = 0.0
+_counters = {"admitted": 0, "rejected": 0, "timed_out": 0, "retries": 0, "throttled": 0}
+
+
+def configure(**settings):
+    global _tokens
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown rate limit settings: {sorted(unknown)}")
+    with _cond:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        _tokens = min(_tokens, SETTINGS["burst"])
+        _cond.notify_all()
+
+
+@contextmanager
+def admit(session: str, on_wait: Callable[[int], None] | None = None, max_queued: int | None = None):
+    """
+    Holds an upstream slot for the duration of the block.
+    """
+    acquire(session, on_wait, max_queued)
+    try:
+        yield
+    finally:
+        release()
+
+
+def acquire(session: str, on_wait: Callable[[int], None] | None = None, max_queued: int | None = None):
+    """
+    Blocks until this session's request is admitted. `on_wait` is called
+    with the 1-based queue position whenever it changes while waiting.
+    `max_queued` raises max_queued_per_session, for callers such as
+    batches and parallel samples that are expected to queue many requests
+    under one session. Raises QueueFull or QueueTimeout.
+    """
+    global _active
+    if not SETTINGS["enabled"]:
+        with _cond:
+            _active += 1
+        return
+
+    ticket = object()
+    with _cond:
+        queue = _queues.setdefault(session, deque())
+        if len(queue) >= max(max_queued or 0, SETTINGS["max_queued_per_session"]):
+            if not queue:
+                del _queues[session]
+            _counters["rejected"] += 1
+            raise QueueFull("Too many requests from this session are already waiting. Please wait for them to finish.")
+        queue.append(ticket)
+
+    deadline = time.monotonic() + SETTINGS["queue_timeout"]
+    reported = None
+    try:
+        while True:
+            with _cond:
+                delay = _try_grant(session, ticket)
+                if delay is None:
+                    return
+                position = _position(session, ticket)
+                if position == reported:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        _counters["timed_out"] += 1
+                        raise QueueTimeout(f"No free slot after {SETTINGS['queue_timeout']:.0f}s. Please try again.")
+                    _cond.wait(min(delay, remaining))
+                    continue
+            reported = position
+            if on_wait is not None:
+                on_wait(position)
+    except BaseException:
+        with _cond:
+            queue = _queues.get(session)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del _queues[session]
+            _cond.notify_all()
+        raise
+
+
+def release():
+    global _active
+    with _cond:
+        _active -= 1
+        _cond.notify_all()
+
+
+def pause(seconds: float):
+    """
+    Stops admitting new requests for `seconds`, e.g. after a Retry-After.
+    """
+    global _paused_until
+    with _cond:
+        _paused_until = max(_paused_until, time.monotonic() + seconds)
+        _counters["throttled"] += 1
+
+
+def retry_delay(error: OpenAIError, attempt: int) -> float | None:
+    """
+    Seconds to wait before retrying after `error` on the given attempt
+    (1-based), or None if it should not be retried. Honors Retry-After
+    (and pauses all admissions for that long).
+    """
+    if attempt > SETTINGS["retries"]:
+        return None
+    if isinstance(error, APIStatusError):
+        if error.status_code not in RETRY_STATUSES:
+            return None
+        retry_after = _retry_after(error.response.headers)
+    elif isinstance(error, (APIConnectionError, APITimeoutError)):
+        retry_after = None
+    else:
+        return None
+
+    delay = SETTINGS["backoff"] * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+    if retry_after is not None:
+        pause(retry_after)
+        delay = max(delay, retry_after)
+    with _cond:
+        _counters["retries"] += 1
+    return min(delay, SETTINGS["max_backoff"])
+
+
+def has_capacity() -> bool:
+    """
+    True if a request would be admitted right away (nothing queued, a free
+    slot, not paused). Used to decide whether extra requests are worth it.
+    """
+    with _cond:
+        return (not _queues and _active < SETTINGS["max_concurrent"]
+                and time.monotonic() >= _paused_until)
+
+
+def stats() -> dict:
+    with _cond:
+        return dict(
+            _counters,
+            active=_active,
+            queued=sum(len(queue) for queue in _queues.values()),
+            waiting_sessions=len(_queues),
+        )
+
+
+def _try_grant(session: str, ticket) -> float | None:
+    # Caller must hold _cond. Returns None once admitted, else seconds worth waiting.
+    global _active, _tokens, _refilled_at
+    head = next(iter(_queues))
+    if head != session or _queues[head][0] is not ticket or _active >= SETTINGS["max_concurrent"]:
+        return 1.0
+    now = time.monotonic()
+    if now < _paused_until:
+        return _paused_until - now
+    _tokens = min(SETTINGS["burst"], _tokens + (now - _refilled_at) * SETTINGS["rate"])
+    _refilled_at = now
+    if _tokens < 1:
+        return (1 - _tokens) / SETTINGS["rate"]
+
+    _tokens -= 1
+    queue = _queues[session]
+    queue.popleft()
+    if queue:
+        _queues.move_to_end(session)  # Next turn goes to the next session
+    else:
+        del _queues[session]
+    _active += 1
+    _counters["admitted"] += 1
+    _cond.notify_all()
+    return None
+
+
+def _position(session: str, ticket) -> int:
+    # Caller must hold _cond. Requests served before this one under round-robin, plus one.
+    depth = _queues[session].index(ticket)
+    ahead = 0
+    before = True
+    for other, queue in _queues.items():
+        if other == session:
+            before = False
+            continue
+        ahead += min(len(queue), depth + 1 if before else depth)
+    return ahead + depth + 1
+
+
+def _retry_after(headers) -> float | None:
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
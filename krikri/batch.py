@@ -0,0 +1,305 @@
+"""
+Concurrent execution of many prompts with AsyncOpenAI.
+
+A single background event loop owns the async clients, so their
+connection pools survive between batches just like the pooled sync
+clients do. query_llm_batch can be called from a Streamlit page (or any
+other thread): it blocks only until the batch is done, which with enough
+concurrency is about as long as its slowest item. Each item takes an
+admission slot like any other request, so batches share the global rate
+limit with the app's users instead of bypassing it. With a shared gateway
+(see krikri.gateway), the items are sent to it instead, and it runs the
+cache and admission for them.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+import httpx
+from openai import AsyncOpenAI, OpenAIError
+
+from krikri import admission, budget, cache, clients, endpoints, gateway, metrics, routing
+from krikri.llm import _check_credentials, _error_message
+from krikri.prompts import Prompt, messages
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_BATCH] section of secrets.toml
+SETTINGS = {
+    "concurrency": 8,     # Requests in flight per batch
+}
+
+_lock = threading.Lock()
+_loop = None
+_async_clients = {}  # (api_endpoint, api_key) -> AsyncOpenAI, only touched on _loop
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown batch settings: {sorted(unknown)}")
+    for name in SETTINGS.keys() & settings.keys():
+        SETTINGS[name] = type(SETTINGS[name])(settings[name])
+
+
+def query_llm_batch(prompts: list[str | Prompt], api_key: str, api_endpoint: str,
+                    concurrency: int | None = None, project: str | list[str] | None = None,
+                    timeout: float | None = None, session: str = "batch",
+                    on_result: Callable[[int, dict], None] | None = None, fresh: bool = False,
+                    mode: str | None = None) -> list[dict]:
+    """
+    Runs every prompt concurrently and returns one result per prompt, in
+    input order. Failed items do not fail the batch; see aquery_llm_batch
+    for the shape of each result.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        aquery_llm_batch(prompts, api_key, api_endpoint, concurrency=concurrency, project=project,
+                         session=session, on_result=on_result, fresh=fresh, mode=mode),
+        _event_loop(),
+    )
+    return future.result(timeout)
+
+
+def iter_llm_batch(prompts: list[str | Prompt], api_key: str, api_endpoint: str,
+                   concurrency: int | None = None, project: str | list[str] | None = None,
+                   session: str = "batch", mode: str | None = None) -> Iterator[dict]:
+    """
+    Runs every prompt concurrently like query_llm_batch, but yields the
+    results in input order, each one as soon as it and all the ones before
+    it are done. Closing the iterator early cancels the items not yet done.
+    """
+    finished = queue.SimpleQueue()
+    future = asyncio.run_coroutine_threadsafe(
+        aquery_llm_batch(prompts, api_key, api_endpoint, concurrency=concurrency, project=project,
+                         session=session, on_result=lambda index, result: finished.put((index, result)),
+                         mode=mode),
+        _event_loop(),
+    )
+    # Also wakes the reader when the batch ends without calling on_result (e.g. no credentials)
+    future.add_done_callback(lambda _: finished.put(None))
+    ready = {}
+    try:
+        for index in range(len(prompts)):
+            while index not in ready:
+                item = finished.get()
+                if item is None:
+                    ready.update(enumerate(future.result()))
+                else:
+                    ready[item[0]] = item[1]
+            yield ready.pop(index)
+    finally:
+        future.cancel()
+
+
+async def aquery_llm_batch(prompts: list[str | Prompt], api_key: str, api_endpoint: str,
+                           concurrency: int | None = None, project: str | list[str] | None = None,
+                           session: str = "batch",
+                           on_result: Callable[[int, dict], None] | None = None,
+                           fresh: bool = False, mode: str | None = None) -> list[dict]:
+    """
+    Coroutine behind query_llm_batch. Each result is a dict with
+    "ok", "text" (the answer, or the error message if not ok), "attempts",
+    "latency" in seconds, "cached", "route" and "model" (see
+    krikri.routing; `mode` picks a per-mode route), and
+    "prompt_tokens"/"completion_tokens" when the server reports usage.
+
+    `project` may be a list with one project name per prompt. `session` is
+    the admission queue the items wait in. `on_result` is called with
+    (index, result) as soon as each item finishes, on the event loop's thread.
+    With `fresh`, the response cache is neither read nor written, so that
+    repeated prompts get independent answers.
+    """
+    error = _check_credentials(api_key, api_endpoint)
+    if error:
+        return [_result(False, error) for _ in prompts]
+
+    projects = project if isinstance(project, list) else [project] * len(prompts)
+    concurrency = concurrency or SETTINGS["concurrency"]
+    semaphore = asyncio.Semaphore(concurrency)
+    # Admission waits block a thread each; they get their own, so a batch under load
+    # cannot use up the loop's default executor that every other to_thread shares
+    waiters = ThreadPoolExecutor(concurrency, thread_name_prefix="llm-batch-admission")
+
+    async def run(index, prompt):
+        async with semaphore:
+            result = await _query_one(api_key, api_endpoint, prompt, projects[index], session, len(prompts),
+                                      fresh, mode, waiters)
+        metrics.record_request(projects[index], result["latency"], error=not result["ok"])
+        if on_result is not None:
+            on_result(index, result)
+        return result
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(run(index, prompt) for index, prompt in enumerate(prompts)))
+    finally:
+        waiters.shutdown(wait=False)  # Waits of cancelled items still finish, and hand back their slots
+    failed = sum(not result["ok"] for result in results)
+    logger.info(f"Batch of {len(prompts)} finished in {time.perf_counter() - started:.2f}s, {failed} failed")
+    return results
+
+
+async def _query_one(api_key: str, api_endpoint: str, prompt: str | Prompt, project: str | None,
+                     session: str, max_queued: int, fresh: bool = False, mode: str | None = None,
+                     waiters: ThreadPoolExecutor | None = None) -> dict:
+    started = time.perf_counter()
+    route = routing.choose(project, mode)
+    routing.served(project, route)
+    api_key, api_endpoint = route.target(api_key, api_endpoint)
+    try:
+        prompt, max_tokens = budget.prepare(prompt, project)
+    except budget.PromptTooLong as e:
+        return _result(False, _error_message(e), route=route)
+    # available() may check the gateway's health, which blocks
+    if await asyncio.get_running_loop().run_in_executor(waiters, gateway.available):
+        try:
+            return await _relay_one(api_key, prompt, project, session, fresh, route, max_tokens, started)
+        except gateway.Unavailable:
+            pass  # Served here instead
+    ttl = None if fresh else cache.ttl_for(project)
+    key = cache.make_key(prompt, route.model, route.temperature, route.top_p)
+    if ttl is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return _result(True, cached, latency=time.perf_counter() - started, cached=True, route=route)
+
+    attempts = 0
+    retries = 0
+    tried = set()
+    while True:
+        attempts += 1
+        url = endpoints.choose(api_endpoint, api_key, tried)
+        try:
+            await _admit(session, max_queued, waiters)
+            try:
+                with endpoints.use(url, api_key):
+                    response = await _async_client(api_key, url).chat.completions.create(
+                        messages=messages(prompt),
+                        max_tokens=max_tokens,
+                        **route.params()
+                    )
+            finally:
+                admission.release()
+            text = response.choices[0].message.content or ""
+            truncated = response.choices[0].finish_reason == "length"
+            if ttl is not None and text and not truncated:
+                cache.put(key, text, ttl)
+            usage = response.usage
+            if usage:
+                metrics.record_usage(project, usage.prompt_tokens, usage.completion_tokens, metrics.cached_tokens(usage))
+            budget.observe(project, usage.completion_tokens if usage else budget.count_tokens(text), max_tokens)
+            return _result(
+                True, text, attempts=attempts, latency=time.perf_counter() - started,
+                prompt_tokens=usage.prompt_tokens if usage else None,
+                completion_tokens=usage.completion_tokens if usage else None, route=route, truncated=truncated,
+            )
+        except OpenAIError as e:
+            tried.add(url)
+            if endpoints.can_fail_over(api_endpoint, tried, e):
+                logger.warning(f"Failing over batch item from {url} after: {e}")
+                continue
+            retries += 1
+            delay = admission.retry_delay(e, retries)
+            if delay is None:
+                return _result(False, _error_message(e), attempts=attempts, latency=time.perf_counter() - started,
+                               route=route)
+            logger.warning(f"Retrying batch item in {delay:.1f}s after: {e}")
+            await asyncio.sleep(delay)
+            tried.clear()
+        except Exception as e:
+            return _result(False, _error_message(e), attempts=attempts, latency=time.perf_counter() - started,
+                           route=route)
+
+
+async def _relay_one(api_key: str, prompt: str | Prompt, project: str | None, session: str, fresh: bool,
+                     route: routing.Route, max_tokens: int, started: float) -> dict:
+    # The gateway caches, coalesces, admits and retries the item itself; raises gateway.Unavailable
+    try:
+        response = await gateway.arelay(_async_client(api_key, gateway.SETTINGS["url"]).chat.completions.create(
+            messages=messages(prompt),
+            max_tokens=max_tokens,
+            **route.params(),
+            extra_headers=gateway.headers(project, session, route, fresh)
+        ))
+    except OpenAIError as e:
+        return _result(False, _error_message(e), attempts=1, latency=time.perf_counter() - started, route=route)
+    text = response.choices[0].message.content or ""
+    usage = response.usage  # None for an answer the gateway did not call the API for
+    if usage:
+        metrics.record_usage(project, usage.prompt_tokens, usage.completion_tokens, metrics.cached_tokens(usage))
+    budget.observe(project, usage.completion_tokens if usage else budget.count_tokens(text), max_tokens)
+    return _result(True, text, attempts=1, latency=time.perf_counter() - started, route=route,
+                   prompt_tokens=usage.prompt_tokens if usage else None,
+                   completion_tokens=usage.completion_tokens if usage else None,
+                   truncated=response.choices[0].finish_reason == "length")
+
+
+async def _admit(session: str, max_queued: int, waiters: ThreadPoolExecutor | None = None):
+    # admission.acquire blocks, so it waits on a worker thread of `waiters`. If this
+    # item is cancelled meanwhile, the slot it eventually gets is handed back.
+    waiter = asyncio.get_running_loop().run_in_executor(waiters, admission.acquire, session, None, max_queued)
+    try:
+        await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        waiter.add_done_callback(lambda done: done.exception() is None and admission.release())
+        raise
+
+
+def _result(ok: bool, text: str, attempts: int = 0, latency: float = 0.0, cached: bool = False,
+            prompt_tokens: int | None = None, completion_tokens: int | None = None,
+            route: routing.Route | None = None, truncated: bool = False) -> dict:
+    return {
+        "ok": ok,
+        "text": text,
+        "attempts": attempts,
+        "latency": round(latency, 3),
+        "cached": cached,
+        "route": route.name if route else None,
+        "model": route.model if route else None,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "truncated": truncated,
+    }
+
+
+def _async_client(api_key: str, api_endpoint: str) -> AsyncOpenAI:
+    # Only called on _loop, so no locking is needed
+    key = (api_endpoint, api_key)
+    client = _async_clients.get(key)
+    if client is None:
+        settings = clients.SETTINGS
+        limits = httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        )
+        transport = None
+        base_url = api_endpoint
+        if api_endpoint.startswith("unix:"):
+            # A gateway on a Unix socket, as in krikri.clients
+            transport = httpx.AsyncHTTPTransport(uds=api_endpoint.removeprefix("unix:"), limits=limits)
+            base_url = "http://localhost/v1"
+        client = _async_clients[key] = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,  # Retries go through krikri.admission, per item
+            http_client=httpx.AsyncClient(
+                limits=limits,
+                transport=transport,
+                timeout=httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+            ),
+        )
+    return client
+
+
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-batch-loop", daemon=True).start()
+        return _loop
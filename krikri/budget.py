@@ -0,0 +1,189 @@
+"""
+Token budgets: prompt length against the model's context, and max_tokens
+per project.
+
+Prompts are counted with a local tokenizer when one is configured (and the
+`tokenizers` package is installed), otherwise with the estimate from
+krikri.chunking. A prompt that would not leave room for an answer is
+rejected, or its user part is trimmed in the middle if the project allows
+it (the system part of a krikri.prompts.Prompt is never trimmed).
+
+Each answer's length is recorded per project, and max_tokens is set to the
+p95 of recent answers plus some headroom, rounded up to a fixed step so
+that it does not move with every answer. Answers cut off at max_tokens are recorded as
+twice as long, so a budget that is too small grows quickly. Until enough
+answers are seen, or when a project has an override, a fixed value is used.
+"""
+import logging
+import statistics
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+
+from krikri import prompts
+from krikri.chunking import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_BUDGET] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "tokenizer": "",             # tokenizer.json path or Hugging Face name; "" estimates
+    "context_window": 32768,     # Prompt + answer tokens the model accepts
+    "on_overflow": "reject",     # "reject" or "trim" prompts that do not fit
+    "default_max_tokens": 500,   # Until min_samples answers are recorded
+    "min_max_tokens": 64,
+    "max_max_tokens": 4096,
+    "headroom": 1.25,            # Multiplier on the observed p95 answer length
+    "min_samples": 20,
+    "window": 200,               # Recent answers per project the p95 is taken over
+}
+
+# Per-project overrides: a number fixes max_tokens, "trim" lets the prompt be trimmed
+PROJECTS = {}
+
+# max_tokens is rounded up to one of these
+STEPS = (64, 96, 128, 192, 256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096, 6144, 8192)
+
+
+class PromptTooLong(ValueError):
+    pass
+
+
+_lock = threading.Lock()
+_lengths = defaultdict(lambda: deque(maxlen=SETTINGS["window"]))  # project -> completion tokens
+_counters = defaultdict(lambda: {"truncated": 0, "trimmed": 0, "rejected": 0})
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def configure(projects: dict | None = None, **settings):
+    """
+    Overrides budget settings and per-project max_tokens.
+    """
+    global _tokenizer, _tokenizer_loaded
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown budget settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        PROJECTS.update(projects or {})
+        _tokenizer, _tokenizer_loaded = None, False
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def prepare(prompt: str | prompts.Prompt, project: str | None) -> tuple[str | prompts.Prompt, int]:
+    """
+    The prompt to send (trimmed if needed and allowed) and the max_tokens
+    to send it with. Raises PromptTooLong if it does not fit.
+    """
+    if not SETTINGS["enabled"]:
+        return prompt, SETTINGS["default_max_tokens"]
+    max_tokens = max_tokens_for(project)
+    prompt_tokens = count_tokens(prompts.text(prompt))
+    room = SETTINGS["context_window"] - prompt_tokens
+    if room < SETTINGS["min_max_tokens"]:
+        limit = SETTINGS["context_window"] - max_tokens
+        if PROJECTS.get(project) != "trim" and SETTINGS["on_overflow"] != "trim":
+            _count(project, "rejected")
+            raise PromptTooLong(f"The input is too long: about {prompt_tokens} tokens, at most "
+                                f"{limit} fit. Please shorten it.")
+        user = prompts.user_text(prompt)
+        fixed = prompt_tokens - count_tokens(user)
+        user = _trim(user, prompt_tokens - fixed, limit - fixed)
+        if not user:
+            raise PromptTooLong("The input is too long for the model's context.")
+        prompt = prompts.with_user(prompt, user)
+        _count(project, "trimmed")
+        logger.warning(f"Trimmed a {prompt_tokens}-token prompt for {project or 'request'} to fit the context")
+        room = max_tokens
+    return prompt, min(max_tokens, room)
+
+
+def max_tokens_for(project: str | None) -> int:
+    override = PROJECTS.get(project)
+    if isinstance(override, (int, float)) and not isinstance(override, bool):
+        return int(override)
+    with _lock:
+        samples = list(_lengths.get(project, ()))
+    if len(samples) < SETTINGS["min_samples"]:
+        return SETTINGS["default_max_tokens"]
+    p95 = statistics.quantiles(samples, n=20, method="inclusive")[18]
+    wanted = min(max(p95 * SETTINGS["headroom"], SETTINGS["min_max_tokens"]), SETTINGS["max_max_tokens"])
+    return next((step for step in STEPS if step >= wanted), SETTINGS["max_max_tokens"])
+
+
+def observe(project: str | None, completion_tokens: int, max_tokens: int):
+    """
+    Records the length of an answer generated with `max_tokens`.
+    """
+    truncated = completion_tokens >= max_tokens
+    with _lock:
+        _lengths[project].append(completion_tokens * 2 if truncated else completion_tokens)
+        if truncated:
+            _counters[project]["truncated"] += 1
+
+
+def stats() -> list[dict]:
+    """
+    One row per project: recorded answers, their p95 length and the current max_tokens.
+    """
+    with _lock:
+        projects = sorted(_lengths.keys() | _counters.keys(), key=str)
+        lengths = {project: list(_lengths.get(project, ())) for project in projects}
+        counters = {project: dict(_counters.get(project, {"truncated": 0, "trimmed": 0, "rejected": 0}))
+                    for project in projects}
+    rows = []
+    for project in projects:
+        samples = lengths[project]
+        p95 = statistics.quantiles(samples, n=20, method="inclusive")[18] if len(samples) >= 2 else None
+        rows.append({
+            "project": project or "(none)",
+            "answers": len(samples),
+            "p95 tokens": round(p95) if p95 is not None else None,
+            "max_tokens": max_tokens_for(project),
+            **counters[project],
+        })
+    return rows
+
+
+def _count(project: str | None, name: str):
+    with _lock:
+        _counters[project][name] += 1
+
+
+def _trim(prompt: str, prompt_tokens: int, limit: int) -> str:
+    # Keeps the start (the instructions) and the end (closing markers), dropping the middle
+    marker = "\n[...]\n"
+    keep = len(prompt) * limit // max(prompt_tokens, 1)
+    while keep > 0:
+        head = keep * 2 // 3
+        trimmed = prompt[:head] + marker + prompt[len(prompt) - (keep - head):]
+        if count_tokens(trimmed) <= limit:
+            return trimmed
+        keep = keep * 9 // 10
+    return ""
+
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    if _tokenizer_loaded:
+        return _tokenizer
+    name = SETTINGS["tokenizer"]
+    tokenizer = None
+    if name:
+        try:
+            from tokenizers import Tokenizer  # Optional: pip install tokenizers
+            tokenizer = Tokenizer.from_file(name) if Path(name).is_file() else Tokenizer.from_pretrained(name)
+        except Exception as e:
+            logger.warning(f"Tokenizer {name!r} unavailable, estimating token counts instead: {e}")
+    with _lock:
+        _tokenizer, _tokenizer_loaded = tokenizer, True
+    return tokenizer
@@ -0,0 +1,240 @@
+"""
+Response cache in front of the Krikri API.
+
+Two tiers: a bounded in-memory LRU that answers repeats instantly, and a
+SQLite file that survives restarts and is shared by every process on the
+machine. Keys cover the normalized prompt (with the system part and the
+history of a krikri.prompts.Prompt), the model, the temperature and
+top_p, so "Ζώδιο  μου" and "Ζωδιο μου" hit the same entry. max_tokens is
+left out: it follows each project's answer lengths (see krikri.budget),
+and an answer stays valid when the budget moves, because answers cut off
+at max_tokens are never stored.
+
+An entry may hold several variants of the answer (see warm_cache.py);
+each hit returns one of them at random.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+from krikri import prompts
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_CACHE] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "max_entries": 2048,                      # In-memory LRU size
+    "ttl": 24 * 3600.0,                       # Seconds an answer stays valid
+    "path": ".cache/llm_responses.sqlite3",   # Empty string disables the disk tier
+}
+
+# Per-project policy: False opts out, a number overrides the TTL (seconds).
+# Creative pages keep sampling fresh outputs instead of repeating one joke.
+PROJECTS = {
+    "project_jokes": False,
+    "project_excuse_generator": False,
+}
+
+_lock = threading.Lock()
+_memory = OrderedDict()  # key -> (response, expires_at, variants, created_at)
+_db = None
+_counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def configure(projects: dict | None = None, **settings):
+    """
+    Overrides cache settings and per-project policies.
+    """
+    global _db
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown cache settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        PROJECTS.update(projects or {})
+        while len(_memory) > SETTINGS["max_entries"]:
+            _memory.popitem(last=False)
+        if _db is not None:
+            _db.close()
+            _db = None
+
+
+def normalize(text: str) -> str:
+    """
+    Canonical form of a prompt for keying: Unicode compatibility forms are
+    folded, accents and diaeresis are dropped (ά -> α, ϊ -> ι) and runs of
+    whitespace collapse to one space.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(prompt: str | prompts.Prompt, model: str, temperature: float, top_p: float | None = None) -> str:
+    """
+    The key of a request: every generation parameter but max_tokens, whose
+    answers callers must not store if they were cut off.
+    """
+    parts = [normalize(prompts.user_text(prompt)), model, temperature]
+    if top_p is not None:
+        parts.append(top_p)  # Only when set, so keys made without it stay the same
+    if isinstance(prompt, prompts.Prompt) and prompt.system:
+        parts.append({"system": normalize(prompt.system)})
+    if isinstance(prompt, prompts.Prompt) and prompt.history:
+        parts.append({"history": [[role, normalize(content)] for role, content in prompt.history]})
+    payload = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def ttl_for(project: str | None) -> float | None:
+    """
+    Returns the TTL to use for a project, or None if it must not be cached.
+    """
+    if not SETTINGS["enabled"]:
+        return None
+    policy = PROJECTS.get(project or "", True)
+    if policy is False:
+        return None
+    if policy is True:
+        return SETTINGS["ttl"]
+    return float(policy)
+
+
+def get(key: str) -> str | None:
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                _memory.move_to_end(key)
+                _counters["memory_hits"] += 1
+                return random.choice(entry[2]) if entry[2] else entry[0]
+            del _memory[key]
+
+        entry = _load(key, now)
+        if entry is None:
+            _counters["misses"] += 1
+            return None
+        _counters["disk_hits"] += 1
+        _remember(key, *entry)
+        return random.choice(entry[2]) if entry[2] else entry[0]
+
+
+def put(key: str, response: str, ttl: float, variants: list[str] | None = None):
+    """
+    Stores an answer, or several variants of it (`response` is then the first).
+    """
+    created_at = time.time()
+    expires_at = created_at + ttl
+    variants = tuple(variants) if variants and len(variants) > 1 else ()
+    with _lock:
+        _remember(key, response, expires_at, variants, created_at)
+        _counters["stores"] += 1
+        db = _connect()
+        if db is not None:
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires_at, variants, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, expires_at, json.dumps(variants, ensure_ascii=False) if variants else None,
+                     created_at),
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write cache entry: {e}")
+
+
+def info(key: str) -> dict | None:
+    """
+    When an entry was stored, when it expires and how many variants it has,
+    or None if there is no valid entry. Does not count as a hit or a miss.
+    """
+    now = time.time()
+    with _lock:
+        entry = _memory.get(key)
+        if entry is None or entry[1] <= now:
+            entry = _load(key, now)
+    if entry is None:
+        return None
+    return {"created_at": entry[3], "expires_at": entry[1], "variants": max(len(entry[2]), 1)}
+
+
+def stats() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        counters["memory_entries"] = len(_memory)
+    lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+    counters["hit_rate"] = (counters["memory_hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+    return counters
+
+
+def clear():
+    with _lock:
+        _memory.clear()
+        db = _connect()
+        if db is not None:
+            db.execute("DELETE FROM responses")
+            db.commit()
+
+
+def _load(key: str, now: float) -> tuple | None:
+    # Caller must hold _lock. The entry from the disk tier, shaped like the memory tier's.
+    db = _connect()
+    if db is None:
+        return None
+    row = db.execute(
+        "SELECT response, expires_at, variants, created_at FROM responses WHERE key = ? AND expires_at > ?",
+        (key, now),
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], row[1], tuple(json.loads(row[2])) if row[2] else (), row[3]
+
+
+def _remember(key: str, response: str, expires_at: float, variants: tuple = (), created_at: float | None = None):
+    # Caller must hold _lock
+    _memory[key] = (response, expires_at, variants, created_at)
+    _memory.move_to_end(key)
+    while len(_memory) > SETTINGS["max_entries"]:
+        _memory.popitem(last=False)
+
+
+def _connect():
+    # Caller must hold _lock. Opens the disk tier lazily and drops expired rows.
+    global _db
+    if _db is not None or not SETTINGS["path"]:
+        return _db
+    try:
+        path = Path(SETTINGS["path"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, "
+            "variants TEXT, created_at REAL)"
+        )
+        # Files written before variants were stored
+        columns = {row[1] for row in db.execute("PRAGMA table_info(responses)")}
+        for column, kind in (("variants", "TEXT"), ("created_at", "REAL")):
+            if column not in columns:
+                db.execute(f"ALTER TABLE responses ADD COLUMN {column} {kind}")
+        db.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        db.commit()
+        _db = db
+    except sqlite3.Error as e:
+        logger.error(f"Disk cache unavailable, using memory only: {e}")
+        SETTINGS["path"] = ""
+    return _db
@@ -0,0 +1,153 @@
+"""
+Splitting of long inputs into pieces that each fit in one request.
+
+Text is cut on paragraph boundaries first, then on sentence boundaries
+inside paragraphs that are too long, then on whitespace. Consecutive
+paragraphs are packed together while they fit, so a text of many short
+paragraphs takes a few requests rather than one per paragraph; editing a
+paragraph changes its own chunk, and may move the boundaries of the ones
+after it.
+
+Code is cut on function and class boundaries: with `ast` for Python, and
+on blank lines before an unindented line for anything else.
+"""
+import ast
+import re
+
+_PARAGRAPHS = re.compile(r"(\n[ \t]*\n\s*)")
+_SENTENCES = re.compile(r"(?<=[.!?;\u037e…])(\s+)")
+_WORDS = re.compile(r"(\s+)")
+_LINES = re.compile(r"(?<=\n)()(?=[\s\S])")
+_BLOCKS = re.compile(r"(?<=\n\n)()(?=\S)")
+# Lines worth repeating above every chunk of non-Python code: imports and declarations
+_HEADER_LINES = re.compile(
+    r"^(?:import|from|#include|using|require|package|use|(?:export\s+)?(?:async\s+)?(?:def|class|function|fn|func)\b).*$",
+    re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: about 4 bytes of UTF-8 per token, which counts Greek
+    (2 bytes per letter) at twice the rate of English, erring on the safe side.
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def split_text(text: str, max_tokens: int) -> list[tuple[str, str]]:
+    """
+    Splits text into chunks of at most about `max_tokens` each, every one
+    made of whole paragraphs unless a paragraph is too long on its own.
+    Every chunk comes with the whitespace that preceded it in the text (""
+    for the first), so "".join(separator + chunk) gives the text back.
+    """
+    if not text.strip():
+        return []
+    pieces = []
+    for separator, paragraph in _split(_PARAGRAPHS, text.strip()):
+        sentences = _pack(_split(_SENTENCES, paragraph), max_tokens)
+        sentences[0] = (separator, sentences[0][1])
+        pieces.extend(sentences)
+    return _pack(pieces, max_tokens)
+
+
+def _split(pattern: re.Pattern, text: str) -> list[tuple[str, str]]:
+    # With a capturing pattern, re.split alternates pieces and separators
+    parts = pattern.split(text)
+    return [(parts[i - 1] if i else "", parts[i]) for i in range(0, len(parts), 2)]
+
+
+def split_code(code: str, max_tokens: int) -> tuple[str, list[str]]:
+    """
+    Splits source code into chunks of at most about `max_tokens` each, on
+    top-level function and class boundaries (and between the methods of a
+    class too long on its own). Also returns a short header to send with
+    every chunk so it can be understood alone: the file's imports and the
+    signatures of its functions and classes.
+    """
+    if not code.strip():
+        return "", []
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        tree = None
+    if tree is None or not tree.body:
+        # Not Python (or not valid Python): blocks that start after a blank line
+        header = _cap("\n".join(_HEADER_LINES.findall(code)), max_tokens // 4)
+        return header, [chunk for _, chunk in _pack(_split(_BLOCKS, code), max_tokens, _LINES)]
+
+    lines = code.splitlines(keepends=True)
+    units, header = [], []
+    start = 0
+    for index, node in enumerate(tree.body):
+        # Each node takes the lines after the previous one, so comments above a function stay with it
+        end = len(lines) if index == len(tree.body) - 1 else node.end_lineno
+        segment = "".join(lines[start:end])
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            header.append(ast.get_source_segment(code, node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            header.append(_signature(node, lines))
+        if isinstance(node, ast.ClassDef) and estimate_tokens(segment) > max_tokens:
+            units.extend(("", part) for part in _split_class(node, lines, start, end))
+        else:
+            units.append(("", segment))
+        start = end
+    header = _cap("\n".join(header), max_tokens // 4)
+    return header, [chunk for _, chunk in _pack(units, max_tokens, _LINES)]
+
+
+def _signature(node: ast.AST, lines: list[str]) -> str:
+    # The def/class lines up to the body, plus the methods' for a class
+    first = node.lineno - 1
+    text = "".join(lines[first:max(first + 1, node.body[0].lineno - 1)]).rstrip()
+    if isinstance(node, ast.ClassDef):
+        methods = [_signature(child, lines) for child in node.body
+                   if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        text = "\n".join([text, *methods])
+    return text
+
+
+def _split_class(node: ast.ClassDef, lines: list[str], start: int, end: int) -> list[str]:
+    # One part per method (with what precedes it); parts after the first repeat the class line
+    class_line = lines[node.lineno - 1]
+    parts = []
+    for index, child in enumerate(node.body):
+        stop = end if index == len(node.body) - 1 else child.end_lineno
+        part = "".join(lines[start:stop])
+        parts.append(class_line + part if parts else part)
+        start = stop
+    return parts
+
+
+def _cap(text: str, max_tokens: int) -> str:
+    # Keeps whole lines while they fit
+    kept, size = [], 0
+    for line in text.splitlines():
+        size += estimate_tokens(line) + 1
+        if size > max_tokens:
+            kept.append("...")
+            break
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _pack(units: list[tuple[str, str]], max_tokens: int,
+          pattern: re.Pattern = _WORDS) -> list[tuple[str, str]]:
+    # Greedily joins consecutive units while they fit; a unit that is too long
+    # on its own is cut on `pattern` (words, or lines for code)
+    packed, sizes = [], []
+    for separator, unit in units:
+        size = estimate_tokens(separator + unit)
+        if size > max_tokens and pattern.search(unit):
+            words = _split(pattern, unit)
+            words[0] = (separator, words[0][1])
+            for piece in _pack(words, max_tokens, pattern):
+                packed.append(piece)
+                sizes.append(estimate_tokens(piece[1]))
+            continue
+        if packed and sizes[-1] + size <= max_tokens:
+            packed[-1] = (packed[-1][0], packed[-1][1] + separator + unit)
+            sizes[-1] += size
+        else:
+            packed.append((separator, unit))
+            sizes.append(size)
+    return packed
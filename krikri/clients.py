@@ -0,0 +1,151 @@
+"""
+Process-wide registry of OpenAI clients.
+
+Every OpenAI client has its own httpx connection pool, so a client per
+request would pay for a fresh TCP + TLS handshake with the endpoint on
+every call. Clients are created once per (endpoint, key) pair and reused
+by every session and rerun until they sit idle for longer than
+`idle_timeout`.
+
+An endpoint of the form "unix:/path/to.sock" is reached over that Unix
+socket (used for a local krikri.gateway).
+"""
+import logging
+import threading
+import time
+
+import httpx
+from openai import OpenAI, OpenAIError
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_POOL] section of secrets.toml
+SETTINGS = {
+    "max_connections": 32,            # Open sockets per endpoint
+    "max_keepalive_connections": 16,  # Idle sockets kept warm per endpoint
+    "keepalive_expiry": 120.0,        # Seconds an idle socket stays open
+    "connect_timeout": 10.0,
+    "timeout": 60.0,
+    "max_retries": 0,                 # Retries go through krikri.admission instead
+    "idle_timeout": 900.0,            # Seconds before an unused client is closed
+}
+
+_lock = threading.Lock()
+_clients = {}  # (api_endpoint, api_key) -> [OpenAI, last_used]
+
+
+def configure(**settings):
+    """
+    Overrides pool settings. Only affects clients created afterwards.
+    """
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown pool settings: {sorted(unknown)}")
+    for name in SETTINGS.keys() & settings.keys():
+        SETTINGS[name] = type(SETTINGS[name])(settings[name])
+
+
+def _new_client(api_key: str, api_endpoint: str) -> OpenAI:
+    limits = httpx.Limits(
+        max_connections=SETTINGS["max_connections"],
+        max_keepalive_connections=SETTINGS["max_keepalive_connections"],
+        keepalive_expiry=SETTINGS["keepalive_expiry"],
+    )
+    transport = None
+    base_url = api_endpoint
+    if api_endpoint.startswith("unix:"):
+        # The host name is only for the Host header; the path must match the server's
+        transport = httpx.HTTPTransport(uds=api_endpoint.removeprefix("unix:"), limits=limits)
+        base_url = "http://localhost/v1"
+    http_client = httpx.Client(
+        limits=limits,
+        transport=transport,
+        timeout=httpx.Timeout(SETTINGS["timeout"], connect=SETTINGS["connect_timeout"]),
+    )
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        max_retries=SETTINGS["max_retries"],
+        http_client=http_client,
+    )
+
+
+def get_client(api_key: str, api_endpoint: str) -> OpenAI:
+    """
+    Returns the shared client for this endpoint/key, creating it on first use.
+    """
+    now = time.monotonic()
+    key = (api_endpoint, api_key)
+    with _lock:
+        stale = _pop_idle(now)
+        entry = _clients.get(key)
+        if entry is None:
+            logger.info(f"Creating pooled client for {api_endpoint}")
+            entry = _clients[key] = [_new_client(api_key, api_endpoint), now]
+        entry[1] = now
+        client = entry[0]
+    _close(stale)
+    return client
+
+
+def preconnect(api_key: str, api_endpoint: str) -> bool:
+    """
+    Opens a connection to the endpoint ahead of the first real request so
+    the TLS handshake is not paid by the first user. Listing models is the
+    cheapest call every OpenAI-compatible server implements.
+    """
+    if not api_key or not api_endpoint:
+        return False
+    try:
+        get_client(api_key, api_endpoint).models.list()
+        logger.info(f"Pre-connected to {api_endpoint}")
+        return True
+    except OpenAIError as e:
+        logger.warning(f"Pre-connect to {api_endpoint} failed: {e}")
+        return False
+
+
+def evict_idle() -> int:
+    """
+    Closes clients that have not been used for `idle_timeout` seconds.
+    """
+    with _lock:
+        stale = _pop_idle(time.monotonic())
+    _close(stale)
+    return len(stale)
+
+
+def close_all():
+    with _lock:
+        stale = [entry[0] for entry in _clients.values()]
+        _clients.clear()
+    _close(stale)
+
+
+def stats() -> dict:
+    """
+    Snapshot of the registry for the Configuration expander.
+    """
+    now = time.monotonic()
+    with _lock:
+        return {
+            "clients": len(_clients),
+            "idle_seconds": {endpoint: round(now - last_used, 1)
+                             for (endpoint, _), (_, last_used) in _clients.items()},
+        }
+
+
+def _pop_idle(now: float) -> list:
+    # Caller must hold _lock
+    expired = [key for key, (_, last_used) in _clients.items()
+               if now - last_used > SETTINGS["idle_timeout"]]
+    return [_clients.pop(key)[0] for key in expired]
+
+
+def _close(clients: list):
+    for client in clients:
+        logger.info(f"Closing idle client for {client.base_url}")
+        try:
+            client.close()
+        except Exception as e:
+            logger.error(f"Failed to close client: {e}")
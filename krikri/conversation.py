@@ -0,0 +1,216 @@
+"""
+Follow-up questions on a page's answer.
+
+A page that allows follow-ups keeps one conversation thread per user
+session: the project's system prompt, a summary of the older turns and
+the latest turns word for word. A follow-up is sent with that history as
+chat messages, so the model sees the original input without the page
+sending it again, and the server finds the conversation so far in its
+prefix cache and only prefills the new question.
+
+Threads are bounded: at most `window` turns are kept word for word, and a
+follow-up carries at most `history_tokens` of summary and turns. Older
+turns are folded into a summary written by the model (or just dropped if
+that fails). The threads live here rather than in the Streamlit session,
+which only keeps their ids, so that idle ones are evicted after
+`idle_timeout` and the process never holds more than `max_threads`.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from krikri import batch, budget
+from krikri.prompts import Prompt, user_text
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_CONVERSATION] section of secrets.toml
+SETTINGS = {
+    "window": 4,              # Latest turns kept word for word; older ones are summarized
+    "history_tokens": 2000,   # Max tokens of summary and turns sent with a follow-up
+    "summary_words": 200,     # Length asked for the summary of older turns
+    "max_threads": 2000,      # Threads kept in the process, least recently used evicted first
+    "idle_timeout": 1800.0,   # Seconds without a question before a thread is evicted
+}
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation the user gives you, for your own later reference: keep the facts, "
+    "code, names and decisions a follow-up question may need, and drop the rest. If there is an "
+    "earlier summary, merge it in. Answer with the summary only."
+)
+
+_lock = threading.Lock()
+_threads = OrderedDict()  # id -> Thread, least recently used first
+_counters = {"started": 0, "follow_ups": 0, "compactions": 0, "summary_failures": 0, "evicted": 0}
+
+
+class Thread:
+    """
+    One conversation: the page's system prompt, then a summary of the
+    older turns, then the latest (question, answer) turns.
+    """
+
+    def __init__(self, session: str, project: str, system: str, mode: str | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.session = session
+        self.project = project
+        self.system = system
+        self.mode = mode
+        self.summary = ""
+        self.turns = []
+        self.last_used = time.time()
+        self._lock = threading.Lock()
+
+    def size(self) -> int:
+        # Characters held, for the memory estimate in stats()
+        return len(self.system) + len(self.summary) + sum(len(q) + len(a) for q, a in self.turns)
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown conversation settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        _evict()
+
+
+def start(session: str, project: str, prompt: str | Prompt, mode: str | None = None) -> Thread:
+    """
+    A new thread for the page's first prompt, replacing the session's
+    previous thread on that page. Its first turn is recorded with record().
+    """
+    system = prompt.system if isinstance(prompt, Prompt) else ""
+    thread = Thread(session, project, system, mode)
+    with _lock:
+        for old in [old for old in _threads.values() if old.session == session and old.project == project]:
+            del _threads[old.id]
+        _threads[thread.id] = thread
+        _counters["started"] += 1
+        _evict()
+    return thread
+
+
+def get(thread_id: str | None) -> Thread | None:
+    """
+    The thread, if it has not been evicted.
+    """
+    with _lock:
+        _evict()
+        return _threads.get(thread_id)
+
+
+def follow_up(thread: Thread, question: str) -> Prompt:
+    """
+    The prompt for a follow-up question: the thread's system prompt and
+    summary, then as many of the latest turns as fit in `history_tokens`.
+    """
+    with _lock:
+        _counters["follow_ups"] += 1
+        _touch(thread)
+    with thread._lock:
+        summary, turns = thread.summary, list(thread.turns)
+    room = SETTINGS["history_tokens"]
+    if summary:
+        room -= budget.count_tokens(summary)
+        if room < 0:
+            summary, room = "", SETTINGS["history_tokens"]
+    history = []
+    for question_before, answer in reversed(turns):
+        room -= budget.count_tokens(question_before) + budget.count_tokens(answer)
+        if room < 0:
+            break
+        history[:0] = [("user", question_before), ("assistant", answer)]
+    system = thread.system
+    if summary:
+        system = f"{system}\n\nSummary of the conversation so far:\n{summary}".lstrip()
+    return Prompt(system, question, tuple(history))
+
+
+def record(thread_id: str, question: str | Prompt, answer: str, api_key: str = "", api_endpoint: str = ""):
+    """
+    Adds a turn to the thread, then summarizes the turns that no longer fit
+    (this asks the model, so it runs on the caller's thread).
+    """
+    with _lock:
+        thread = _threads.get(thread_id)
+        if thread is None:
+            return
+        _touch(thread)
+    with thread._lock:
+        thread.turns.append((user_text(question), answer))
+        older = _overflow(thread)
+    if older:
+        _compact(thread, older, api_key, api_endpoint)
+
+
+def forget(thread_id: str):
+    with _lock:
+        _threads.pop(thread_id, None)
+
+
+def stats() -> dict:
+    with _lock:
+        threads = list(_threads.values())
+        counters = dict(_counters)
+    counters["threads"] = len(threads)
+    counters["turns"] = sum(len(thread.turns) for thread in threads)
+    counters["kb"] = round(sum(thread.size() for thread in threads) * 2 / 1024, 1)  # ~2 bytes per character
+    return counters
+
+
+def _overflow(thread: Thread) -> list[tuple[str, str]]:
+    # Caller must hold thread._lock. Removes and returns the turns beyond the window
+    # or the token budget; the latest turn always stays.
+    keep = 0
+    room = SETTINGS["history_tokens"]
+    for index in range(len(thread.turns) - 1, -1, -1):
+        question, answer = thread.turns[index]
+        room -= budget.count_tokens(question) + budget.count_tokens(answer)
+        if keep and (keep >= SETTINGS["window"] or room < 0):
+            break
+        keep = len(thread.turns) - index
+    older = thread.turns[:len(thread.turns) - keep]
+    del thread.turns[:len(older)]
+    return older
+
+
+def _compact(thread: Thread, older: list[tuple[str, str]], api_key: str, api_endpoint: str):
+    # Folds the removed turns into the summary; without one they are simply gone
+    with _lock:
+        _counters["compactions"] += 1
+    lines = [f"Earlier summary:\n{thread.summary}\n"] if thread.summary else []
+    lines += [f"User: {question}\nAssistant: {answer}" for question, answer in older]
+    prompt = Prompt(f"{SUMMARY_PROMPT} Use at most {SETTINGS['summary_words']} words.",
+                    "Conversation:\n\n" + "\n\n".join(lines))
+    result = batch.query_llm_batch([prompt], api_key, api_endpoint, concurrency=1,
+                                   project=f"{thread.project}:summary", session=thread.session or "batch")[0]
+    if not result["ok"]:
+        with _lock:
+            _counters["summary_failures"] += 1
+        logger.warning(f"Could not summarize {len(older)} older turns, dropping them: {result['text']}")
+        return
+    with thread._lock:
+        thread.summary = result["text"].strip()
+    logger.info(f"Summarized {len(older)} older turns of a {thread.project} conversation")
+
+
+def _touch(thread: Thread):
+    # Caller must hold _lock
+    thread.last_used = time.time()
+    if thread.id in _threads:
+        _threads.move_to_end(thread.id)
+
+
+def _evict():
+    # Caller must hold _lock
+    deadline = time.time() - SETTINGS["idle_timeout"]
+    while _threads:
+        oldest = next(iter(_threads.values()))
+        if oldest.last_used >= deadline and len(_threads) <= SETTINGS["max_threads"]:
+            break
+        del _threads[oldest.id]
+        _counters["evicted"] += 1
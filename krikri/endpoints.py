@@ -0,0 +1,218 @@
+"""
+Load balancing and failover across several Krikri-compatible replicas.
+
+An endpoint setting may list several base URLs separated by commas. Each
+request goes to the healthy replica with the fewest outstanding requests
+relative to its weight. A replica that fails `fail_threshold` times in a
+row is ejected; a background health check re-admits it once it answers
+again. Transient errors are retried on another replica straight away.
+"""
+import logging
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAIError
+
+from krikri import clients
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_ENDPOINTS] section of secrets.toml
+SETTINGS = {
+    "health_interval": 10.0,   # Seconds between health checks of multi-replica setups
+    "fail_threshold": 3,       # Consecutive failures before a replica is ejected
+    "failover": True,          # Retry transient errors on another replica at once
+}
+
+_lock = threading.Lock()
+_replicas = {}  # url -> state dict, see _state()
+_weights = {}   # url -> weight, from secrets
+_checker = None
+
+
+def configure(weights: dict | None = None, **settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown endpoint settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        for url, weight in (weights or {}).items():
+            weight = float(weight)
+            if weight <= 0:
+                logger.warning(f"Ignoring weight {weight:g} of {url}: weights must be positive")
+                continue
+            _weights[url] = weight
+            if url in _replicas:
+                _replicas[url]["weight"] = weight
+
+
+def from_setting(value) -> str:
+    """
+    Turns the API_ENDPOINT of secrets.toml into the comma-separated form the
+    rest of the app passes around. It may be a URL, a list of URLs, or a
+    list of tables with "url" and "weight"; weights are registered here.
+    """
+    if isinstance(value, str):
+        return value
+    urls = []
+    for item in value:
+        if isinstance(item, str):
+            urls.append(item)
+        else:
+            urls.append(item["url"])
+            configure(weights={item["url"]: item.get("weight", 1.0)})
+    return ",".join(urls)
+
+
+def split(api_endpoint: str) -> list[str]:
+    return [url.strip() for url in api_endpoint.split(",") if url.strip()]
+
+
+def choose(api_endpoint: str, api_key: str, exclude: set = frozenset()) -> str:
+    """
+    Picks the replica for the next request: healthy, not yet tried, and
+    with the lowest outstanding requests per unit of weight.
+    """
+    urls = split(api_endpoint)
+    if len(urls) == 1:
+        return urls[0]
+    with _lock:
+        states = [_state(url, api_key) for url in urls]
+        candidates = [s for s in states if s["healthy"] and s["url"] not in exclude]
+        if not candidates:
+            # Nothing healthy left to try: fall back to anything not tried yet
+            candidates = [s for s in states if s["url"] not in exclude] or states
+        best = min((s["outstanding"] + 1) / s["weight"] for s in candidates)
+        url = random.choice([s["url"] for s in candidates if (s["outstanding"] + 1) / s["weight"] == best])
+    _start_checker()
+    return url
+
+
+@contextmanager
+def use(url: str, api_key: str):
+    """
+    Tracks one request to `url`: outstanding count, latency and errors.
+    """
+    with _lock:
+        state = _state(url, api_key)
+        state["outstanding"] += 1
+        state["requests"] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        with _lock:
+            state["outstanding"] -= 1
+            if isinstance(e, OpenAIError):
+                state["errors"] += 1
+                state["last_error"] = str(e)[:200]
+                if is_transient(e):
+                    _record_failure(state)
+        raise
+    else:
+        with _lock:
+            state["outstanding"] -= 1
+            state["latencies"].append(time.perf_counter() - started)
+            state["consecutive_failures"] = 0
+
+
+def can_fail_over(api_endpoint: str, tried: set, error: Exception) -> bool:
+    """
+    True if `error` is worth retrying right away on a replica not in `tried`.
+    """
+    if not SETTINGS["failover"] or not is_transient(error):
+        return False
+    with _lock:
+        return any(url not in tried and _replicas.get(url, {}).get("healthy", True)
+                   for url in split(api_endpoint))
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code >= 500 or error.status_code == 429)
+
+
+def stats() -> list[dict]:
+    with _lock:
+        rows = []
+        for state in _replicas.values():
+            latencies = sorted(state["latencies"])
+            rows.append({
+                "endpoint": state["url"],
+                "healthy": state["healthy"],
+                "weight": state["weight"],
+                "outstanding": state["outstanding"],
+                "requests": state["requests"],
+                "errors": state["errors"],
+                "p50 (s)": round(statistics.median(latencies), 2) if latencies else None,
+                "max (s)": round(latencies[-1], 2) if latencies else None,
+                "last error": state["last_error"],
+            })
+        return rows
+
+
+def _state(url: str, api_key: str) -> dict:
+    # Caller must hold _lock. The key of the latest call is kept for the health checks,
+    # so that they follow credentials rotated in secrets.toml.
+    state = _replicas.get(url)
+    if state is None:
+        state = _replicas[url] = {
+            "url": url,
+            "api_key": api_key,
+            "weight": _weights.get(url, 1.0),
+            "healthy": True,
+            "outstanding": 0,
+            "requests": 0,
+            "errors": 0,
+            "consecutive_failures": 0,
+            "last_error": "",
+            "latencies": deque(maxlen=200),
+        }
+    elif api_key:
+        state["api_key"] = api_key
+    return state
+
+
+def _record_failure(state: dict):
+    # Caller must hold _lock
+    state["consecutive_failures"] += 1
+    if state["healthy"] and state["consecutive_failures"] >= SETTINGS["fail_threshold"]:
+        state["healthy"] = False
+        logger.warning(f"Ejecting {state['url']} after {state['consecutive_failures']} consecutive failures")
+
+
+def _start_checker():
+    global _checker
+    with _lock:
+        if _checker is None:
+            _checker = threading.Thread(target=_check_health, name="llm-health-check", daemon=True)
+            _checker.start()
+
+
+def _check_health():
+    while True:
+        time.sleep(SETTINGS["health_interval"])
+        with _lock:
+            targets = [(state["url"], state["api_key"]) for state in _replicas.values()]
+        for url, api_key in targets:
+            try:
+                clients.get_client(api_key, url).models.list()
+                healthy = True
+            except OpenAIError as e:
+                healthy = False
+                logger.info(f"Health check of {url} failed: {e}")
+            with _lock:
+                state = _replicas[url]
+                if healthy:
+                    if not state["healthy"]:
+                        logger.info(f"Re-admitting {url} after a successful health check")
+                    state["healthy"] = True
+                    state["consecutive_failures"] = 0
+                else:
+                    _record_failure(state)
@@ -0,0 +1,425 @@
+"""
+A shared gateway in front of the Krikri API for several app processes.
+
+Each Streamlit process keeps its own client pool, in-memory cache, queue
+of requests in flight and rate limit, so N replicas behind a load balancer
+open N pools and may send N times the upstream's limit. With `url` set,
+every process sends its requests (after routing and the token budget),
+batch items included, to one gateway process on the machine instead, which runs the rest of the
+pipeline of krikri.llm for all of them: cache, coalescing of identical
+requests, hedging, admission control and the replicas of the API.
+
+The gateway speaks the OpenAI chat completions API on a TCP port or a Unix
+socket, plus GET /health and GET /metrics. Its answers carry the
+`finish_reason` and the `usage` of the upstream calls made for them (in a
+final chunk when streamed, with `stream_options.include_usage`); answers
+from the cache or from an identical request in flight cost no tokens and
+carry no usage.
+
+
+
+    python run_gateway.py --port 8100
+    python run_gateway.py --socket /run/krikri/gateway.sock
+
+If the gateway cannot be reached, requests are served by the process
+itself, as without a gateway, and the gateway is checked again through
+/health every `retry_interval` seconds.
+"""
+import itertools
+import json
+import logging
+import os
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Iterator
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAIError
+
+from krikri import admission, budget, cache, clients, endpoints, prompts, routing
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_GATEWAY] section of secrets.toml
+SETTINGS = {
+    "url": "",                # http://127.0.0.1:8100/v1 or unix:/path/to.sock; "" calls the API directly
+    "fallback": True,         # While the gateway is down, call the API from this process
+    "retry_interval": 15.0,   # Seconds before a gateway that was down is checked again
+}
+
+
+class Unavailable(Exception):
+    """
+    The gateway could not be reached; the request should be served locally.
+    """
+
+
+_lock = threading.Lock()
+_down_until = 0.0  # Monotonic time the gateway is checked again; 0 while it is up
+_serving = False   # True in the gateway process, which never relays to itself
+_counters = {"relayed": 0, "fallbacks": 0, "outages": 0}
+
+
+def configure(**settings):
+    global _down_until
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown gateway settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        _down_until = 0.0
+
+
+def available() -> bool:
+    """
+    True if requests should go to the gateway: one is configured, and it
+    is not known to be down (or there is no fallback to direct calls).
+    """
+    global _down_until
+    if _serving or not SETTINGS["url"]:
+        return False
+    with _lock:
+        if not _down_until or not SETTINGS["fallback"]:
+            return True
+        if time.monotonic() < _down_until:
+            _counters["fallbacks"] += 1
+            return False
+        # Time to check again; the other requests keep falling back meanwhile
+        _down_until = time.monotonic() + SETTINGS["retry_interval"]
+    if health() is None:
+        with _lock:
+            _counters["fallbacks"] += 1
+        return False
+    with _lock:
+        _down_until = 0.0
+    logger.info(f"Gateway {SETTINGS['url']} is back, sending requests to it again")
+    return True
+
+
+def health() -> dict | None:
+    """
+    The gateway's /health report, or None if it does not answer.
+    """
+    try:
+        client = clients.get_client("health-check", SETTINGS["url"]).with_options(timeout=2.0)
+        return client.get("/health", cast_to=object)
+    except OpenAIError as e:
+        logger.info(f"Gateway health check failed: {e}")
+        return None
+
+
+def headers(project: str, session: str, route: routing.Route, fresh: bool = False) -> dict:
+    """
+    What the gateway needs beyond the request body: the project (for its
+    cache policy and metrics), the session (for the fair queue) and the
+    route (for its endpoint and credentials). With `fresh`, the gateway's
+    response cache is neither read nor written.
+    """
+    sent = {"X-Krikri-Project": project or "", "X-Krikri-Session": session or "", "X-Krikri-Route": route.name}
+    if fresh:
+        sent["Cache-Control"] = "no-cache"
+    return sent
+
+
+def relay(deltas: Iterator) -> Iterator:
+    """
+    Passes on what a call to the gateway yields. If the gateway cannot be
+    reached, it is marked down and Unavailable is raised instead, as long
+    as nothing was yielded yet and there is a fallback.
+    """
+    produced = False
+    try:
+        for delta in deltas:
+            produced = True
+            yield delta
+    except APIConnectionError as e:
+        if produced:
+            raise
+        _unreachable(e)
+    with _lock:
+        _counters["relayed"] += 1
+
+
+async def arelay(response: Awaitable):
+    """
+    Awaits a call to the gateway made with an async client (the batch
+    loop's), with the same fallback as relay.
+    """
+    try:
+        result = await response
+    except APIConnectionError as e:
+        _unreachable(e)
+    with _lock:
+        _counters["relayed"] += 1
+    return result
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, enabled=bool(SETTINGS["url"]), down=bool(_down_until))
+
+
+def _unreachable(e: APIConnectionError):
+    # Raises Unavailable if the request should be served locally, else `e` again
+    global _down_until
+    # A timeout may be a slow upstream behind the gateway: sending it again here would not help
+    if isinstance(e, APITimeoutError) or not SETTINGS["fallback"]:
+        raise e
+    with _lock:
+        first = not _down_until
+        _down_until = time.monotonic() + SETTINGS["retry_interval"]
+        _counters["outages"] += first
+        _counters["fallbacks"] += 1
+    if first:
+        logger.warning(f"Gateway {SETTINGS['url']} is down ({e}), calling the API directly")
+    raise Unavailable(str(e)) from e
+
+
+class Gateway:
+    """
+    The gateway server: answers chat completions through krikri.llm.serve
+    with its own credentials (or, without them, the caller's API key).
+    """
+
+    def __init__(self, api_key: str, api_endpoint: str, host: str = "127.0.0.1", port: int = 8100,
+                 socket_path: str = ""):
+        global _serving
+        _serving = True
+        self.api_key = api_key
+        self.api_endpoint = api_endpoint
+        self.socket_path = socket_path
+        self.stats = {"requests": 0, "in_flight": 0, "errors": 0, "disconnects": 0}
+        self._lock = threading.Lock()
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)  # Left over from a previous run
+            self._httpd = socketserver.ThreadingUnixStreamServer(socket_path, _handler(self))
+        else:
+            self._httpd = ThreadingHTTPServer((host, port), _handler(self))
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        if self.socket_path:
+            return f"unix:{self.socket_path}"
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "Gateway":
+        threading.Thread(target=self._httpd.serve_forever, name="llm-gateway", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def _count(self, name: str, change: int = 1):
+        with self._lock:
+            self.stats[name] += change
+
+
+def _handler(gateway: Gateway):
+    from krikri import llm, metrics  # They import this module
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path.endswith("/health"):
+                report = dict(gateway.stats, status="ok" if gateway.api_endpoint else "no upstream endpoint",
+                              cache=cache.stats(), admission=admission.stats())
+                self._json(200 if gateway.api_endpoint else 503, report)
+            elif path.endswith("/metrics"):
+                self._send(200, metrics.render().encode(), "text/plain; version=0.0.4; charset=utf-8")
+            elif path.endswith("/models"):
+                if not gateway.api_endpoint:
+                    self._json(503, {"error": {"message": "The gateway has no upstream endpoint"}})
+                    return
+                try:
+                    url = endpoints.choose(gateway.api_endpoint, self._api_key())
+                    models = clients.get_client(self._api_key(), url).models.list()
+                    self._json(200, {"object": "list", "data": [model.model_dump() for model in models.data]})
+                except OpenAIError as e:
+                    self._error(e)
+            else:
+                self._json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.rfile.read(length)
+                self._json(404, {"error": {"message": "not found"}})
+                return
+            try:
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError as e:
+                self._json(400, {"error": {"message": f"Invalid JSON: {e}"}})
+                return
+            gateway._count("requests")
+            gateway._count("in_flight")
+            try:
+                self._complete(request)
+            finally:
+                gateway._count("in_flight", -1)
+
+        def _complete(self, request: dict):
+            project = self.headers.get("X-Krikri-Project", "")
+            session = self.headers.get("X-Krikri-Session", "") or "gateway"
+            route = self._route(request)
+            api_key, api_endpoint = route.target(self._api_key(), gateway.api_endpoint)
+            prompt = prompts.from_messages(request.get("messages", []))
+            max_tokens = int(request.get("max_tokens") or budget.max_tokens_for(project))
+            n = int(request.get("n") or 1)
+            stream = bool(request.get("stream"))
+            fresh = "no-cache" in self.headers.get("Cache-Control", "")
+            cancelled = threading.Event()
+            outcome = {}  # The finish_reason and usage, once the answer is complete
+            if n > 1:
+                source = llm.serve_samples(prompt, api_key, api_endpoint, project, n, route, max_tokens,
+                                           f"{project}:sample", session, cancelled=cancelled, outcome=outcome)
+                pieces = ((index, answer, True) for index, answer in enumerate(source))
+            else:
+                source = llm.serve(prompt, api_key, api_endpoint, project, route, max_tokens, stream, session,
+                                   fresh=fresh, outcome=outcome)
+                pieces = ((0, delta, False) for delta in source)
+
+            started = time.perf_counter()
+            ttft = None
+            failed = False
+            streaming = False
+            try:
+                # Errors before the first piece get their own status, as the upstream's would
+                first = next(pieces, None)
+                pieces = itertools.chain([first] if first is not None else [], pieces)
+                ttft = time.perf_counter() - started
+                if stream:
+                    streaming = True
+                    include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                    self._stream(route, pieces, outcome, include_usage)
+                else:
+                    choices = {}
+                    for index, text, _ in pieces:
+                        choices[index] = choices.get(index, "") + text
+                    body = {
+                        "id": "gateway", "object": "chat.completion", "created": int(time.time()),
+                        "model": route.model,
+                        "choices": [{"index": index, "finish_reason": "stop" if n > 1 else _finish_reason(outcome),
+                                     "message": {"role": "assistant", "content": text}}
+                                    for index, text in sorted(choices.items())],
+                    }
+                    if outcome.get("usage"):
+                        body["usage"] = outcome["usage"]
+                    self._json(200, body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The app went away (a cancelled answer): stop the upstream request too
+                gateway._count("disconnects")
+                cancelled.set()
+                self.close_connection = True
+            except Exception as e:
+                failed = True
+                gateway._count("errors")
+                if streaming:
+                    self._event({"error": {"message": _message(e)}})
+                    self._end_stream()
+                else:
+                    self._error(e)
+            finally:
+                source.close()
+                metrics.record_request(project, time.perf_counter() - started, ttft, error=failed)
+
+        def _route(self, request: dict) -> routing.Route:
+            # The app's route gives the endpoint and credentials; the request's body, the generation parameters
+            name = self.headers.get("X-Krikri-Route", "") or "default"
+            route = routing.Route(name, **routing.ROUTES.get(name, {}))
+            route.model = request.get("model") or route.model
+            if request.get("temperature") is not None:
+                route.temperature = float(request["temperature"])
+            if request.get("top_p") is not None:
+                route.top_p = float(request["top_p"])
+            return route
+
+        def _api_key(self) -> str:
+            authorization = self.headers.get("Authorization", "")
+            return gateway.api_key or authorization.removeprefix("Bearer ").strip()
+
+        def _stream(self, route: routing.Route, pieces: Iterator, outcome: dict, include_usage: bool):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            base = {"id": "gateway", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": route.model}
+            unfinished = set()
+            for index, text, whole in pieces:
+                self._event(dict(base, choices=[{"index": index, "delta": {"content": text}, "finish_reason": None}]))
+                if whole:
+                    # A sample arrives whole, so it is finished at once
+                    self._event(dict(base, choices=[{"index": index, "delta": {}, "finish_reason": "stop"}]))
+                else:
+                    unfinished.add(index)
+            for index in sorted(unfinished):
+                self._event(dict(base, choices=[{"index": index, "delta": {},
+                                                 "finish_reason": _finish_reason(outcome)}]))
+            if include_usage and outcome.get("usage"):
+                # Like the API, in a final chunk without choices
+                self._event(dict(base, choices=[], usage=outcome["usage"]))
+            self._end_stream()
+
+        def _end_stream(self):
+            self._chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def _event(self, payload: dict):
+            self._chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _error(self, e: Exception):
+            if isinstance(e, APIStatusError):
+                status = e.status_code
+            elif isinstance(e, admission.AdmissionError):
+                status = 429  # The gateway's own queue is full: the app should not go around it
+            elif isinstance(e, OpenAIError):
+                status = 502
+            else:
+                status = 500
+            logger.warning(f"Gateway request failed with {status}: {e}")
+            self._json(status, {"error": {"message": _message(e)}})
+
+        def _json(self, status: int, payload: dict):
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode(), "application/json")
+
+        def _send(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+def _finish_reason(outcome: dict) -> str:
+    # Answers from the cache or from a request in flight report none, and were complete
+    return outcome.get("finish_reason") or "stop"
+
+
+def _message(e: Exception) -> str:
+    # The upstream's own message, so that the app does not show it wrapped twice
+    if isinstance(e, APIStatusError) and isinstance(e.body, dict) and e.body.get("message"):
+        return str(e.body["message"])
+    return str(e)
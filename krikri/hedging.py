@@ -0,0 +1,223 @@
+"""
+Hedged requests, to cut the tail latency of stalled upstream calls.
+
+With hedging on, a request that has not produced its first token after
+`delay` seconds (by default the p95 of recently observed time-to-first-
+token) gets a duplicate. Whichever produces a token first wins and the
+other is cancelled: its stream is closed at once, which frees its
+connection and admission slot even while it is stalled. Both attempts
+stream even when the caller wants the whole answer at once, so that
+they race on the first token and the loser can be closed. Blocking calls
+that are not hedged are timed on their own (their first output is the
+whole answer), so they do not inflate the streams' delay.
+
+Hedges draw on a budget that grows by `max_ratio` per request, so they
+never add more than that fraction of upstream load, and they are only
+sent when admission control has a free slot.
+"""
+import contextvars
+import logging
+import queue
+import socket
+import statistics
+import threading
+from collections import deque
+from typing import Callable, Iterator
+
+from krikri import admission
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_HEDGING] section of secrets.toml
+SETTINGS = {
+    "enabled": False,
+    "projects": [],         # Project names to hedge; empty means all of them
+    "delay": 0.0,           # Fixed hedge delay in seconds; 0 uses the observed p95 TTFT
+    "default_delay": 2.0,   # Used until enough TTFT samples are collected
+    "min_samples": 20,
+    "max_ratio": 0.1,       # Hedges per request, at most (0.1 = 1.1x upstream load)
+    "max_budget": 10.0,     # Hedges that may be saved up during quiet periods
+}
+
+_lock = threading.Lock()
+_ttfts = {True: deque(maxlen=500), False: deque(maxlen=500)}  # Streamed first tokens, blocking answers
+_budget = 0.0
+_counters = {"requests": 0, "hedges": 0, "hedge_wins": 0, "over_budget": 0}
+
+# The attempt being run on this thread, if it is part of a hedged request
+_attempt = contextvars.ContextVar("hedge_attempt", default=None)
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown hedging settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+
+
+def applies(project: str | None) -> bool:
+    return SETTINGS["enabled"] and (not SETTINGS["projects"] or project in SETTINGS["projects"])
+
+
+def observe(ttft: float, stream: bool = True):
+    """
+    Records the time-to-first-token of an upstream call; for a blocking
+    call (`stream` false), the time to its whole answer.
+    """
+    with _lock:
+        _ttfts[stream].append(ttft)
+
+
+def opened(response):
+    """
+    Called by an upstream call with its open stream (anything with close()),
+    so that a hedged request can close it when the other attempt wins.
+    """
+    attempt = _attempt.get()
+    if attempt is not None:
+        attempt.track(response)
+
+
+def current_delay(stream: bool = True) -> float:
+    if SETTINGS["delay"] > 0:
+        return SETTINGS["delay"]
+    with _lock:
+        samples = list(_ttfts[stream])
+    if len(samples) < SETTINGS["min_samples"]:
+        return SETTINGS["default_delay"]
+    return statistics.quantiles(samples, n=20, method="inclusive")[18]
+
+
+def stats() -> dict:
+    with _lock:
+        counters = dict(_counters)
+    counters["delay"] = round(current_delay(), 3)
+    counters["blocking_delay"] = round(current_delay(stream=False), 3)
+    counters["hedge_rate"] = counters["hedges"] / counters["requests"] if counters["requests"] else 0.0
+    return counters
+
+
+def hedged(attempt: Callable[[bool], Iterator[str]]) -> Iterator[str]:
+    """
+    Yields the output of `attempt(False)`, racing it against `attempt(True)`
+    if it is slow to produce its first token. Both must stream and register
+    their streams with opened(). Errors are raised only once both attempts
+    that were started have failed.
+    """
+    global _budget
+    with _lock:
+        _counters["requests"] += 1
+        _budget = min(SETTINGS["max_budget"], _budget + SETTINGS["max_ratio"])
+
+    events = queue.Queue()
+    attempts = [_Attempt(), _Attempt()]
+
+    def run(index):
+        _attempt.set(attempts[index])
+        try:
+            output = attempt(index == 1)
+            try:
+                for chunk in output:
+                    if attempts[index].cancelled.is_set():
+                        break
+                    events.put((index, "chunk", chunk))
+            finally:
+                output.close()  # Releases the connection and the admission slot
+            events.put((index, "done", None))
+        except BaseException as e:
+            events.put((index, "error", e))
+
+    threading.Thread(target=run, args=(0,), name="llm-primary", daemon=True).start()
+    started = 1
+    hedge_considered = False
+    winner = None
+    failures = 0
+    try:
+        while True:
+            timeout = None if hedge_considered or winner is not None else current_delay()
+            try:
+                index, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                hedge_considered = True
+                if _take_budget():
+                    logger.info(f"No first token after {timeout:.2f}s, sending a hedge request")
+                    threading.Thread(target=run, args=(1,), name="llm-hedge", daemon=True).start()
+                    started = 2
+                continue
+
+            if winner is None:
+                if kind == "error":
+                    failures += 1
+                    if failures == started:
+                        raise value
+                    continue
+                winner = index
+                attempts[1 - index].cancel()
+                if index == 1:
+                    with _lock:
+                        _counters["hedge_wins"] += 1
+            if index != winner:
+                continue
+            if kind == "chunk":
+                yield value
+            elif kind == "done":
+                return
+            else:
+                raise value
+    finally:
+        for each in attempts:
+            each.cancel()
+
+
+class _Attempt:
+    """
+    One side of a hedged request: cancelling it closes the streams it has
+    open, so that a stalled read ends now instead of at the next chunk.
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._open = []
+
+    def track(self, response):
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._open.append(response)
+                return
+        _interrupt(response)  # Lost the race while it was being sent
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            responses, self._open = self._open, []
+        for response in responses:
+            _interrupt(response)
+
+
+def _interrupt(response):
+    # Closing the socket does not wake the thread blocked reading it; shutting it down does.
+    # That thread then fails, and closes the stream and releases its slot as on any error.
+    http_response = getattr(response, "response", response)  # An openai Stream wraps the httpx response
+    network_stream = getattr(http_response, "extensions", {}).get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    try:
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+        else:
+            response.close()
+    except (OSError, RuntimeError) as e:
+        logger.debug(f"Closing a cancelled attempt failed: {e}")
+
+
+def _take_budget() -> bool:
+    global _budget
+    with _lock:
+        if _budget < 1 or not admission.has_capacity():
+            _counters["over_budget"] += 1
+            return False
+        _budget -= 1
+        _counters["hedges"] += 1
+        return True
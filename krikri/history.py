@@ -0,0 +1,286 @@
+"""
+Each user's earlier answers, searchable and shown again without a request.
+
+Every answer query_llm, query_llm_stream or query_llm_samples completes
+for a user is appended to a SQLite file (WAL mode, so the app's processes
+read it while one of them writes) by a background writer: the page never
+waits for the disk. Searches run on connections of their own, so they do
+not wait for the writer or for a compaction either. An FTS5 index covers the prompts and answers, folded
+like the cache keys (accents, case and final sigma), so "φωτοσυνθεση"
+finds "Φωτοσύνθεση". The index is contentless and does not store a copy of
+the text.
+
+The file stays small: answers older than `max_age_days` are deleted,
+each user keeps at most `max_entries_per_user`, repeats of the same answer
+to the same prompt keep only the latest, and the freed pages are returned
+to the file system every `compact_interval` seconds.
+"""
+import contextvars
+import hashlib
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from krikri import cache
+from krikri.prompts import Prompt, user_text
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_HISTORY] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "path": ".cache/history.sqlite3",
+    "max_age_days": 30.0,          # Answers older than this are deleted
+    "max_entries_per_user": 200,   # Oldest answers of a user beyond this are deleted
+    "max_entries": 100000,         # Oldest answers beyond this are deleted, whoever they belong to
+    "max_chars": 20000,            # Longer answers are stored cut to this length
+    "compact_interval": 3600.0,    # Seconds between retention and compaction passes
+    "max_queued": 1000,            # Answers waiting for the writer; more are dropped, never waited for
+}
+
+# Whose answers these are; set by main() around dispatch (a signed-in user, or the browser tab's session)
+current_user = contextvars.ContextVar("current_user", default="")
+
+_lock = threading.Lock()     # Counters, the queue and the readers; never held across disk access
+_db_lock = threading.Lock()  # The writer's connection
+_db = None
+_readers = queue.SimpleQueue()  # Idle read-only connections
+_queue = None
+_writer = None
+_counters = {"written": 0, "dropped": 0, "deleted": 0, "compactions": 0, "searches": 0}
+
+_WORDS = re.compile(r"\w+")
+
+
+def configure(**settings):
+    global _db, _readers
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown history settings: {sorted(unknown)}")
+    with _db_lock, _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        if _db is not None:
+            _db.close()
+            _db = None
+        _readers = queue.SimpleQueue()  # Connections in use are closed when handed back
+
+
+def record(project: str | None, prompt: str | Prompt, answer: str, model: str = ""):
+    """
+    Queues a completed answer of the current user for writing. Does nothing
+    outside a user's session (batch runs, warm-up) or when disabled.
+    """
+    global _queue, _writer
+    user = current_user.get()
+    if not user or not SETTINGS["enabled"] or not SETTINGS["path"] or not answer.strip():
+        return
+    entry = (user, project or "", time.time(), user_text(prompt), answer[:SETTINGS["max_chars"]], model)
+    with _lock:
+        if _writer is None:
+            _queue = queue.Queue(SETTINGS["max_queued"])
+            _writer = threading.Thread(target=_write_forever, name="llm-history", daemon=True)
+            _writer.start()
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        with _lock:
+            _counters["dropped"] += 1
+
+
+def search(user: str, text: str = "", project: str | None = None, limit: int = 20) -> list[dict]:
+    """
+    The user's latest answers, newest first: those whose prompt or answer
+    contains every word of `text` (as a word or the start of one), and
+    only the project's if one is given.
+    """
+    words = _WORDS.findall(_fold(text))
+    sql = "SELECT id, project, created_at, prompt, answer, model FROM history WHERE user = ?"
+    params = [user]
+    if project:
+        sql += " AND project = ?"
+        params.append(project)
+    if words:
+        sql += " AND id IN (SELECT rowid FROM history_search WHERE history_search MATCH ?)"
+        params.append(" ".join(f'"{word}"*' for word in words))
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with _lock:
+        _counters["searches"] += 1
+    try:
+        rows = _read(sql, params)
+    except sqlite3.Error as e:
+        logger.error(f"History search failed: {e}")
+        return []
+    return [dict(zip(("id", "project", "created_at", "prompt", "answer", "model"), row)) for row in rows]
+
+
+def forget(user: str) -> int:
+    """
+    Deletes all of a user's answers.
+    """
+    with _db_lock:
+        db = _connect()
+        if db is None:
+            return 0
+        rows = db.execute("SELECT id, prompt, answer FROM history WHERE user = ?", (user,)).fetchall()
+        _delete(db, rows)
+        db.commit()
+    return len(rows)
+
+
+def compact() -> int:
+    """
+    Applies the retention rules, then gives the freed space back. Returns
+    the number of answers deleted. Runs on its own every `compact_interval`.
+    """
+    now = time.time()
+    with _db_lock:
+        db = _connect()
+        if db is None:
+            return 0
+        try:
+            # Repeats of an answer (e.g. cache hits): only the latest stays
+            doomed = db.execute(
+                "SELECT id, prompt, answer FROM history AS older WHERE EXISTS (SELECT 1 FROM history AS newer "
+                "WHERE newer.user = older.user AND newer.digest = older.digest AND newer.id > older.id)"
+            ).fetchall()
+            doomed += db.execute("SELECT id, prompt, answer FROM history WHERE created_at < ?",
+                                 (now - SETTINGS["max_age_days"] * 86400,)).fetchall()
+            for (user,) in db.execute("SELECT user FROM history GROUP BY user HAVING COUNT(*) > ?",
+                                      (SETTINGS["max_entries_per_user"],)).fetchall():
+                doomed += db.execute("SELECT id, prompt, answer FROM history WHERE user = ? "
+                                     "ORDER BY id DESC LIMIT -1 OFFSET ?",
+                                     (user, SETTINGS["max_entries_per_user"])).fetchall()
+            doomed += db.execute("SELECT id, prompt, answer FROM history ORDER BY id DESC LIMIT -1 OFFSET ?",
+                                 (SETTINGS["max_entries"],)).fetchall()
+            doomed = list({row[0]: row for row in doomed}.values())
+            _delete(db, doomed)
+            db.execute("INSERT INTO history_search (history_search) VALUES ('optimize')")
+            db.commit()
+            db.execute("PRAGMA incremental_vacuum").fetchall()  # Frees one page per row it returns
+            db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error as e:
+            db.rollback()
+            logger.error(f"History compaction failed: {e}")
+            return 0
+    with _lock:
+        _counters["compactions"] += 1
+    if doomed:
+        logger.info(f"History compaction deleted {len(doomed)} answers")
+    return len(doomed)
+
+
+def stats() -> dict:
+    with _lock:
+        counters = dict(_counters, queued=_queue.qsize() if _queue is not None else 0)
+    try:
+        counters["entries"] = next(iter(_read("SELECT COUNT(*) FROM history", ())), (0,))[0]
+    except sqlite3.Error:
+        counters["entries"] = 0
+    path = Path(SETTINGS["path"]) if SETTINGS["path"] else None
+    counters["kb"] = round(sum(file.stat().st_size for file in (path, Path(f"{path}-wal")) if file.exists())
+                           / 1024, 1) if path else 0.0
+    return counters
+
+
+def _fold(text: str) -> str:
+    # The form that is indexed and searched: no accents, case or final sigma
+    return cache.normalize(text).casefold()
+
+
+def _delete(db: sqlite3.Connection, rows: list[tuple[int, str, str]]):
+    # Caller must hold _db_lock. A contentless index needs the indexed values to delete them.
+    db.executemany("INSERT INTO history_search (history_search, rowid, prompt, answer) VALUES ('delete', ?, ?, ?)",
+                   [(row_id, _fold(prompt), _fold(answer)) for row_id, prompt, answer in rows])
+    db.executemany("DELETE FROM history WHERE id = ?", [(row_id,) for row_id, _, _ in rows])
+    with _lock:
+        _counters["deleted"] += len(rows)
+
+
+def _read(sql: str, params) -> list[tuple]:
+    # Runs a query on an idle read-only connection, or a new one. In WAL mode readers
+    # see the last commit and never wait for the writer.
+    path = Path(SETTINGS["path"]) if SETTINGS["path"] else None
+    if path is None or not path.exists():
+        return []
+    readers = _readers
+    try:
+        db = readers.get_nowait()
+    except queue.Empty:
+        db = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False, timeout=10.0)
+    try:
+        return db.execute(sql, params).fetchall()
+    finally:
+        if readers is _readers:
+            readers.put(db)
+        else:
+            db.close()  # The settings changed meanwhile
+
+
+def _write_forever():
+    compacted = 0.0
+    while True:
+        entries = [_queue.get()]
+        while len(entries) < 100:
+            try:
+                entries.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        with _db_lock:
+            db = _connect()
+            if db is not None:
+                try:
+                    for user, project, created_at, prompt, answer, model in entries:
+                        digest = hashlib.sha256(f"{project}\0{prompt}\0{answer}".encode("utf-8")).hexdigest()
+                        row_id = db.execute(
+                            "INSERT INTO history (user, project, created_at, prompt, answer, model, digest) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (user, project, created_at, prompt, answer, model, digest),
+                        ).lastrowid
+                        db.execute("INSERT INTO history_search (rowid, prompt, answer) VALUES (?, ?, ?)",
+                                   (row_id, _fold(prompt), _fold(answer)))
+                    db.commit()
+                    written = len(entries)
+                except sqlite3.Error as e:
+                    db.rollback()
+                    written = 0
+                    logger.error(f"Failed to write {len(entries)} history entries: {e}")
+                with _lock:
+                    _counters["written"] += written
+                    _counters["dropped"] += len(entries) - written
+        if time.monotonic() - compacted >= SETTINGS["compact_interval"]:
+            compacted = time.monotonic()
+            compact()
+
+
+def _connect():
+    # Caller must hold _db_lock. Opens the file lazily.
+    global _db
+    if _db is not None or not SETTINGS["path"]:
+        return _db
+    try:
+        path = Path(SETTINGS["path"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        db.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on a new file
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY, user TEXT NOT NULL, project TEXT NOT NULL, created_at REAL NOT NULL, "
+            "prompt TEXT NOT NULL, answer TEXT NOT NULL, model TEXT, digest TEXT NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS history_user ON history (user, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS history_digest ON history (user, digest)")
+        db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS history_search USING fts5("
+                   "prompt, answer, content='', tokenize='unicode61 remove_diacritics 2')")
+        db.commit()
+        _db = db
+    except sqlite3.Error as e:
+        logger.error(f"History unavailable: {e}")
+        SETTINGS["path"] = ""
+    return _db
@@ -0,0 +1,208 @@
+"""
+Background jobs for LLM calls.
+
+A page submits its request as a job instead of running it in the script
+thread, and keeps the handle in the user's session. The answer is produced
+by a shared worker pool whatever happens to the script run that asked for
+it, so a rerun can pick the job up again and stream it from the start.
+
+Cancelling a job (because a newer click replaced it, or its page was left)
+closes its request at the next token or queue move, which releases the
+upstream connection and the admission slot at once.
+"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+from krikri import llm
+from krikri.prompts import Prompt
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_JOBS] section of secrets.toml
+SETTINGS = {
+    "max_workers": 32,       # Jobs running (or waiting for admission) at once
+    "wait_timeout": 300.0,   # Max seconds a reader waits for the next chunk
+}
+
+_lock = threading.Lock()
+_executor = None
+_running = set()
+_counters = {"submitted": 0, "done": 0, "cancelled": 0}
+
+
+class JobCancelled(BaseException):
+    # Like asyncio.CancelledError, not an Exception, so that it is not
+    # reported as an error of the request on its way out
+    pass
+
+
+class Job:
+    """
+    One LLM call running in the background, and what it produced so far.
+    """
+
+    def __init__(self, prompt: str | Prompt, project: str, mode: str | None = None, n: int | None = None,
+                 on_done: Callable[[str], None] | None = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.prompt = prompt
+        self.project = project
+        self.mode = mode
+        self.n = n               # Several answers (see llm.query_llm_samples): each chunk is a whole one
+        self.on_done = on_done   # Called with the answer once it is complete and free of errors
+        self.state = "queued"    # "running", "done" or "cancelled"
+        self.chunks = []
+        self.timings = {}        # See llm.query_llm_stream
+        self.queue_position = None
+        self.created = time.time()
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ("done", "cancelled")
+
+    @property
+    def text(self) -> str:
+        with self._cond:
+            return "".join(self.chunks)
+
+    def cancel(self) -> bool:
+        """
+        Asks the job to stop. Returns False if it had already finished.
+        """
+        with self._cond:
+            if self.done:
+                return False
+            self._cancelled.set()
+            self._cond.notify_all()
+        logger.info(f"Cancelling job {self.id} of {self.project or 'request'}")
+        return True
+
+    def follow(self, on_wait: Callable[[int], None] | None = None) -> Iterator[str]:
+        """
+        Yields every chunk from the start, waiting for new ones until the
+        job ends. `on_wait` is called with the queue position while the
+        request waits for admission.
+        """
+        seen = 0
+        reported = None
+        while True:
+            with self._cond:
+                progress = lambda: (seen < len(self.chunks) or self.done or self._cancelled.is_set()
+                                    or self.queue_position != reported)
+                if not self._cond.wait_for(progress, SETTINGS["wait_timeout"]):
+                    raise TimeoutError(f"No progress from job {self.id} after {SETTINGS['wait_timeout']:.0f}s")
+                new = self.chunks[seen:]
+                finished = self.done or self._cancelled.is_set()
+                position = self.queue_position
+            if position != reported:
+                reported = position
+                if on_wait is not None and position is not None and not seen:
+                    on_wait(position)
+            seen += len(new)
+            yield from new
+            if finished:
+                return
+
+    def _report(self, position: int):
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+        with self._cond:
+            self.queue_position = position
+            self._cond.notify_all()
+
+    def _publish(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def _finish(self, state: str):
+        with self._cond:
+            self.state = state
+            self._cond.notify_all()
+
+
+def configure(**settings):
+    global _executor
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown job settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def submit(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str | None = None,
+           mode: str | None = None, n: int | None = None, on_done: Callable[[str], None] | None = None) -> Job:
+    """
+    Starts query_llm_stream for the prompt on the worker pool, or
+    query_llm_samples if `n` is given, and returns its job at once. The
+    caller's project and session carry over. `on_done` runs on the worker,
+    after the job is marked done, with the whole answer.
+    """
+    global _executor
+    job = Job(prompt, project or llm.current_project.get(), mode, n, on_done)
+    context = contextvars.copy_context()
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(SETTINGS["max_workers"], thread_name_prefix="llm-job")
+        _counters["submitted"] += 1
+        _running.add(job)
+        _executor.submit(context.run, _run, job, api_key, api_endpoint)
+    return job
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, running=len(_running))
+
+
+def _run(job: Job, api_key: str, api_endpoint: str):
+    state = "cancelled"
+    try:
+        if job._cancelled.is_set():
+            return
+        job.state = "running"
+        if job.n:
+            # Its answers arrive whole, so it also checks for cancellation at every token
+            stream = llm.query_llm_samples(job.prompt, api_key, api_endpoint, job.n, timings=job.timings,
+                                           project=job.project, on_wait=job._report, mode=job.mode,
+                                           cancelled=job._cancelled)
+        else:
+            stream = llm.query_llm_stream(job.prompt, api_key, api_endpoint, timings=job.timings,
+                                          project=job.project, on_wait=job._report, mode=job.mode)
+        try:
+            for chunk in stream:
+                if job._cancelled.is_set():
+                    return
+                job._publish(chunk)
+        finally:
+            # Closing the stream ends the upstream call if nobody else follows it
+            stream.close()
+        state = "cancelled" if job._cancelled.is_set() else "done"
+    except JobCancelled:
+        pass
+    except Exception as e:
+        # query_llm_stream yields its errors as text; anything else is a bug
+        logger.exception(f"Job {job.id} failed")
+        job._publish(f"An unexpected error occurred: {e}")
+        job.timings["failed"] = True
+        state = "done"
+    finally:
+        job._finish(state)
+        with _lock:
+            _running.discard(job)
+            _counters[state] += 1
+    if state == "done" and job.on_done is not None and not job.timings.get("failed"):
+        try:
+            job.on_done(job.text)
+        except Exception:
+            logger.exception(f"Completion callback of job {job.id} failed")
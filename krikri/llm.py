@@ -0,0 +1,512 @@
+"""
+Calls to the Krikri API, blocking and streaming.
+
+Both entry points go through the same pipeline: route (model, endpoint
+and generation parameters, see krikri.routing), then token budget (prompt
+length and max_tokens, see krikri.budget), then response cache, then
+coalescing with identical requests already in flight, then (optionally)
+hedging, then admission control (rate limit, fair queue, retries), then
+the least loaded healthy replica of the API.
+
+query_llm_samples asks for several independent answers at once (see
+krikri.sampling); those skip the cache, coalescing and hedging.
+
+Every answer completed for a user is also kept in krikri.history.
+
+With a shared gateway configured (see krikri.gateway), everything after
+the token budget runs in the gateway process instead, for all the app's
+processes at once, and here again while the gateway is down.
+"""
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Iterator
+
+from openai import APITimeoutError, BadRequestError, OpenAIError
+
+from krikri import (admission, budget, cache, clients, endpoints, gateway, hedging, history, metrics, routing,
+                    sampling, singleflight)
+from krikri.prompts import Prompt, messages
+
+logger = logging.getLogger(__name__)
+
+# Name of the project page and Streamlit session issuing requests; set by main() around dispatch
+current_project = contextvars.ContextVar("current_project", default="")
+current_session = contextvars.ContextVar("current_session", default="")
+
+
+def _check_credentials(api_key: str, api_endpoint: str) -> str | None:
+    if not api_key:
+        return "Error: API Key is missing. Please configure the application."
+    if not api_endpoint:
+        return "Error: API Endpoint is missing."
+    return None
+
+
+def _error_message(e: Exception) -> str:
+    if isinstance(e, budget.PromptTooLong):
+        logger.warning(f"Prompt rejected: {e}")
+        return str(e)
+    if isinstance(e, admission.AdmissionError):
+        logger.warning(f"Request not admitted: {e}")
+        return f"The service is busy: {str(e)}"
+    if isinstance(e, OpenAIError):
+        logger.error(f"OpenAI API Error: {e}")
+        return f"API Error: {str(e)}"
+    logger.error(f"General Error: {e}")
+    return f"An unexpected error occurred: {str(e)}"
+
+
+def _report(outcome: dict | None, finish_reason: str | None, usage):
+    # Tells the caller of serve() why an answer ended and what it took; the usage of several calls adds up
+    if outcome is None:
+        return
+    if finish_reason:
+        outcome["finish_reason"] = finish_reason
+    if usage:
+        total = outcome.setdefault("usage", {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0,
+                                             "prompt_tokens_details": {"cached_tokens": 0}})
+        total["prompt_tokens"] += usage.prompt_tokens
+        total["completion_tokens"] += usage.completion_tokens
+        total["total_tokens"] += usage.total_tokens
+        total["prompt_tokens_details"]["cached_tokens"] += metrics.cached_tokens(usage)
+
+
+def _complete(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, route: routing.Route,
+              max_tokens: int, headers: dict | None = None, outcome: dict | None = None) -> Iterator[str]:
+    # Reuse the process-wide client (and its open connections) for this endpoint
+    client = clients.get_client(api_key, api_endpoint)
+
+    logger.info(f"Sending request to {api_endpoint} using model {route.model} (route {route.name})")
+
+    response = client.chat.completions.create(
+        messages=messages(prompt),
+        max_tokens=max_tokens,
+        **route.params(),
+        extra_headers=headers
+    )
+    text = response.choices[0].message.content or ""
+    if response.usage:
+        metrics.record_usage(project, response.usage.prompt_tokens, response.usage.completion_tokens,
+                             metrics.cached_tokens(response.usage))
+    completion_tokens = response.usage.completion_tokens if response.usage else budget.count_tokens(text)
+    budget.observe(project, completion_tokens, max_tokens)
+    _report(outcome, response.choices[0].finish_reason, response.usage)
+    yield text
+
+
+def _complete_stream(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, route: routing.Route,
+                     max_tokens: int, budget_key: str | None = None, headers: dict | None = None,
+                     outcome: dict | None = None) -> Iterator[str]:
+    client = clients.get_client(api_key, api_endpoint)
+
+    logger.info(f"Streaming request to {api_endpoint} using model {route.model} (route {route.name})")
+
+    stream = client.chat.completions.create(
+        messages=messages(prompt),
+        max_tokens=max_tokens,
+        **route.params(),
+        stream=True,
+        stream_options={"include_usage": True},  # Usage arrives in a final chunk without choices
+        extra_headers=headers
+    )
+    hedging.opened(stream)  # If this attempt loses a hedged race, it is closed even while stalled
+    parts = []
+    usage = None
+    finish_reason = None
+    with stream:
+        for chunk in stream:
+            if chunk.usage:
+                metrics.record_usage(project, chunk.usage.prompt_tokens, chunk.usage.completion_tokens,
+                                     metrics.cached_tokens(chunk.usage))
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].finish_reason:
+                finish_reason = chunk.choices[0].finish_reason
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    completion_tokens = usage.completion_tokens if usage else budget.count_tokens("".join(parts))
+    budget.observe(budget_key or project, completion_tokens, max_tokens)
+    _report(outcome, finish_reason, usage)
+
+
+def _complete_samples(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, route: routing.Route,
+                      max_tokens: int, n: int, budget_key: str, headers: dict | None = None,
+                      outcome: dict | None = None) -> Iterator[tuple[int, str | None]]:
+    # Yields (choice index, delta) as the n choices stream in side by side, and (index, None) when one ends
+    client = clients.get_client(api_key, api_endpoint)
+
+    logger.info(f"Streaming {n} samples from {api_endpoint} using model {route.model} (route {route.name})")
+
+    stream = client.chat.completions.create(
+        messages=messages(prompt),
+        max_tokens=max_tokens,
+        n=n,
+        **route.params(),
+        stream=True,
+        stream_options={"include_usage": True},
+        extra_headers=headers
+    )
+    lengths = defaultdict(int)
+    with stream:
+        for chunk in stream:
+            if chunk.usage:
+                metrics.record_usage(project, chunk.usage.prompt_tokens, chunk.usage.completion_tokens,
+                                     metrics.cached_tokens(chunk.usage))
+                _report(outcome, None, chunk.usage)
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    lengths[choice.index] += budget.count_tokens(choice.delta.content)
+                    yield choice.index, choice.delta.content
+                if choice.finish_reason:
+                    budget.observe(budget_key, lengths[choice.index], max_tokens)
+                    yield choice.index, None
+
+
+def _admitted(upstream: Callable, prompt: str | Prompt, api_key: str, api_endpoint: str, project: str,
+              route: routing.Route, session: str, on_wait: Callable[[int], None] | None,
+              stream: bool = True, max_queued: int | None = None) -> Iterator[str]:
+    """
+    Runs an upstream call inside an admission slot, on the replica chosen by
+    krikri.endpoints. As long as nothing was yielded yet, transient errors
+    fail over to another replica at once, and throttled or failed attempts
+    are retried with backoff once every replica has been tried. Only a
+    streamed call's first token counts as its time to first token.
+    `max_queued` is passed on to admission.acquire.
+    """
+    attempt = 0
+    tried = set()
+    while True:
+        produced = False
+        url = endpoints.choose(api_endpoint, api_key, tried)
+        try:
+            with admission.admit(session, on_wait, max_queued), endpoints.use(url, api_key):
+                sent = time.perf_counter()
+                for delta in upstream(prompt, api_key, url, project, route):
+                    if not produced:
+                        hedging.observe(time.perf_counter() - sent, stream)
+                        if stream:
+                            routing.observe(route, time.perf_counter() - sent)
+                    produced = True
+                    yield delta
+            return
+        except OpenAIError as e:
+            if produced:
+                raise
+            if stream and isinstance(e, APITimeoutError):
+                routing.observe(route, time.perf_counter() - sent)
+            tried.add(url)
+            if endpoints.can_fail_over(api_endpoint, tried, e):
+                logger.warning(f"Failing over from {url} after: {e}")
+                continue
+            attempt += 1
+            delay = admission.retry_delay(e, attempt)
+            if delay is None:
+                raise
+            logger.warning(f"Retrying in {delay:.1f}s after: {e}")
+            time.sleep(delay)
+            tried.clear()
+
+
+def _relayed(upstream: Callable, prompt: str | Prompt, api_key: str, project: str, route: routing.Route,
+             session: str, stream: bool = True) -> Iterator:
+    """
+    Runs an upstream call against the shared gateway instead of the API.
+    Raises gateway.Unavailable, before anything was yielded, if the gateway
+    cannot be reached and the request should be served here.
+    """
+    sent = time.perf_counter()
+    produced = False
+    for delta in gateway.relay(upstream(prompt, api_key, gateway.SETTINGS["url"], project, route,
+                                        headers=gateway.headers(project, session, route))):
+        if not produced and stream:
+            routing.observe(route, time.perf_counter() - sent)
+        produced = True
+        yield delta
+
+
+def _generate(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, stream: bool,
+              route: routing.Route, on_wait: Callable[[int], None] | None = None) -> Iterator[str]:
+    """
+    Yields the answer from the gateway, or from this process's pipeline
+    (see serve). Errors are raised, not formatted.
+    """
+    api_key, api_endpoint = route.target(api_key, api_endpoint)
+    routing.served(project, route)
+    prompt, max_tokens = budget.prepare(prompt, project)
+    upstream = functools.partial(_complete_stream if stream else _complete, max_tokens=max_tokens)
+    session = current_session.get()
+    if gateway.available():
+        try:
+            yield from _relayed(upstream, prompt, api_key, project, route, session, stream)
+            return
+        except gateway.Unavailable:
+            pass  # Served here instead
+    yield from serve(prompt, api_key, api_endpoint, project, route, max_tokens, stream, session, on_wait)
+
+
+def serve(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, route: routing.Route,
+          max_tokens: int, stream: bool, session: str,
+          on_wait: Callable[[int], None] | None = None, fresh: bool = False,
+          outcome: dict | None = None) -> Iterator[str]:
+    """
+    Yields the answer to a request whose route and budget are settled: from
+    the cache, from an identical request in flight, or from the API. With
+    `fresh`, the cache is neither read nor written. An answer cut off at
+    max_tokens is not cached, and only shared with identical requests of
+    the same max_tokens. `outcome`, if given, receives the "finish_reason"
+    and "usage" of the calls made for the answer. Errors are raised, not
+    formatted.
+    """
+    outcome = {} if outcome is None else outcome
+    upstream = functools.partial(_complete_stream if stream else _complete, max_tokens=max_tokens, outcome=outcome)
+
+    def call(report):
+        if hedging.applies(project):
+            # Hedged attempts stream even for a blocking request, so that the losing one can be closed
+            # while it waits; only the primary attempt reports its queue position
+            streamed = functools.partial(_complete_stream, max_tokens=max_tokens, outcome=outcome)
+            return hedging.hedged(lambda is_hedge: _admitted(
+                streamed, prompt, api_key, api_endpoint, project, route, session, None if is_hedge else report))
+        return _admitted(upstream, prompt, api_key, api_endpoint, project, route, session, report, stream)
+
+    ttl = None if fresh else cache.ttl_for(project)
+    if ttl is None:
+        # Pages that opted out of caching want independent samples
+        yield from call(on_wait)
+        return
+
+    key = cache.make_key(prompt, route.model, route.temperature, route.top_p)
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"Cache hit for {project or 'request'}")
+        yield cached
+        return
+
+    def produce(report):
+        parts = []
+        for delta in call(report):
+            parts.append(delta)
+            yield delta
+        # Only complete, error-free answers are cached
+        if not parts:
+            return
+        if outcome.get("finish_reason") == "length":
+            logger.info(f"Not caching an answer cut off at {max_tokens} tokens")
+            return
+        cache.put(key, "".join(parts), ttl)
+
+    # max_tokens is not part of the cache key, but a request with a larger one must not follow a shorter answer
+    yield from singleflight.run(f"{key}:{max_tokens}", produce, on_wait)
+
+
+def _answers(choices: Iterator[tuple[int, str | None]], cancelled: threading.Event | None) -> Iterator[str]:
+    # Whole answers from the (index, delta) pairs of _complete_samples, each as soon as it ends
+    parts = defaultdict(list)
+    for index, delta in choices:
+        if cancelled is not None and cancelled.is_set():
+            return
+        if delta is not None:
+            parts[index].append(delta)
+            continue
+        yield "".join(parts.pop(index, []))
+    for index in sorted(parts):  # Choices the server never marked finished
+        yield "".join(parts.pop(index))
+
+
+def _generate_samples(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, n: int,
+                      route: routing.Route, on_wait: Callable[[int], None] | None = None,
+                      cancelled: threading.Event | None = None) -> Iterator[str]:
+    """
+    Yields n answers, each one whole as soon as it is complete, from the
+    gateway or from this process (see serve_samples). Setting `cancelled`
+    stops the requests at their next token.
+    """
+    api_key, api_endpoint = route.target(api_key, api_endpoint)
+    routing.served(project, route)
+    prompt, max_tokens = budget.prepare(prompt, project)
+    # Each answer is one item of a list, much shorter than a whole answer: budget them on their own
+    budget_key = f"{project}:sample"
+    max_tokens = min(max_tokens, budget.max_tokens_for(budget_key))
+    session = current_session.get()
+    if gateway.available():
+        upstream = functools.partial(_complete_samples, max_tokens=max_tokens, n=n, budget_key=budget_key)
+        try:
+            yield from _answers(_relayed(upstream, prompt, api_key, project, route, session), cancelled)
+            return
+        except gateway.Unavailable:
+            pass  # Served here instead
+    yield from serve_samples(prompt, api_key, api_endpoint, project, n, route, max_tokens, budget_key, session,
+                             on_wait, cancelled)
+
+
+def serve_samples(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str, n: int,
+                  route: routing.Route, max_tokens: int, budget_key: str, session: str,
+                  on_wait: Callable[[int], None] | None = None,
+                  cancelled: threading.Event | None = None, outcome: dict | None = None) -> Iterator[str]:
+    """
+    Yields n answers to a request whose route and budget are settled: from
+    one request with `n` when the endpoint supports it, otherwise (or for
+    the ones it did not return) from parallel requests. `outcome` receives
+    the "usage" of all of them, as in serve.
+    """
+    finished = 0
+    if n > 1 and sampling.supports_n(api_endpoint):
+        upstream = functools.partial(_complete_samples, max_tokens=max_tokens, n=n, budget_key=budget_key,
+                                     outcome=outcome)
+        try:
+            for answer in _answers(_admitted(upstream, prompt, api_key, api_endpoint, project, route, session,
+                                             on_wait), cancelled):
+                finished += 1
+                yield answer
+        except BadRequestError as e:
+            if finished:
+                raise
+            sampling.lacks_n(api_endpoint, f"rejected n={n} ({e})")
+        else:
+            if cancelled is not None and cancelled.is_set():
+                return
+            if finished < n:
+                sampling.lacks_n(api_endpoint, f"returned {finished} of n={n} results")
+        on_wait = None  # The queue position was already reported
+    if finished >= n:
+        return
+
+    # All of them queue under the session at once, like a batch's items
+    upstream = functools.partial(_complete_stream, max_tokens=max_tokens, budget_key=budget_key, outcome=outcome)
+    yield from sampling.in_parallel(lambda index: _admitted(
+        upstream, prompt, api_key, api_endpoint, project, route, session, on_wait if index == 0 else None,
+        max_queued=n), n - finished, cancelled)
+
+
+def query_llm(prompt: str | Prompt, api_key: str, api_endpoint: str, project: str | None = None,
+              mode: str | None = None) -> str:
+    """
+    Executes a request to the Krikri API using the OpenAI client library.
+    Answers are served from the response cache when the project allows it.
+    A krikri.prompts.Prompt is sent as a system and a user message.
+    `mode` picks a per-mode route of the project, if one is configured.
+    """
+    error = _check_credentials(api_key, api_endpoint)
+    if error:
+        return error
+
+    project = project or current_project.get()
+    started = time.perf_counter()
+    try:
+        route = routing.choose(project, mode)
+        answer = "".join(_generate(prompt, api_key, api_endpoint, project, stream=False, route=route))
+    except Exception as e:
+        metrics.record_request(project, time.perf_counter() - started, error=True)
+        return _error_message(e)
+    metrics.record_request(project, time.perf_counter() - started)
+    history.record(project, prompt, answer, route.model)
+    return answer
+
+
+def query_llm_stream(prompt: str | Prompt, api_key: str, api_endpoint: str,
+                     timings: dict | None = None, project: str | None = None,
+                     on_wait: Callable[[int], None] | None = None, mode: str | None = None) -> Iterator[str]:
+    """
+    Streaming variant of query_llm: yields the completion piece by piece.
+
+    Errors are yielded as text, with the same messages query_llm returns, so
+    a failure mid-stream shows up after the part that already arrived.
+    If `timings` is given it receives "ttft" (seconds to the first token),
+    "total" (seconds until the stream ended), "failed" (whether it ended
+    with an error) and the "route" and "model" that served it. `on_wait` is called with the queue position while the
+    request waits for admission.
+    """
+    error = _check_credentials(api_key, api_endpoint)
+    if error:
+        yield error
+        return
+
+    project = project or current_project.get()
+    started = time.perf_counter()
+    ttft = None
+    failed = False
+    route = routing.choose(project, mode)
+    if timings is not None:
+        timings["route"] = route.name
+        timings["model"] = route.model
+    parts = []
+    try:
+        for delta in _generate(prompt, api_key, api_endpoint, project, stream=True, route=route, on_wait=on_wait):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        failed = True
+        yield ("\n\n" if ttft is not None else "") + _error_message(e)
+    finally:
+        total = time.perf_counter() - started
+        metrics.record_request(project, total, ttft, error=failed)
+        if timings is not None:
+            timings["ttft"] = ttft
+            timings["total"] = total
+            timings["failed"] = failed
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+        logger.info(f"Stream finished: first token {ttft_text}, total {total:.2f}s")
+    # Only reached if the caller read the stream to its end
+    if not failed:
+        history.record(project, prompt, "".join(parts), route.model)
+
+
+def query_llm_samples(prompt: str | Prompt, api_key: str, api_endpoint: str, n: int,
+                      timings: dict | None = None, project: str | None = None,
+                      on_wait: Callable[[int], None] | None = None, mode: str | None = None,
+                      cancelled: threading.Event | None = None) -> Iterator[str]:
+    """
+    Asks for `n` independent answers to the prompt (each one a single item,
+    e.g. one excuse) and yields each one whole as soon as it is complete,
+    leaving out near-duplicates, so fewer than `n` may come back.
+
+    Errors are yielded as text, as by query_llm_stream, after the answers
+    that already arrived. `timings` receives "ttft" (seconds to the first
+    answer), "total", "failed", "route" and "model"; `on_wait` is called with the
+    queue position while the request waits for admission. Results end
+    early, within a token, once `cancelled` is set.
+    """
+    error = _check_credentials(api_key, api_endpoint)
+    if error:
+        yield error
+        return
+
+    project = project or current_project.get()
+    n = max(1, min(n, sampling.SETTINGS["max_n"]))
+    started = time.perf_counter()
+    ttft = None
+    failed = False
+    route = routing.choose(project, mode)
+    if timings is not None:
+        timings["route"] = route.name
+        timings["model"] = route.model
+    results = sampling.distinct(_generate_samples(prompt, api_key, api_endpoint, project, n, route, on_wait,
+                                                  cancelled))
+    answers = []
+    try:
+        for result in results:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            answers.append(result)
+            yield result
+    except Exception as e:
+        failed = True
+        yield _error_message(e)
+    finally:
+        results.close()  # Stops the requests still running if the caller went away
+        total = time.perf_counter() - started
+        metrics.record_request(project, total, ttft, error=failed)
+        if timings is not None:
+            timings["ttft"] = ttft
+            timings["total"] = total
+            timings["failed"] = failed
+        logger.info(f"{n} samples finished in {total:.2f}s")
+    if not failed and not (cancelled is not None and cancelled.is_set()):
+        history.record(project, prompt, "\n\n".join(f"{index}. {answer}" for index, answer in enumerate(answers, 1)),
+                       route.model)
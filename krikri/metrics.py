@@ -0,0 +1,306 @@
+"""
+Per-project metrics for the LLM calls and the pages that make them.
+
+Counters and fixed-bucket histograms are kept in memory under one lock,
+so recording is a few additions and cheap enough to leave on. They are
+rendered in the Prometheus text format, together with the stats of the
+cache, the admission queue and the other shared plumbing, and can be
+scraped over HTTP or written to a file for node_exporter's textfile
+collector.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from krikri import (admission, budget, cache, clients, endpoints, gateway, hedging, history, routing, sampling,
+                    singleflight)
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_METRICS] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "port": 0,              # Serve /metrics on 127.0.0.1:port; 0 disables it
+    "host": "127.0.0.1",
+    "path": "",             # Write the metrics to this file; "" disables it
+    "write_interval": 15.0,
+}
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}    # (name, project) -> value
+_histograms = {}  # (name, project) -> [bucket counts..., +Inf count, sum]
+_server = None
+_writer = None
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown metrics settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+    _start_exporters()
+
+
+def record_request(project: str | None, total: float, ttft: float | None = None, error: bool = False):
+    """
+    Records one answered query_llm call (including cached and shared ones).
+    """
+    if not SETTINGS["enabled"]:
+        return
+    project = project or "other"
+    with _lock:
+        _add("requests", project)
+        if error:
+            _add("errors", project)
+        _observe("request_duration", project, total)
+        if ttft is not None:
+            _observe("time_to_first_token", project, ttft)
+
+
+def record_usage(project: str | None, prompt_tokens: int | None, completion_tokens: int | None,
+                 cached_prompt_tokens: int = 0):
+    """
+    Records the tokens an upstream call consumed, from response.usage.
+    """
+    if not SETTINGS["enabled"]:
+        return
+    project = project or "other"
+    with _lock:
+        _add("upstream_calls", project)
+        _add("prompt_tokens", project, prompt_tokens or 0)
+        _add("cached_prompt_tokens", project, cached_prompt_tokens)
+        _add("completion_tokens", project, completion_tokens or 0)
+
+
+def cached_tokens(usage) -> int:
+    """
+    Prompt tokens the server reports it took from its prefix cache, if it does.
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (details.cached_tokens or 0) if details is not None else 0
+
+
+@contextmanager
+def page_run(project: str):
+    """
+    Times one run of a project page, counting the ones that raise.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        if SETTINGS["enabled"]:
+            with _lock:
+                _add("page_errors", project)
+        raise
+    finally:
+        if SETTINGS["enabled"]:
+            with _lock:
+                _add("page_runs", project)
+                _observe("page_duration", project, time.perf_counter() - started)
+
+
+def snapshot() -> list[dict]:
+    """
+    One row per project, for the admin page. Quantiles are estimated from
+    the histogram buckets.
+    """
+    with _lock:
+        projects = sorted({project for _, project in _counters})
+        rows = []
+        for project in projects:
+            requests = _counters.get(("requests", project), 0)
+            errors = _counters.get(("errors", project), 0)
+            rows.append({
+                "project": project,
+                "requests": requests,
+                "errors": errors,
+                "error rate": round(errors / requests, 3) if requests else 0.0,
+                "p50 (s)": _quantile(("request_duration", project), 0.5),
+                "p95 (s)": _quantile(("request_duration", project), 0.95),
+                "first token p50 (s)": _quantile(("time_to_first_token", project), 0.5),
+                "prompt tokens": _counters.get(("prompt_tokens", project), 0),
+                "cached prompt tokens": _counters.get(("cached_prompt_tokens", project), 0),
+                "completion tokens": _counters.get(("completion_tokens", project), 0),
+                "page runs": _counters.get(("page_runs", project), 0),
+            })
+        return rows
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    for name, help_text in (
+        ("requests", "LLM requests answered, by project"),
+        ("errors", "LLM requests that ended in an error, by project"),
+        ("upstream_calls", "Calls that reached the API, by project"),
+        ("prompt_tokens", "Prompt tokens reported by the API, by project"),
+        ("cached_prompt_tokens", "Prompt tokens the API served from its prefix cache, by project"),
+        ("completion_tokens", "Completion tokens reported by the API, by project"),
+        ("page_runs", "Runs of a project page, by project"),
+        ("page_errors", "Runs of a project page that raised, by project"),
+    ):
+        lines += [f"# HELP krikri_{name}_total {help_text}", f"# TYPE krikri_{name}_total counter"]
+        lines += [f'krikri_{name}_total{{project="{_escape(project)}"}} {value}'
+                  for (metric, project), value in sorted(counters.items()) if metric == name]
+
+    for name, help_text in (
+        ("request_duration", "Seconds until an LLM request was fully answered"),
+        ("time_to_first_token", "Seconds until the first token of a streamed answer"),
+        ("page_duration", "Seconds a project page took to run"),
+    ):
+        lines += [f"# HELP krikri_{name}_seconds {help_text}", f"# TYPE krikri_{name}_seconds histogram"]
+        for (metric, project), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            label = f'project="{_escape(project)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, values):
+                cumulative += count
+                lines.append(f'krikri_{name}_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += values[len(BUCKETS)]
+            lines.append(f'krikri_{name}_seconds_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"krikri_{name}_seconds_sum{{{label}}} {values[-1]:.6f}")
+            lines.append(f"krikri_{name}_seconds_count{{{label}}} {cumulative}")
+
+    # Stats the other modules already keep, exported as gauges
+    for prefix, values in (
+        ("cache", cache.stats()),
+        ("admission", admission.stats()),
+        ("coalesce", singleflight.stats()),
+        ("hedging", hedging.stats()),
+        ("sampling", sampling.stats()),
+        ("gateway", gateway.stats()),
+        ("history", history.stats()),
+        ("pool", clients.stats()),
+    ):
+        for name, value in values.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE krikri_{prefix}_{name} gauge")
+                lines.append(f"krikri_{prefix}_{name} {value}")
+
+    for name in ("healthy", "outstanding", "requests", "errors"):
+        lines.append(f"# TYPE krikri_endpoint_{name} gauge")
+        for row in endpoints.stats():
+            lines.append(f'krikri_endpoint_{name}{{endpoint="{_escape(row["endpoint"])}"}} {int(row[name])}')
+
+    budget_rows = budget.stats()
+    for name, column in (("max_tokens", "max_tokens"), ("truncated_total", "truncated"),
+                         ("trimmed_total", "trimmed"), ("rejected_total", "rejected")):
+        lines.append(f"# TYPE krikri_budget_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for row in budget_rows:
+            lines.append(f'krikri_budget_{name}{{project="{_escape(row["project"])}"}} {row[column]}')
+
+    lines += ["# HELP krikri_route_requests_total LLM requests, by project and the route that served them",
+              "# TYPE krikri_route_requests_total counter"]
+    lines += [f'krikri_route_requests_total{{project="{_escape(project)}",route="{_escape(route)}"}} {count}'
+              for (project, route), count in sorted(routing.served_counts().items())]
+    route_rows = routing.stats()
+    for name, column in (("degraded", "degraded"), ("downgrades_total", "downgrades")):
+        lines.append(f"# TYPE krikri_route_{name} {'counter' if name.endswith('_total') else 'gauge'}")
+        for row in route_rows:
+            label = f'route="{_escape(row["route"])}",model="{_escape(row["model"])}"'
+            lines.append(f"krikri_route_{name}{{{label}}} {int(row[column])}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def _add(name: str, project: str, value: float = 1):
+    # Caller must hold _lock
+    key = (name, project)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(name: str, project: str, seconds: float):
+    # Caller must hold _lock
+    values = _histograms.get((name, project))
+    if values is None:
+        values = _histograms[(name, project)] = [0] * (len(BUCKETS) + 1) + [0.0]
+    values[bisect.bisect_left(BUCKETS, seconds)] += 1
+    values[-1] += seconds
+
+
+def _quantile(key: tuple, q: float) -> float | None:
+    # Caller must hold _lock. Linear interpolation inside the bucket, as PromQL does.
+    values = _histograms.get(key)
+    if not values:
+        return None
+    counts = values[:-1]
+    rank = q * sum(counts)
+    seen = 0
+    for index, count in enumerate(counts):
+        if count and seen + count >= rank:
+            lower = BUCKETS[index - 1] if index else 0.0
+            upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1]
+            return round(lower + (upper - lower) * (rank - seen) / count, 3)
+        seen += count
+    return None
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_exporters():
+    global _server, _writer
+    with _lock:
+        if SETTINGS["port"] and _server is None:
+            try:
+                _server = ThreadingHTTPServer((SETTINGS["host"], SETTINGS["port"]), _Handler)
+            except OSError as e:
+                logger.warning(f"Could not serve metrics on port {SETTINGS['port']}: {e}")
+            else:
+                threading.Thread(target=_server.serve_forever, name="llm-metrics-http", daemon=True).start()
+                logger.info(f"Serving metrics on http://{SETTINGS['host']}:{SETTINGS['port']}/metrics")
+        if SETTINGS["path"] and _writer is None:
+            _writer = threading.Thread(target=_write_periodically, name="llm-metrics-file", daemon=True)
+            _writer.start()
+
+
+def _write_periodically():
+    while True:
+        path = SETTINGS["path"]
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(render())
+            os.replace(path + ".tmp", path)  # Never expose a half-written file
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+        time.sleep(SETTINGS["write_interval"])
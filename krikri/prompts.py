@@ -0,0 +1,96 @@
+"""
+Prompts split into a system part and a user part.
+
+Inference servers with prefix caching (vLLM, SGLang, llama.cpp) skip the
+prefill of any leading tokens they have already processed for an earlier
+request. A project that sends its fixed instructions as a system message
+that never changes, with the user's values only in the user message after
+it, has that whole prefix cached after its first request. A single user
+message that starts with a user value shares nothing.
+
+A follow-up in a conversation (see krikri.conversation) also carries the
+earlier turns, sent between the two; the conversation so far is then the
+cached prefix of the next request.
+
+Prompt builders return a Prompt; a plain string is accepted everywhere a
+Prompt is and is sent as one user message.
+"""
+
+
+class Prompt:
+    """
+    A static `system` part, byte-identical across requests of a project,
+    and the variable `user` part, optionally after the `history` of earlier
+    turns: (role, content) pairs, oldest first.
+    """
+
+    __slots__ = ("system", "user", "history")
+
+    def __init__(self, system: str, user: str, history: tuple[tuple[str, str], ...] = ()):
+        self.system = system
+        self.user = user
+        self.history = tuple(history)
+
+    def __str__(self) -> str:
+        return text(self)
+
+    def __repr__(self) -> str:
+        turns = f", history={len(self.history)} messages" if self.history else ""
+        return f"Prompt(system={self.system[:40]!r}..., user={self.user[:40]!r}...{turns})"
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, Prompt)
+                and (self.system, self.user, self.history) == (other.system, other.user, other.history))
+
+    def __hash__(self) -> int:
+        return hash((self.system, self.user, self.history))
+
+
+def messages(prompt: str | Prompt) -> list[dict]:
+    """
+    The chat messages for a prompt: system first, so it forms the prefix,
+    then the earlier turns.
+    """
+    if not isinstance(prompt, Prompt):
+        return [{"role": "user", "content": prompt}]
+    system = [{"role": "system", "content": prompt.system}] if prompt.system else []
+    history = [{"role": role, "content": content} for role, content in prompt.history]
+    return system + history + [{"role": "user", "content": prompt.user}]
+
+
+def from_messages(chat: list[dict]) -> str | Prompt:
+    """
+    The prompt that messages() turned into `chat` (for the gateway, which
+    receives chat messages): a leading system message, the last user
+    message, and the turns in between.
+    """
+    chat = [(message.get("role", "user"), str(message.get("content") or "")) for message in chat]
+    system = chat.pop(0)[1] if chat and chat[0][0] == "system" else ""
+    user = chat.pop()[1] if chat and chat[-1][0] == "user" else ""
+    if not system and not chat:
+        return user
+    return Prompt(system, user, tuple(chat))
+
+
+def text(prompt: str | Prompt) -> str:
+    """
+    The whole prompt as one string, for counting tokens and for logs.
+    """
+    if not isinstance(prompt, Prompt):
+        return prompt
+    return "\n\n".join(part for part in (prompt.system, *(content for _, content in prompt.history), prompt.user)
+                       if part)
+
+
+def user_text(prompt: str | Prompt) -> str:
+    """
+    The part of the prompt that comes from the user.
+    """
+    return prompt.user if isinstance(prompt, Prompt) else prompt
+
+
+def with_user(prompt: str | Prompt, user: str) -> str | Prompt:
+    """
+    The same prompt with its user part replaced (e.g. trimmed).
+    """
+    return Prompt(prompt.system, user, prompt.history) if isinstance(prompt, Prompt) else user
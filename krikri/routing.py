@@ -0,0 +1,210 @@
+"""
+Routing of requests to models: which model, endpoint and generation
+parameters serve each project, and optionally each mode of a project (the
+Coding Assistant's "Explain Code" and "Generate" tasks can use different
+models).
+
+Routes are named tables in the [LLM_ROUTING.routes] section of
+secrets.toml. A request uses the route named "<project>:<mode>", else the
+one named after the project, else "default", which is `model` at
+`temperature` on the app's own endpoint unless configured otherwise.
+
+A route with an `slo` and a `fallback` is watched: once the p95 of its
+recent latencies (seconds from sending a streamed request to its first
+token; blocking calls are not timed) is above the SLO, its requests go to
+the fallback route for `cooldown` seconds. Then the primary gets a fresh
+window and is used again.
+"""
+import logging
+import statistics
+import threading
+import time
+from collections import defaultdict, deque
+
+from krikri import endpoints
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_ROUTING] section of secrets.toml
+SETTINGS = {
+    "model": "krikri-dpo-context",   # The default route's model
+    "temperature": 0.7,
+    "min_samples": 10,               # Latencies needed before an SLO is judged
+    "window": 50,                    # Recent latencies per route the p95 is taken over
+    "cooldown": 120.0,               # Seconds on the fallback before the primary is retried
+}
+
+# Route name -> table with model, endpoint, api_key, temperature, top_p, slo, fallback
+ROUTES = {}
+
+
+class Route:
+    """
+    One way of serving a request. Fields left out of the route's table take
+    the default route's values, and an empty endpoint means the app's own.
+    """
+
+    def __init__(self, name: str, model: str = "", endpoint: str | list = "", api_key: str = "",
+                 temperature: float | None = None, top_p: float | None = None, slo: float = 0.0,
+                 fallback: str = ""):
+        self.name = name
+        self.model = model or SETTINGS["model"]
+        self.endpoint = endpoints.from_setting(endpoint)
+        self.api_key = api_key
+        self.temperature = SETTINGS["temperature"] if temperature is None else float(temperature)
+        self.top_p = None if top_p is None else float(top_p)
+        self.slo = float(slo)
+        self.fallback = fallback
+
+    def params(self) -> dict:
+        """
+        Generation parameters for chat.completions.create.
+        """
+        params = {"model": self.model, "temperature": self.temperature}
+        if self.top_p is not None:
+            params["top_p"] = self.top_p
+        return params
+
+    def target(self, api_key: str, api_endpoint: str) -> tuple[str, str]:
+        """
+        The credentials and endpoint to send this route's requests to.
+        """
+        if not self.endpoint:
+            return api_key, api_endpoint
+        return self.api_key or api_key, self.endpoint
+
+
+_lock = threading.Lock()
+_latencies = defaultdict(lambda: deque(maxlen=SETTINGS["window"]))  # route -> seconds
+_degraded = {}                  # route -> monotonic time its cooldown ends
+_served = defaultdict(int)      # (project, route) -> requests
+_downgrades = defaultdict(int)  # route -> times its SLO was broken
+
+
+def configure(routes: dict | None = None, **settings):
+    """
+    Overrides routing settings and adds or replaces routes.
+    """
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown routing settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        for name, table in (routes or {}).items():
+            try:
+                Route(name, **table)
+            except TypeError as e:
+                logger.warning(f"Ignoring route {name!r}: {e}")
+                continue
+            ROUTES[name] = dict(table)
+    for name, table in ROUTES.items():
+        if table.get("fallback") and table["fallback"] not in ROUTES and table["fallback"] != "default":
+            logger.warning(f"Route {name!r} falls back to unknown route {table['fallback']!r}")
+
+
+def route_for(project: str | None, mode: str | None = None) -> Route:
+    """
+    The configured route of a project (and mode), ignoring SLOs.
+    """
+    for name in (f"{project}:{mode}" if mode else None, project, "default"):
+        if name and name in ROUTES:
+            return Route(name, **ROUTES[name])
+    return Route("default")
+
+
+def choose(project: str | None, mode: str | None = None) -> Route:
+    """
+    The route that serves the next request: the configured one, or its
+    fallback (and so on) while its SLO is broken.
+    """
+    route = route_for(project, mode)
+    seen = {route.name}
+    while route.fallback and route.fallback not in seen and _is_degraded(route.name):
+        fallback = ROUTES.get(route.fallback)
+        route = Route(route.fallback, **fallback) if fallback is not None else Route("default")
+        seen.add(route.name)
+    return route
+
+
+def served(project: str | None, route: Route):
+    """
+    Records that `route` answered a request of `project`.
+    """
+    with _lock:
+        _served[(project or "other", route.name)] += 1
+
+
+def observe(route: Route, seconds: float):
+    """
+    Records how long `route` took to start answering, and moves its
+    requests to the fallback if that breaks its SLO.
+    """
+    with _lock:
+        samples = _latencies[route.name]
+        samples.append(seconds)
+        if not route.slo or not route.fallback or route.name in _degraded:
+            return
+        if len(samples) < SETTINGS["min_samples"]:
+            return
+        p95 = statistics.quantiles(samples, n=20, method="inclusive")[18]
+        if p95 <= route.slo:
+            return
+        _degraded[route.name] = time.monotonic() + SETTINGS["cooldown"]
+        _downgrades[route.name] += 1
+    logger.warning(f"Route {route.name} p95 {p95:.2f}s is over its {route.slo:.2f}s SLO, "
+                   f"using {route.fallback} for {SETTINGS['cooldown']:.0f}s")
+
+
+def stats() -> list[dict]:
+    """
+    One row per route seen: model, SLO, recent p95, whether it is on its
+    fallback, and the requests it served.
+    """
+    with _lock:
+        names = sorted(ROUTES.keys() | _latencies.keys() | {route for _, route in _served})
+        latencies = {name: list(_latencies.get(name, ())) for name in names}
+        degraded = {name: _degraded.get(name, 0) > time.monotonic() for name in names}
+        served = defaultdict(int)
+        for (_, name), count in _served.items():
+            served[name] += count
+        downgrades = dict(_downgrades)
+    rows = []
+    for name in names:
+        route = Route(name, **ROUTES.get(name, {}))
+        samples = latencies[name]
+        rows.append({
+            "route": name,
+            "model": route.model,
+            "endpoint": route.endpoint or "(app)",
+            "slo (s)": route.slo or None,
+            "p95 (s)": round(statistics.quantiles(samples, n=20, method="inclusive")[18], 2)
+            if len(samples) >= 2 else None,
+            "fallback": route.fallback,
+            "degraded": degraded[name],
+            "served": served[name],
+            "downgrades": downgrades.get(name, 0),
+        })
+    return rows
+
+
+def served_counts() -> dict[tuple[str, str], int]:
+    """
+    Requests served per (project, route).
+    """
+    with _lock:
+        return dict(_served)
+
+
+def _is_degraded(name: str) -> bool:
+    with _lock:
+        until = _degraded.get(name)
+        if until is None:
+            return False
+        if until > time.monotonic():
+            return True
+        # Cooldown over: judge the primary again on fresh latencies
+        del _degraded[name]
+        _latencies.pop(name, None)
+    logger.info(f"Route {name} is back from its fallback")
+    return False
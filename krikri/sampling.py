@@ -0,0 +1,135 @@
+"""
+Several independent answers to one prompt.
+
+Pages that show a list of ideas ask for each one as a separate short
+completion instead of one long list: with the `n` parameter a single
+request generates all of them side by side, so asking for ten takes about
+as long as asking for one, and no list is cut off halfway by max_tokens.
+Servers that ignore or reject `n` get parallel requests instead (and are
+remembered). Results are handed over as each one finishes, minus those
+that are near-duplicates of one already handed over.
+"""
+import difflib
+import logging
+import queue
+import threading
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_SAMPLING] section of secrets.toml
+SETTINGS = {
+    "use_n": True,        # Ask for all results in one request; False always sends parallel requests
+    "max_n": 10,          # Results per request, at most
+    "similarity": 0.8,    # Results at least this similar to an earlier one (0-1) are dropped; 1 keeps all
+}
+
+_lock = threading.Lock()
+_without_n = set()  # Endpoints that ignored or rejected `n`
+_counters = {"requests": 0, "results": 0, "duplicates": 0, "parallel_requests": 0}
+
+
+def configure(**settings):
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown sampling settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        _without_n.clear()
+
+
+def supports_n(api_endpoint: str) -> bool:
+    return SETTINGS["use_n"] and api_endpoint not in _without_n
+
+
+def lacks_n(api_endpoint: str, reason: str):
+    """
+    Remembers that an endpoint cannot generate several results per request.
+    """
+    with _lock:
+        if api_endpoint in _without_n:
+            return
+        _without_n.add(api_endpoint)
+    logger.warning(f"{api_endpoint} {reason}: sending parallel requests for several results from now on")
+
+
+def distinct(results: Iterator[str]) -> Iterator[str]:
+    """
+    Yields the results that are not near-duplicates of an earlier one.
+    """
+    with _lock:
+        _counters["requests"] += 1
+    kept = []
+    for result in results:
+        normalized = " ".join(result.lower().split())
+        if any(_similar(normalized, earlier) for earlier in kept):
+            with _lock:
+                _counters["duplicates"] += 1
+            logger.info("Dropping a result that repeats an earlier one")
+            continue
+        kept.append(normalized)
+        with _lock:
+            _counters["results"] += 1
+        yield result
+
+
+def in_parallel(attempt: Callable[[int], Iterator[str]], count: int,
+                cancelled: threading.Event | None = None) -> Iterator[str]:
+    """
+    Runs `attempt(0)` ... `attempt(count - 1)` at once and yields each one's
+    whole output as soon as it ends. A failed attempt is skipped; the first
+    error is raised only if they all failed. Closing the iterator, or
+    setting `cancelled`, stops the attempts still running at their next chunk.
+    """
+    with _lock:
+        _counters["parallel_requests"] += count
+    events = queue.Queue()
+    stop = threading.Event()
+    stopped = lambda: stop.is_set() or (cancelled is not None and cancelled.is_set())
+
+    def run(index):
+        try:
+            output = attempt(index)
+            parts = []
+            try:
+                for chunk in output:
+                    if stopped():
+                        break
+                    parts.append(chunk)
+            finally:
+                output.close()  # Releases the connection and the admission slot
+            events.put((index, "".join(parts), None))
+        except BaseException as e:
+            events.put((index, None, e))
+
+    for index in range(count):
+        threading.Thread(target=run, args=(index,), name="llm-sample", daemon=True).start()
+    errors = []
+    try:
+        for _ in range(count):
+            index, text, error = events.get()
+            if error is not None:
+                logger.warning(f"Parallel request {index + 1} of {count} failed: {error}")
+                errors.append(error)
+            elif not stopped():
+                yield text
+        if len(errors) == count:
+            raise errors[0]
+    finally:
+        stop.set()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, endpoints_without_n=len(_without_n))
+
+
+def _similar(a: str, b: str) -> bool:
+    threshold = SETTINGS["similarity"]
+    if threshold >= 1:
+        return a == b
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    # The quick upper bounds rule out most pairs before the full comparison
+    return (matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold
+            and matcher.ratio() >= threshold)
@@ -0,0 +1,64 @@
+"""
+The secrets.toml sections that tune the shared LLM plumbing.
+
+The app reads them through st.secrets; the command line tools (run_batch.py,
+warm_cache.py, run_gateway.py) read the same file here, without importing
+Streamlit.
+"""
+import logging
+import os
+import tomllib
+from pathlib import Path
+
+from krikri import (admission, batch, budget, cache, clients, conversation, endpoints, gateway, hedging, history,
+                    jobs, metrics, routing, sampling, singleflight)
+
+logger = logging.getLogger(__name__)
+
+SECRETS_PATH = Path(".streamlit/secrets.toml")
+
+# Section -> the configure() of the module it tunes
+SECTIONS = {
+    "LLM_POOL": clients.configure,
+    "LLM_CACHE": cache.configure,
+    "LLM_COALESCE": singleflight.configure,
+    "LLM_BATCH": batch.configure,
+    "LLM_RATE_LIMIT": admission.configure,
+    "LLM_HEDGING": hedging.configure,
+    "LLM_ENDPOINTS": endpoints.configure,
+    "LLM_METRICS": metrics.configure,
+    "LLM_BUDGET": budget.configure,
+    "LLM_ROUTING": routing.configure,
+    "LLM_JOBS": jobs.configure,
+    "LLM_SAMPLING": sampling.configure,
+    "LLM_CONVERSATION": conversation.configure,
+    "LLM_GATEWAY": gateway.configure,
+    "LLM_HISTORY": history.configure,
+}
+
+
+def apply(secrets: dict):
+    """
+    Configures every module whose section is in `secrets`; other keys are ignored.
+    """
+    for section, configure in SECTIONS.items():
+        if section in secrets:
+            configure(**secrets[section])
+
+
+def load_credentials(api_key: str = "", api_endpoint: str = "") -> tuple[str, str]:
+    """
+    For the command line tools: the given values first, then
+    KRIKRI_API_KEY/KRIKRI_API_ENDPOINT, then secrets.toml, whose tuning
+    sections are applied too.
+    """
+    secrets = {}
+    if SECRETS_PATH.exists():
+        with open(SECRETS_PATH, "rb") as f:
+            secrets = tomllib.load(f)
+        apply(secrets)
+    credentials = secrets.get("LLM_CREDENTIALS", {})
+    api_key = api_key or os.environ.get("KRIKRI_API_KEY") or credentials.get("API_KEY", "")
+    api_endpoint = (api_endpoint or os.environ.get("KRIKRI_API_ENDPOINT")
+                    or endpoints.from_setting(credentials.get("API_ENDPOINT", "")))
+    return api_key, api_endpoint
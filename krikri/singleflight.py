@@ -0,0 +1,173 @@
+"""
+Coalescing of identical requests that are in flight at the same time.
+
+When a class clicks "Generate" together, the first request for a given key
+starts the upstream call on a worker thread; every identical request that
+arrives before it finishes follows that same call and receives the same
+chunks (streamed as they arrive), or the same error. A call whose callers
+all went away (see krikri.jobs) is abandoned: it stops at its next chunk
+or queue move, releasing its connection and admission slot.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable from the [LLM_COALESCE] section of secrets.toml
+SETTINGS = {
+    "enabled": True,
+    "wait_timeout": 120.0,  # Max seconds a caller waits for the next chunk
+    "max_workers": 64,      # Upstream calls running at once
+}
+
+_lock = threading.Lock()
+_flights = {}  # key -> Flight
+_executor = None
+_counters = {"leaders": 0, "followers": 0, "abandoned": 0}
+
+
+class Abandoned(Exception):
+    pass
+
+
+class Flight:
+    """
+    One upstream call and the chunks it has produced so far.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.queue_position = None  # Set while the call waits for admission
+        self.callers = 0            # Callers still following; changed under the module _lock
+        self.abandoned = False
+        self._cond = threading.Condition()
+
+    def report(self, position: int | None):
+        if self.abandoned:
+            raise Abandoned("Every caller of this request went away")
+        with self._cond:
+            self.queue_position = position
+            self._cond.notify_all()
+
+    def publish(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: BaseException | None = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self, timeout: float, on_wait: Callable[[int], None] | None = None) -> Iterator[str]:
+        """
+        Yields every chunk from the start, waiting for new ones until the
+        call finishes. Re-raises the call's error, or TimeoutError if no
+        progress is made for `timeout` seconds. `on_wait` is called (on the
+        caller's thread) with the call's queue position while it waits for
+        admission.
+        """
+        seen = 0
+        reported = None
+        while True:
+            with self._cond:
+                progress = lambda: seen < len(self.chunks) or self.done or self.queue_position != reported
+                if not self._cond.wait_for(progress, timeout):
+                    raise TimeoutError(f"No response from the shared request after {timeout:.0f}s")
+                new = self.chunks[seen:]
+                finished = self.done and seen + len(new) == len(self.chunks)
+                error = self.error
+                position = self.queue_position
+            if position != reported:
+                reported = position
+                if on_wait is not None and position is not None and not seen:
+                    on_wait(position)
+            seen += len(new)
+            yield from new
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+def configure(**settings):
+    global _executor
+    unknown = set(settings) - set(SETTINGS)
+    if unknown:
+        logger.warning(f"Ignoring unknown coalescing settings: {sorted(unknown)}")
+    with _lock:
+        for name in SETTINGS.keys() & settings.keys():
+            SETTINGS[name] = type(SETTINGS[name])(settings[name])
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def run(key: str, producer: Callable[[Callable], Iterator[str]],
+        on_wait: Callable[[int], None] | None = None) -> Iterator[str]:
+    """
+    Yields the output of `producer(report)`, sharing one execution between
+    every caller that asks for the same key while it is running. The
+    producer calls `report(position)` while it waits in the admission queue;
+    each caller hears about it through its own `on_wait`.
+    """
+    if not SETTINGS["enabled"]:
+        yield from producer(on_wait)
+        return
+
+    global _executor
+    with _lock:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = Flight()
+            _counters["leaders"] += 1
+            if _executor is None:
+                _executor = ThreadPoolExecutor(SETTINGS["max_workers"], thread_name_prefix="llm-flight")
+            _executor.submit(_drive, key, flight, producer)
+        else:
+            _counters["followers"] += 1
+            logger.info("Joining identical request already in flight")
+        flight.callers += 1
+
+    try:
+        yield from flight.follow(SETTINGS["wait_timeout"], on_wait)
+    finally:
+        with _lock:
+            flight.callers -= 1
+            if not flight.callers and not flight.done:
+                # The last caller left early: stop the call, and let the next one start afresh
+                flight.abandoned = True
+                _counters["abandoned"] += 1
+                if _flights.get(key) is flight:
+                    del _flights[key]
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_counters, in_flight=len(_flights))
+
+
+def _drive(key: str, flight: Flight, producer: Callable[[Callable], Iterator[str]]):
+    error = None
+    chunks = producer(flight.report)
+    try:
+        for chunk in chunks:
+            if flight.abandoned:
+                logger.info("Stopping a request nobody is waiting for")
+                break
+            flight.publish(chunk)
+    except BaseException as e:
+        error = e
+    finally:
+        chunks.close()  # Closes the upstream call if it was cut short
+        # Unregister before waking followers so later callers start a new call
+        # (or, more likely, find the answer in the cache).
+        with _lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+        flight.finish(error)
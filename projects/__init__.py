@@ -0,0 +1,159 @@
+"""
+Registry of the student project pages.
+
+Every project is a module in this package plus a TOML file with the same
+name that describes it, for example `dress_code.py` and `dress_code.toml`:
+
+    title = "Dress code"
+    authors = ["Μιχάλης Πολυπόρτης", "Γιώργος Τσαφούλης"]  # shown by ui.show_header
+    order = 40                        # position in the menu
+    prompt = "dress_code_prompt"      # name of the module's prompt builder, which
+                                      # run_batch.py and warm_cache.py call
+    inputs = ["occasion", "gender", "status", "age"]
+    # samples = 5                     # the prompt asks for one item of a list and the
+                                      # page shows this many answers (ui.show_results)
+    # page = "dress_code"             # the page function, defaults to the file name
+    # warm = true                     # answers for every combination in the module's
+                                      # CHOICES can be pre-generated (warm_cache.py)
+
+The TOML files are read once per server process to build the menu. A
+project's module is imported only when its page is opened for the first
+time, so startup and reruns do not grow with the number of projects, and a
+project that fails to import breaks only its own page.
+
+The file name is the project's id: it is what the metrics, the cache
+settings and run_batch.py call the project.
+"""
+import importlib
+import logging
+import threading
+import time
+import tomllib
+import traceback
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+PROJECTS_DIR = Path(__file__).parent
+
+_lock = threading.Lock()
+_plugins = None  # id -> Plugin, in menu order
+
+
+class Plugin:
+    """
+    One project: its metadata and, once loaded, its page and prompt
+    builder, or the reason it could not be loaded.
+    """
+
+    def __init__(self, id: str, title: str, authors: list[str] | None = None, order: int = 1000,
+                 prompt: str = "", inputs: list[str] | None = None, page: str = "", warm: bool = False,
+                 samples: int = 0):
+        self.id = id
+        self.title = title
+        self.authors = authors or []
+        self.order = order
+        self.prompt_name = prompt
+        self.inputs = inputs or []
+        self.page_name = page or id
+        self.warm = warm
+        self.samples = samples  # Answers the page asks for, one item each; 0 for one whole answer
+        self.page = None     # The page function, once loaded
+        self.prompt = None   # The prompt builder, once loaded
+        self.choices = None  # Input name -> every value the page offers, once loaded
+        self.error = None
+        self.traceback = None
+        self.import_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.page is not None or self.error is not None
+
+    def load(self) -> "Plugin":
+        """
+        Imports the project's module (once); failures are kept in `error`.
+        """
+        with self._lock:
+            if self.loaded:
+                return self
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(f"{__name__}.{self.id}")
+                page = getattr(module, self.page_name)
+                self.prompt = getattr(module, self.prompt_name) if self.prompt_name else None
+                self.choices = getattr(module, "CHOICES", None)
+                self.page = page
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                self.traceback = traceback.format_exc()
+                logger.error(f"Project {self.id} failed to load: {self.error}")
+            self.import_seconds = time.perf_counter() - started
+            if self.error is None:
+                logger.info(f"Project {self.id} loaded in {self.import_seconds * 1000:.1f}ms")
+        return self
+
+
+def _read(path: Path) -> Plugin:
+    # A file that cannot be parsed still gets a menu entry, showing the error on its page
+    try:
+        with open(path, "rb") as f:
+            metadata = tomllib.load(f)
+        return Plugin(path.stem, **metadata)
+    except (OSError, tomllib.TOMLDecodeError, TypeError) as e:
+        plugin = Plugin(path.stem, title=path.stem)
+        plugin.error = f"Invalid {path.name}: {e}"
+        logger.error(f"Project {path.stem}: {plugin.error}")
+        return plugin
+
+
+def discover() -> dict[str, Plugin]:
+    """
+    Every project by id, in menu order, read from the TOML files once.
+    """
+    global _plugins
+    with _lock:
+        if _plugins is None:
+            plugins = [_read(path) for path in PROJECTS_DIR.glob("*.toml")]
+            plugins.sort(key=lambda plugin: (plugin.order, plugin.title))
+            _plugins = {plugin.id: plugin for plugin in plugins}
+        return _plugins
+
+
+def load(project: str) -> Plugin:
+    """
+    The project, with its module imported. Raises KeyError for an unknown id.
+    """
+    return discover()[project].load()
+
+
+def prompt_builder(project: str) -> Callable[..., str]:
+    """
+    The project's prompt builder, for running it without the UI.
+    """
+    plugin = discover().get(project)
+    if plugin is None:
+        raise ValueError(f"Unknown project {project!r}")
+    plugin.load()
+    if plugin.error:
+        raise ValueError(f"Project {project!r} failed to load: {plugin.error}")
+    if plugin.prompt is None:
+        raise ValueError(f"Project {project!r} has no prompt builder")
+    return plugin.prompt
+
+
+def stats() -> list[dict]:
+    """
+    One row per project: whether it is loaded, how long the import took, and any error.
+    """
+    return [
+        {
+            "project": plugin.id,
+            "title": plugin.title,
+            "loaded": plugin.page is not None,
+            "import_ms": round(plugin.import_seconds * 1000, 1) if plugin.import_seconds is not None else None,
+            "error": plugin.error or "",
+        }
+        for plugin in discover().values()
+    ]
@@ -0,0 +1,60 @@
+"""
+Dress code — Μιχάλης Πολυπόρτης, Γιώργος Τσαφούλης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+GENDERS = ["Female", "Male"]
+STATUSES = ["Formal", "Casual"]
+AGES = ["0-5","5-12","12-17","17-21","21-45","45-60","60+"]
+# The occasion is free text; these are the ones typed most often, and with them
+# the grid is small enough for warm_cache.py to pre-generate every answer
+COMMON_OCCASIONS = ["a wedding", "a birthday party", "a job interview", "school", "a funeral", "the beach"]
+CHOICES = {"occasion": COMMON_OCCASIONS, "gender": GENDERS, "status": STATUSES, "age": AGES}
+
+SYSTEM_PROMPT = (
+    "Help me find an outfit to wear for an occasion. The outfit must match the dress code, "
+    "the occasion, and the gender and age of the person who will wear it."
+)
+
+def dress_code_prompt(occasion: str, gender: str = "Female", status: str = "Formal", age: str = "0-5") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Dress code: {status}\n"
+        f"I am a {gender} between the ages {age}.\n"
+        f"The occasion: {occasion}"
+    ))
+
+def dress_code(api_key: str, api_endpoint: str):
+    """
+    Μιχάλης Πολυπόρτης
+    Γιώργος Τσαφούλης
+    """
+    show_header("Dress code")
+    
+    st.write("How to dress depending on the occasion")
+    occasion = st.text_area("What is the event?")
+    gender = st.radio(
+            "Gender",
+                    GENDERS,
+        horizontal=True
+    )
+
+    status = st.selectbox(
+        "Dress code",
+        STATUSES
+    )
+
+    age = st.selectbox(
+        "Select the age of the person",
+        AGES
+    )
+
+    if st.button("Generate outfit"):
+        if not occasion:
+            st.warning("Input an accusion")
+            return
+
+        final_prompt = dress_code_prompt(occasion, gender, status, age)
+        show_result(final_prompt, api_key, api_endpoint)
@@ -0,0 +1,52 @@
+"""
+Ideal Sport Advisor — Φώτης Μαμούδης, Παναγιώτης Τσιτίνης, Γιώργος Συργιαμιώτης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "The user tells you about themselves, their habits and their vital status. "
+    "Provide the ideal sport recommendation based on the input, in the language they ask for."
+)
+
+def ideal_sport_advisor_prompt(info: str, age: str = "10-20", output_language: str = "English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Language: {output_language}\n"
+        f"My age range is {age}.\n"
+        f"About me: '{info}'"
+    ))
+
+def ideal_sport_advisor(api_key: str, api_endpoint: str):
+    """
+    Ideal Sport Advisor.
+    Φώτης Μαμούδης 
+    Παναγιώτης Τσιτίνης
+    Γιώργος Συργιαμιώτης
+    """
+    show_header("Ideal Sport Advisor")
+
+    st.write("Enter information about yourself.")
+    # Main Input
+    info = st.text_area("Input", height=100)
+
+    # Configuration Options (Vertical Layout)
+    age = st.selectbox(
+        "Age",
+        ["10-20", "20-30", "40-80"]
+    )
+
+    output_language = st.radio(
+        "Output Language",
+        ["English", "Greek"],
+        horizontal=True # Makes the radio buttons sit side-by-side
+    )
+    if st.button("Generate Explanation"):
+        if not age:
+            st.warning("Please enter your information.")
+            return
+
+        final_prompt = ideal_sport_advisor_prompt(info, age, output_language)
+        show_result(final_prompt, api_key, api_endpoint)
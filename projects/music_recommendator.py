@@ -0,0 +1,40 @@
+"""
+Music Recommender — Βασίλης Αναστασιάδης, Λιάπη Ελευθερία, Κουλερής Νικόλαος.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+MOODS = ["Happy" , "Sad" , "angry" , "bored" , "sleepy" , "upset" , "anxious" , "productive" , "work out"]
+MUSIC_TYPES = ["Metal" , "Pop" , "Rap" , "Disco" ,"Hip Hop" , "Movie soundtracks" , "Classical" , "Jazz" , "Rock"]
+LANGUAGES = ["English", "Greek"]
+# Every value each input can take, so warm_cache.py can pre-generate all 162 answers
+CHOICES = {"mood": MOODS, "music_type": MUSIC_TYPES, "output_language": LANGUAGES}
+
+SYSTEM_PROMPT = (
+    "Select one song in the language the user asks for, whose type and mood are the ones they give. "
+    "Make it into bullet points, with the song title followed by the artist as a header. "
+    "When choosing Greek, make sure the song you choose is not translated and actually originated in Greek. "
+    "Do not translate titles and artist names. Answer only in the language the user asks for."
+)
+
+def music_recommendator_prompt(mood: str = "Happy", music_type: str = "Metal", output_language: str = "English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, f"Language: {output_language}\nType of music: {music_type}\nMood: {mood}")
+
+def music_recommendator(api_key : str , api_endpoint : str) :
+    """
+    Βασίλης Αναστασιάδης, Λιάπη Ελευθερία, Κουλερής Νικόλαος
+    Stub: Music recommendator 
+    """
+    show_header("Music Recommender")
+
+    st.write("Select your mood and your music style and I will recommend you a song")
+    mood = st.selectbox("Mood" , MOODS)
+    type = st.selectbox("Type of music" , MUSIC_TYPES)
+    output_language = st.radio(
+        "Output Language",
+        LANGUAGES, )
+    final_prompt = music_recommendator_prompt(mood, type, output_language)
+    if st.button("Recommend a song"):
+        show_result(final_prompt, api_key, api_endpoint)
@@ -0,0 +1,44 @@
+"""
+Christmas Presents Ideas — Ηλεκτρα Φερρέττι, Δαφνη Φερρέττι, Νίκη Ερατώ Συντριβάνη, Στρατής Τζαμπαζάκης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_results
+
+
+# Gift ideas shown on the page, each one generated as a separate answer
+IDEAS = 3
+
+SYSTEM_PROMPT = (
+    "I want to buy a Christmas gift for a friend. Give me one idea for a gift, "
+    "for the person I describe, from the category I choose and within my budget."
+)
+
+def christmas_wishlist_prompt(age: str, gender: str = "Male", categories: str = "Tech",
+                              budget: str = "0-50") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Category: {categories}\n"
+        f"Budget: {budget} dollars\n"
+        f"Gender: {gender}\n"
+        f"Age: {age}"
+    ))
+
+def project_christmas_wishlist(api_key: str, api_endpoint: str):
+    """
+    Ηλεκτρα Φερρεττι,Δαφνη Φερρεττι, Στρατής, Νικη Ερατω Συντριβανη
+    Stub: christmas.wishlist
+    """
+    show_header("Christmas Presents Ideas")
+
+    st.write("Write your interests and budget and get ideas about your christmas wishlist")
+    gender = st.selectbox("Gender",["Male", "Female"])
+    categories = st.radio("Categories",["Tech", "Sports", "Fashion", "Cooking", "Art", "Reading", "Decoration"])
+    age = st.text_input("Age (e.g., \"12\", \"67\", \"3\")")
+    budget = st.radio("Budget",("0-50", "50-100", "100+"))
+    if st.button("HO HO HO!!!"):
+        if not age:
+            st.warning("Please enter your age first.")
+            return
+        final_prompt = christmas_wishlist_prompt(age, gender, categories, budget)
+        show_results(final_prompt, IDEAS, api_key, api_endpoint, title="Gift ideas")
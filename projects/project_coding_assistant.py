@@ -0,0 +1,131 @@
+"""
+Coding Assistant — Κωνσταντίνος Δρούκας, Αλέξανδρος Μιλάτος, Νίκος Βαγενάς.
+"""
+import streamlit as st
+
+from krikri import batch
+from krikri.chunking import estimate_tokens, split_code
+from krikri.llm import current_project, current_session
+from krikri.prompts import Prompt
+from projects.ui import show_follow_up, show_header, show_result
+
+# Code longer than this is split into parts that are analysed in parallel,
+# and the partial answers are then merged into one
+CHUNK_TOKENS = 800
+# Partial answers merged by one request; more than that are merged in rounds
+MERGE_TOKENS = 2000
+# Parts analysed at once for one user
+PARALLEL = 4
+
+
+SYSTEM_PROMPTS = {
+    "Explain Code": "Explain the code the user gives you step by step, in the language they ask for.",
+    "Fix Bugs": ("Identify all bugs in the code the user gives you and propose corrected code, "
+                 "in the language they ask for."),
+    "Generate": ("Generate a complete, correct piece of code based on the description the user gives you, "
+                 "explained in the language they ask for."),
+}
+MERGE_SYSTEM_PROMPTS = {
+    "Fix Bugs": ("The user gives you bug reports for consecutive parts of one file. Merge them into one list "
+                 "of the bugs in the whole file, each with its fix, without duplicates, in the language they ask for."),
+    "Explain Code": ("The user gives you explanations of consecutive parts of one file. Merge them into one "
+                     "step-by-step explanation of the whole file, without repeating yourself, in the language "
+                     "they ask for."),
+}
+
+
+def coding_assistant_prompt(user_input: str, mode: str = "Explain Code", language: str = "English") -> Prompt:
+    system = SYSTEM_PROMPTS.get(mode, SYSTEM_PROMPTS["Generate"])
+    if mode in ("Explain Code", "Fix Bugs"):
+        return Prompt(system, f"Output in {language}.\n\n--- CODE START ---\n{user_input}\n--- CODE END ---")
+    return Prompt(system, f"Output in {language}.\n\nDescription:\n{user_input}")
+
+def coding_assistant_part_prompt(header: str, chunk: str, part: int, parts: int,
+                                 mode: str = "Explain Code", language: str = "English") -> Prompt:
+    context = f"The imports and signatures of the whole file, for context:\n{header}\n\n" if header else ""
+    prompt = coding_assistant_prompt(chunk, mode, language)
+    return Prompt(prompt.system, f"{context}This is part {part} of {parts} of a larger file. {prompt.user}")
+
+def coding_assistant_merge_prompt(answers: list[str], mode: str = "Explain Code", language: str = "English") -> Prompt:
+    system = MERGE_SYSTEM_PROMPTS.get(mode, MERGE_SYSTEM_PROMPTS["Explain Code"])
+    parts = "\n\n".join(f"--- PART {index} ---\n{answer}" for index, answer in enumerate(answers, 1))
+    return Prompt(system, f"Output in {language}.\n\n{parts}")
+
+def project_coding_assistant(api_key: str, api_endpoint: str):
+    """
+    Coding Assistanτ
+    Κωνσταντίνος Δρούκας
+    Αλέξανδρος Μιλάτος
+    Νίκος Βαγενάς
+    """
+    
+    show_header("Coding Assistant")
+
+    st.write("Explain code, fix bugs, or generate code.")
+    mode = st.selectbox(
+        "Task",
+        ["Explain Code", "Fix Bugs", "Generate"]
+    )
+    
+    user_input = st.text_area("Input Code / Description", height=220)
+    language = st.selectbox("Response Language", ["English", "Greek"])
+    if st.button("Run"):
+        if not user_input:
+            st.warning("Please enter code.")
+            return
+        header, chunks = split_code(user_input, CHUNK_TOKENS) if mode != "Generate" else ("", [])
+        if len(chunks) > 1:
+            show_map_reduce(header, chunks, mode, language, api_key, api_endpoint)
+        else:
+            prompt = coding_assistant_prompt(user_input, mode, language)
+            show_result(prompt, api_key, api_endpoint, mode=mode, follow_ups=True)
+    show_follow_up(api_key, api_endpoint)
+
+def show_map_reduce(header: str, chunks: list[str], mode: str, language: str, api_key: str, api_endpoint: str):
+    """
+    Large inputs: every part is analysed on its own (with the file's imports
+    and signatures), in parallel, then the answers are merged into one.
+    """
+    st.caption(f"Large input: analysing {len(chunks)} parts, {PARALLEL} at a time, then merging the answers.")
+    project, session = current_project.get(), current_session.get() or "batch"
+    prompts = [coding_assistant_part_prompt(header, chunk, index, len(chunks), mode, language)
+               for index, chunk in enumerate(chunks, 1)]
+    answers = []
+    with st.expander(f"Answers per part ({len(chunks)})"):
+        for index, result in enumerate(batch.iter_llm_batch(prompts, api_key, api_endpoint, concurrency=PARALLEL,
+                                                            project=project, session=session, mode=mode), 1):
+            st.markdown(f"**Part {index}**")
+            st.markdown(result["text"])
+            if result["ok"]:
+                answers.append(result["text"])
+    if not answers:
+        st.error("None of the parts could be analysed.")
+        return
+    if len(answers) < len(chunks):
+        st.warning(f"{len(chunks) - len(answers)} of {len(chunks)} parts could not be analysed.")
+
+    # Too many answers for one request: merge them in groups first
+    while len(answers) > 1 and estimate_tokens("".join(answers)) > MERGE_TOKENS:
+        prompts = [coding_assistant_merge_prompt(group, mode, language)
+                   for group in merge_groups(answers, MERGE_TOKENS)]
+        results = batch.query_llm_batch(prompts, api_key, api_endpoint, concurrency=PARALLEL,
+                                        project=project, session=session, mode=mode)
+        answers = [result["text"] for result in results if result["ok"]]
+        if not answers:
+            st.error("The answers could not be merged.")
+            return
+    show_result(coding_assistant_merge_prompt(answers, mode, language), api_key, api_endpoint, mode=mode,
+                follow_ups=True)
+
+def merge_groups(answers: list[str], max_tokens: int) -> list[list[str]]:
+    # Consecutive answers, as many per group as fit in max_tokens (at least two)
+    groups, size = [], 0
+    for answer in answers:
+        tokens = estimate_tokens(answer)
+        if groups and (size + tokens <= max_tokens or len(groups[-1]) == 1):
+            groups[-1].append(answer)
+            size += tokens
+        else:
+            groups.append([answer])
+            size = tokens
+    return groups
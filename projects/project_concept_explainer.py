@@ -0,0 +1,52 @@
+"""
+Concept Explainer.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_follow_up, show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "Explain the concept the user gives you specifically to the audience they choose, "
+    "in the language they ask for."
+)
+
+def concept_explainer_prompt(topic_input: str, complexity_level: str = "Five-year-old",
+                             output_language: str = "English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Audience: {complexity_level}\n"
+        f"Language: {output_language}\n"
+        f"Concept: '{topic_input}'"
+    ))
+
+def project_concept_explainer(api_key: str, api_endpoint: str):
+    """
+    Complete Implementation: Concept Explainer.
+    """
+    show_header("Concept Explainer")
+    st.write("Enter a complex topic and select an audience.")
+
+    # Main Input
+    topic_input = st.text_area("Enter the concept to explain", height=100)
+    
+    # Configuration Options (Vertical Layout)
+    complexity_level = st.selectbox(
+        "Target Audience",
+        ["Five-year-old", "High School Student", "University Professor"]
+    )
+    
+    output_language = st.radio(
+        "Output Language",
+        ["English", "Greek"],
+        horizontal=True 
+    )
+
+    if st.button("Generate Explanation"):
+        if not topic_input:
+            st.warning("Please enter a topic first.")
+            return
+
+        final_prompt = concept_explainer_prompt(topic_input, complexity_level, output_language)
+        show_result(final_prompt, api_key, api_endpoint, follow_ups=True)
+    show_follow_up(api_key, api_endpoint)
@@ -0,0 +1,40 @@
+"""
+Η αλεπού 🦊 — Κωνσταντίνος Εμμανουήλ, Χρυσούλα Ουζούνη, Αναστασία Ορφανίδου.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "Είμαι σε μια δύσκολη κατάσταση και χρειάζομαι μια δικαιολογία. "
+    "Στην απάντηση δώσε μόνο μια καλη και μεγαλη δικαιολογια, τίποτα άλλο."
+)
+# How imaginative the excuse is, by craziness level; the other levels get the first one
+LEVEL_RULES = {
+    1: "Δώσε μου μια λογική και ρεαλιστική δικαιολογία για να δώσω.",
+    5: ("Στην δικαιολογία που θα μου δώσεις στην κλίμακα επιπέδου φαντασίας από το 1 εως το 10 δώσε μου "
+        "δικαιολογία που βρίσκεται στο επίπεδο 5. Να μην είναι λογικό αλλά να είναι ρεαλιστικό."),
+    10: ("Στην δικαιολογία που θα μου δώσεις στην κλίμακα επιπέδου φαντασίας από το 1 εως το 10 δώσε μου "
+         "δικαιολογία που βρίσκεται στο επίπεδο 10. Να μην είναι λογικό και να είναι μη ρεαλιστικό."),
+}
+
+def excuse_generator_prompt(situation: str, intensity: int = 5) -> Prompt:
+    rule = LEVEL_RULES.get(intensity, LEVEL_RULES[1])
+    return Prompt(SYSTEM_PROMPT, f"{rule}\nΑυτό που έγινε είναι '{situation}'")
+
+def project_excuse_generator(api_key: str, api_endpoint: str):
+    """
+    Κωνσταντίνος Εμμανουήλ, Χρυσούλα Ουζούνη, Αναστασία Ορφανίδου
+    Stub: The Excuse Generator.
+    """
+    show_header("Η αλεπού 🦊")
+    
+    st.write("Δώσε μου έναν δημιουργικό λόγο για να ξεφύγω από μια δύσκολη κατάσταση!")
+    situation = st.text_input("Τι έκανες; (π.χ., 'Ξέχασα τις ασκήσεις για το σπίτι')")
+    intensity = st.slider("Επίπεδο τρέλας", 1, 10, 5)
+    if st.button("Φτιάξε την δικαιολογία"):
+        st.info("Ετοιμάζοντας την δικαιολογία")
+        final_prompt = excuse_generator_prompt(situation, intensity)
+        show_result(final_prompt, api_key, api_endpoint, title="Απάντηση")
@@ -0,0 +1,60 @@
+"""
+How to persuade my parents — Νικόλας Κουλουριώτης, Χρήστος Σοφιανόπουλος, Κωνσταντίνος Αμαραντίδης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_results
+
+
+SYSTEM_PROMPT = (
+    "You are an expert persuasion-assistant that helps a user create convincing excuses to persuade their "
+    "parents to let them have something they want. Generate one excuse based on the selected excuse "
+    "strength level and the desired output language. Tailor the excuse directly to the item the user wants, "
+    "ensuring it is coherent and realistic while matching the tone and persuasion intensity indicated by "
+    "the excuse level. Write just that excuse, without a number, heading or list. Do not include "
+    "moralizing, safety disclaimers, or meta commentary—produce only the excuse, written entirely in the "
+    "specified output language."
+)
+
+def how_to_persuade_my_parents_prompt(my_desire: str, excuse_level: str = "Super bad",
+                                      output_language: str = "English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Excuse level: {excuse_level}\n"
+        f"Output language: {output_language}\n"
+        f"What I want: {my_desire}\n"
+        f"Now generate the excuse"
+    ))
+
+def project_how_to_persuade_my_parents(api_key: str, api_endpoint: str):
+    """
+    Νικόλας Κουλουριώτης, 
+    Χρήστος Σοφιανόπουλος, 
+    Κωνσταντίνος Αμαραντίδης
+    """
+    show_header("I want to get something but my parents won't let me.")
+
+    st.write("I want to get:")
+    # Main Input
+    my_desire = st.text_area("Enter what you want to get:", height=100)
+
+    # Configuration Options (Vertical Layout)
+    excuse_level = st.selectbox(
+        "How good does the excuse need to be?",
+        ["Super bad", "Good", "Very good", "Great", "Make sure I get it no matter what"]
+    )
+
+    number_of_excuses = st.slider("Excuses:", 1, 10, 5)
+    output_language = st.radio(
+        "Output Language",
+        ["English", "Greek"],
+        horizontal=True # Makes the radio buttons sit side-by-side
+    )
+
+    if st.button("Generate arguments"):
+        if not my_desire:
+            st.warning("Please enter your desire first.")
+            return
+        # One excuse per answer, all generated at once: ten take about as long as one
+        final_prompt = how_to_persuade_my_parents_prompt(my_desire, excuse_level, output_language)
+        show_results(final_prompt, number_of_excuses, api_key, api_endpoint, title="Excuses")
@@ -0,0 +1,35 @@
+"""
+Jokes — Ευαγγελία Κορκοβέλου, Θωμάς Τσολάκης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "Make a joke about the text the user gives you, as crazy as the craziness level they choose "
+    "(from 1 to 10), in the language they ask for."
+)
+
+def jokes_prompt(text: str, intensity: int = 5, language: str = "🌎English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, f"Craziness level: {intensity}\nLanguage: {language}\nText: '{text}'")
+
+def project_jokes(api_key: str, api_endpoint: str):
+    """
+    Stub: Jokes.
+    """
+    show_header("Jokes")
+
+    st.write("Let the AI do its work")
+    
+    text = st.text_area("Write your text")
+    intensity = st.slider("Craziness Level", 1, 10, 5)
+    language = st.radio(
+        "Output Language",
+        ["🌎English", "🌍Greek"],
+        horizontal=False # Makes the radio buttons sit side-by-side
+    )
+    user_input = jokes_prompt(text, intensity, language)
+    if st.button("Laugh!"):
+        show_result(user_input, api_key, api_endpoint)
@@ -0,0 +1,33 @@
+"""
+Order List — Ευαγγελία Κορκοβέλου, Θωμάς Τσολάκης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "Using google make a list with the things the user gives you, the first one = best and the "
+    "last one = worse, in the language they ask for (NOT AS A CODE AS A TEXT)"
+)
+
+def orderlist_prompt(text: str, language: str = "🌎English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, f"Language: {language}\nThings: {text}")
+
+def project_orderlist(api_key: str, api_endpoint: str):
+    """
+    Stub: Order List.
+    """
+    show_header("Order List")
+
+    st.write("Let the AI do its work")
+    text = st.text_area("Write your text")
+    language = st.radio(
+        "Output Language",
+        ["🌎English", "🌍Greek"],
+        horizontal=False # Makes the radio buttons sit side-by-side
+    )
+    user_input = orderlist_prompt(text, language)
+    if st.button("Laugh!"):
+        show_result(user_input, api_key, api_endpoint)
@@ -0,0 +1,53 @@
+"""
+Symptom Explainer — Γιώργος Τσαφούλης, Φώτης Μαμούδης.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = (
+    "Explain the symptoms the user describes. Take into account the user's height, weight, and age. "
+    "Explain everything specifically to someone of the user's age, in the language they ask for."
+)
+
+def symptom_explainer_prompt(symptoms_input: str, user_age: int = 5, user_weight: int = 5,
+                             user_height: int = 5, output_language: str = "English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, (
+        f"Language: {output_language}\n"
+        f"Age: {user_age}, height: {user_height}, weight: {user_weight}\n"
+        f"Symptoms: '{symptoms_input}'"
+    ))
+
+def project_symptom_explainer(api_key: str, api_endpoint: str):
+    show_header("Symptom Explainer")
+
+    st.write("Describe the symptoms of a medical condition.")
+
+    # Main Input
+    symptoms_input = st.text_area("Describe your symptoms", height=100)
+    
+    # Configuration Options (Vertical Layout)
+    symptoms_duration = st.selectbox(
+        "How long have you had the symptoms?",
+        ["1 Day", "3 Days", "1 week", "more than a week" ]
+    )
+    
+    user_age = st.slider("Age", 1, 100, 5)
+    user_weight=st.slider("Weight (KGs)", 1, 200, 5)
+    user_height=st.slider("Height (CMs)", 1, 250, 5)
+
+    output_language = st.radio(
+        "Output Language",
+        ["English", "Greek"],
+        horizontal=True # Makes the radio buttons sit side-by-side
+    )
+
+    if st.button("Generate Explanation"):
+        if not symptoms_input:
+            st.warning("Please enter a symptom description.")
+            return
+
+        final_prompt = symptom_explainer_prompt(symptoms_input, user_age, user_weight, user_height, output_language)
+        show_result(final_prompt, api_key, api_endpoint)
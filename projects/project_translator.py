@@ -0,0 +1,102 @@
+"""
+Translator — Ευαγγελία Κορκοβέλου, Θωμάς Τσολάκης.
+"""
+import time
+from typing import Iterator
+
+import streamlit as st
+
+from krikri import batch, history
+from krikri.chunking import estimate_tokens, split_text
+from krikri.llm import current_project, current_session
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+# Texts longer than this many tokens are translated in parts of about this size,
+# so that each translation fits in one answer instead of being cut off at max_tokens
+CHUNK_TOKENS = 250
+# Parts translated at once for one user
+PARALLEL = 4
+
+
+SYSTEM_PROMPT = "Translate the text the user gives you to the language they ask for."
+
+def translator_prompt(text: str, language: str = "🌎English") -> Prompt:
+    return Prompt(SYSTEM_PROMPT, f"Translate to {language}:\n\n{text}")
+
+def project_translator(api_key: str, api_endpoint: str):
+    """
+    Stub: Translator.
+    """
+    show_header("Translator")
+
+    st.write("Let the AI do its work")
+    
+    text = st.text_area("Write your text")
+    language = st.radio(
+        "Output Language",
+        ["🌎English", "🌍Greek"],
+        horizontal=False # Makes the radio buttons sit side-by-side
+    )
+    user_input = translator_prompt(text, language)
+    translate = st.button("Translate!")
+    output = st.container()  # Above the retry button
+    if translate:
+        st.session_state.pop("translation", None)
+        with output:
+            if estimate_tokens(text) <= CHUNK_TOKENS:
+                show_result(user_input, api_key, api_endpoint)
+            else:
+                chunks = split_text(text, CHUNK_TOKENS)
+                show_translation(text, language, chunks, [None] * len(chunks), api_key, api_endpoint)
+    # A long translation some parts of which failed, kept so that only those are sent again
+    unfinished = st.session_state.get("translation")
+    if unfinished is not None and (unfinished["text"], unfinished["language"]) != (text, language):
+        del st.session_state["translation"]  # The text was changed since
+        unfinished = None
+    if unfinished is not None and st.button("Retry the parts that failed"):
+        with output:
+            show_translation(text, language, unfinished["chunks"], unfinished["parts"], api_key, api_endpoint)
+
+def translate_chunks(chunks: list[tuple[str, str]], language: str, api_key: str, api_endpoint: str,
+                     parts: list[str | None], errors: dict[int, str]) -> Iterator[str]:
+    """
+    Translates the parts that are None in `parts` concurrently, filling them
+    in, and yields the whole translation in order, each part as soon as the
+    ones before it are done. A part that fails stays None, with its error in
+    `errors`, and is left out of the translation. Every part is cached on its
+    own, so editing one paragraph only translates its part (and sometimes the
+    parts after it, whose boundaries may move) again.
+    """
+    missing = [index for index, part in enumerate(parts) if part is None]
+    results = batch.iter_llm_batch([translator_prompt(chunks[index][1], language) for index in missing],
+                                   api_key, api_endpoint, concurrency=PARALLEL, project=current_project.get(),
+                                   session=current_session.get() or "batch")
+    shown = False
+    for index, (separator, _) in enumerate(chunks):
+        if parts[index] is None:
+            result = next(results)  # Results come in the order of `missing`
+            if not result["ok"]:
+                errors[index] = result["text"]
+                continue
+            parts[index] = result["text"].strip()
+        yield (separator if shown else "") + parts[index]
+        shown = True
+
+def show_translation(text: str, language: str, chunks: list[tuple[str, str]], parts: list[str | None],
+                     api_key: str, api_endpoint: str):
+    st.caption(f"Translating {parts.count(None)} parts, {PARALLEL} at a time...")
+    st.subheader("Result")
+    errors = {}
+    started = time.perf_counter()
+    translation = st.write_stream(translate_chunks(chunks, language, api_key, api_endpoint, parts, errors))
+    if errors:
+        st.session_state["translation"] = {"text": text, "language": language, "chunks": chunks, "parts": parts}
+        numbers = ", ".join(str(index + 1) for index in errors)
+        st.warning(f"Parts {numbers} of {len(chunks)} could not be translated and are missing above "
+                   f"({next(iter(errors.values()))}).")
+    else:
+        st.session_state.pop("translation", None)
+        # The parts went through the batch client, which does not keep answers for the user's history
+        history.record(current_project.get(), translator_prompt(text, language), translation)
+    st.caption(f"Done in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,193 @@
+"""
+Helpers shared by the project pages.
+"""
+import functools
+import itertools
+import time
+
+import streamlit as st
+
+import projects
+from krikri import conversation, history, jobs
+from krikri.llm import current_project, current_session
+from krikri.prompts import Prompt, user_text
+
+
+def show_header(title: str):
+    """
+    The page's header, with the authors from the project's TOML file below it.
+    """
+    st.header(title)
+    plugin = projects.discover().get(current_project.get())
+    if plugin is not None and plugin.authors:
+        st.caption(" • ".join(plugin.authors))
+
+
+def show_result(prompt: str | Prompt, api_key: str, api_endpoint: str, title: str = "Result", mode: str | None = None,
+                follow_ups: bool = False) -> str:
+    """
+    Streams the model's answer into the page as it is generated.
+    The request runs as a background job kept in the session (replacing,
+    and cancelling, the page's previous one), so it survives reruns.
+    `mode` picks a per-mode model route of the project, if one is configured.
+    With `follow_ups` the answer starts a conversation that show_follow_up
+    continues.
+    """
+    on_done = None
+    if follow_ups:
+        thread = conversation.start(current_session.get(), current_project.get(), prompt, mode)
+        st.session_state.setdefault("threads", {})[thread.project] = thread.id
+        on_done = functools.partial(conversation.record, thread.id, user_text(prompt),
+                                    api_key=api_key, api_endpoint=api_endpoint)
+    job = jobs.submit(prompt, api_key, api_endpoint, mode=mode, on_done=on_done)
+    _keep(job)
+    return show_job(job, title)
+
+
+def show_follow_up(api_key: str, api_endpoint: str, title: str = "Follow-up") -> str | None:
+    """
+    A box for follow-up questions on the page's conversation (started by
+    show_result with `follow_ups`). Each question is sent with the earlier
+    turns instead of the whole input again. Call it at the end of the page,
+    outside the page's button.
+    """
+    thread = conversation.get(st.session_state.get("threads", {}).get(current_project.get()))
+    if thread is None:
+        return None
+    area = st.container()  # The conversation goes above the box
+    with st.form(f"follow_up_{thread.project}", clear_on_submit=True):
+        question = st.text_input("Ask a follow-up question", placeholder="e.g. Explain step 3 in more detail")
+        asked = st.form_submit_button("Ask")
+    if not asked or not question.strip():
+        return None
+    with area:
+        if thread.turns:
+            with st.expander(f"Conversation so far ({len(thread.turns)} turns)"):
+                if thread.summary:
+                    st.caption(f"Earlier: {thread.summary}")
+                for before, answer in thread.turns:
+                    st.markdown(f"**You:** {before}")
+                    st.markdown(answer)
+        st.markdown(f"**You:** {question}")
+        on_done = functools.partial(conversation.record, thread.id, question, api_key=api_key,
+                                    api_endpoint=api_endpoint)
+        job = jobs.submit(conversation.follow_up(thread, question), api_key, api_endpoint, mode=thread.mode,
+                          on_done=on_done)
+        _keep(job)
+        return show_job(job, title)
+
+
+def show_results(prompt: str | Prompt, n: int, api_key: str, api_endpoint: str, title: str = "Results",
+                 mode: str | None = None) -> list[str]:
+    """
+    Like show_result, for a prompt that asks for one item of a list (one
+    excuse, one gift idea): asks for `n` of them at once and shows each one
+    as soon as it is ready.
+    """
+    job = jobs.submit(prompt, api_key, api_endpoint, mode=mode, n=n)
+    _keep(job)
+    return show_job(job, title)
+
+
+def show_job(job: jobs.Job, title: str = "Result") -> str | list[str]:
+    """
+    Streams a job's answer from the start. The spinner stays up only until
+    the first token arrives, with the request's place in the queue shown
+    while the service is busy. The answers of a job with several are shown
+    one below the other, numbered.
+    """
+    st.session_state["job_shown"] = job.id
+    queue_status = st.empty()
+    on_wait = lambda position: queue_status.caption(f"⏳ The service is busy: you are number {position} in the queue.")
+    stream = job.follow(on_wait)
+    with st.spinner("Consulting the model..."):
+        first = next(stream, "")
+    queue_status.empty()
+    st.subheader(title)
+    if job.n:
+        result = []
+        for index, answer in enumerate(itertools.chain([first] if first else [], stream), 1):
+            st.markdown(f"**{index}.** {answer}")
+            result.append(answer)
+    else:
+        result = st.write_stream(itertools.chain([first], stream))
+    timings = job.timings
+    if timings.get("ttft") is not None and timings.get("total") is not None:
+        first_label = "first answer" if job.n else "first token"
+        st.caption(f"{timings['model']} • {first_label} after {timings['ttft']:.2f}s • done in {timings['total']:.2f}s")
+    return result
+
+
+def leave_other_pages(project: str):
+    """
+    Called before every run of a page: cancels the session's jobs that are
+    still running for other pages, which the user has left.
+    """
+    session_jobs = st.session_state.setdefault("jobs", {})
+    for other, job in list(session_jobs.items()):
+        if other != project and job.cancel():
+            del session_jobs[other]
+    st.session_state["job_shown"] = None
+
+
+def show_pending(project: str):
+    """
+    After a page run that did not show its latest job (a rerun from one of
+    its widgets, or coming back to the page), shows it below the page.
+    """
+    job = st.session_state.get("jobs", {}).get(project)
+    if job is not None and st.session_state.get("job_shown") != job.id and job.state != "cancelled":
+        show_job(job, "Previous result" if job.done else "Result")
+
+
+def show_history(project: str):
+    """
+    The user's earlier answers on this page (or on every page), searchable,
+    shown again from krikri.history without asking the model. The search
+    runs when the panel is opened or the search changes, not on every rerun.
+    """
+    user = history.current_user.get()
+    if not user or not history.SETTINGS["enabled"]:
+        return
+    results = f"history_results_{project}"
+    refresh = lambda: st.session_state.pop(results, None)
+    if not st.toggle("🕘 Your earlier answers", key=f"history_open_{project}", on_change=refresh):
+        return
+    with st.container(border=True):
+        if not st.user.get("is_logged_in"):
+            st.caption("Kept for this browser tab only: sign in to keep them after a reload.")
+        text = st.text_input("Search", key=f"history_search_{project}", placeholder="Words from the question or answer",
+                             on_change=refresh)
+        everywhere = st.toggle("All pages", key=f"history_all_{project}", on_change=refresh)
+        if results not in st.session_state:
+            st.session_state[results] = history.search(user, text, project=None if everywhere else project)
+        entries = st.session_state[results]
+        if not entries:
+            st.caption("No matching answers." if text else "Answers you get here are kept for a while.")
+            return
+        entry = st.selectbox("Answer", entries, key=f"history_entry_{project}", format_func=_history_label)
+        st.markdown(entry["answer"])
+        when = time.strftime("%d/%m %H:%M", time.localtime(entry["created_at"]))
+        st.caption(f"{entry['model']} • {when}" if entry["model"] else when)
+        st.button("Forget my answers", key=f"history_forget_{project}", on_click=_forget_history,
+                  args=(user, results))
+
+
+def _forget_history(user: str, results: str):
+    history.forget(user)
+    st.session_state.pop(results, None)
+
+
+def _history_label(entry: dict) -> str:
+    when = time.strftime("%d/%m %H:%M", time.localtime(entry["created_at"]))
+    question = " ".join(entry["prompt"].split())
+    return f"{when} · {question[:70]}{'…' if len(question) > 70 else ''}"
+
+
+def _keep(job: jobs.Job):
+    # The page's latest job, replacing (and cancelling) the previous one
+    session_jobs = st.session_state.setdefault("jobs", {})
+    previous = session_jobs.get(job.project)
+    if previous is not None:
+        previous.cancel()
+    session_jobs[job.project] = job
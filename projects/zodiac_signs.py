@@ -0,0 +1,28 @@
+"""
+Ζωδιακός ερευνητής — Ευτυχία Διώνη Γιαννούτσου, Ελευθεριος Μουσταφερης, Ιάσωνας Σταυρος Κωνσταντόπουλος, Γρηγόρης Ανάργυρος.
+"""
+import streamlit as st
+
+from krikri.prompts import Prompt
+from projects.ui import show_header, show_result
+
+
+SYSTEM_PROMPT = "Βρες το ζώδιο του χρήστη από τα χαρακτηριστικά του χαρακτήρα του."
+
+def zodiac_signs_prompt(situation: str) -> Prompt:
+    return Prompt(SYSTEM_PROMPT, f"Βρες το ζώδιό μου. Ο χαρακτήρας μου είναι: '{situation}'.")
+
+def zodiac_signs(api_key: str, api_endpoint: str):
+    """
+    Ευτυχία Διώνη Γιαννούτσου, Ελευθεριος Μουσταφερης, Ιάσωνας Σταυρος Κωνσταντόπουλος, Γρηγόρης Ανάργυρος
+    Stub: Ζωδιακός ερευνητής
+    """
+    show_header("Ζωδιακός ερευνητής")
+    st.write("Βρες το ζώδιό μου!")
+    situation = st.text_input("Πες μου χαρακτηριστικά του χαρακτήρα σου; (π.χ., 'ευέξαπτος')")
+    if st.button("Βρες το ζώδιο"):
+        if not situation:
+            st.warning("Please enter a topic first.")
+            return
+        final_prompt = zodiac_signs_prompt(situation)
+        show_result(final_prompt, api_key, api_endpoint)
@@ -0,0 +1,187 @@
+"""
+Runs project prompts from a JSONL file against the endpoint, without the UI.
+
+Each input line names a project (the page function, e.g. "dress_code") and
+the values its widgets would have:
+
+    {"id": "q1", "project": "dress_code", "inputs": {"occasion": "a wedding", "gender": "Male"}}
+
+Missing inputs take the widget defaults. Projects whose pages show several
+answers, one item each (see `samples` in the project's TOML file), get as
+many here, from the same one-item prompt; a record's "samples" overrides
+the count. Every record produces one output line with the answer (the
+numbered answers, also listed in "texts", for several), latency and token
+usage. Records already answered
+successfully in the output file are skipped, so an interrupted run can be
+resumed by running the same command again.
+
+    python run_batch.py requests.jsonl results.jsonl --concurrency 16
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import projects
+from krikri import batch, llm, settings
+from krikri.prompts import Prompt
+
+logger = logging.getLogger("run_batch")
+
+
+def read_records(path: Path) -> list[dict]:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.setdefault("id", line_no)
+            records.append(record)
+    return records
+
+
+def read_done(path: Path) -> set[str]:
+    """
+    IDs that already have a successful result in the output file.
+    """
+    done = set()
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partial line from an interrupted run
+                if result.get("ok"):
+                    done.add(str(result["id"]))
+    return done
+
+
+def build_prompt(record: dict) -> tuple[Prompt, int]:
+    """
+    The prompt the project's page builds for the record's inputs, and how
+    many answers it asks for (0 for one whole answer).
+    """
+    project = record.get("project")
+    prompt = projects.prompt_builder(project)(**record.get("inputs", {}))
+    return prompt, int(record.get("samples", projects.discover()[project].samples))
+
+
+def run_samples(prompt: Prompt, n: int, project: str, api_key: str, api_endpoint: str) -> dict:
+    """
+    Asks for `n` answers as the page does, with query_llm_samples; the result
+    has the shape of a batch result, plus the answers in "texts".
+    """
+    timings = {}
+    answers = list(llm.query_llm_samples(prompt, api_key, api_endpoint, n, timings=timings, project=project))
+    ok = not timings.get("failed", True)  # No timings at all without credentials
+    if ok:
+        text = "\n\n".join(f"{index}. {answer}" for index, answer in enumerate(answers, 1))
+    else:
+        text, answers = answers[-1] if answers else "", []  # The error comes last
+    return {"ok": ok, "text": text, "texts": answers, "attempts": 1,
+            "latency": round(timings.get("total") or 0.0, 3), "cached": False,
+            "route": timings.get("route"), "model": timings.get("model"),
+            "prompt_tokens": None, "completion_tokens": None, "truncated": False}
+
+
+def summarize(results: list[dict], elapsed: float) -> str:
+    ok = [r for r in results if r["ok"]]
+    latencies = sorted(r["latency"] for r in ok)
+    completion_tokens = sum(r["completion_tokens"] or 0 for r in ok)
+    lines = [
+        f"{len(results)} records in {elapsed:.1f}s: {len(ok)} ok, {len(results) - len(ok)} failed, "
+        f"{sum(r['cached'] for r in ok)} from cache",
+        f"Throughput: {len(results) / elapsed:.2f} req/s, {completion_tokens / elapsed:.1f} completion tokens/s",
+    ]
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        lines.append(f"Latency: p50 {cuts[49]:.2f}s, p95 {cuts[94]:.2f}s, max {latencies[-1]:.2f}s")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run project prompts from a JSONL file.")
+    parser.add_argument("input", type=Path, nargs="?", help="JSONL file with project/inputs records")
+    parser.add_argument("output", type=Path, nargs="?", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=None, help="Requests in flight (default from [LLM_BATCH])")
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--endpoint", default="")
+    parser.add_argument("--no-resume", action="store_true", help="Run every record even if already answered")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--list", action="store_true", help="List the project names and their inputs, and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+
+    if args.list:
+        for project, plugin in projects.discover().items():
+            samples = f" ({plugin.samples} samples)" if plugin.samples else ""
+            print(f"{project}: {', '.join(plugin.inputs)}{samples}")
+        return 0
+    if args.input is None or args.output is None:
+        parser.error("input and output are required")
+
+    api_key, api_endpoint = settings.load_credentials(args.api_key, args.endpoint)
+    records = read_records(args.input)
+    done = set() if args.no_resume else read_done(args.output)
+    pending = [r for r in records if str(r["id"]) not in done]
+    logger.info(f"{len(records)} records, {len(records) - len(pending)} already done, {len(pending)} to run")
+
+    results = []
+    prompts, record_projects, runnable = [], [], []
+    sampled = []  # (record, prompt, n)
+    lock = threading.Lock()  # Batch results arrive on the batch's loop, sampled ones on the pool's threads
+    with open(args.output, "a", encoding="utf-8") as out:
+        def write(record, result):
+            nonlocal last_report
+            with lock:
+                out.write(json.dumps({"id": record["id"], "project": record.get("project"),
+                                      "inputs": record.get("inputs", {}), **result}, ensure_ascii=False) + "\n")
+                out.flush()
+                results.append(result)
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    logger.info(f"{len(results)}/{len(pending)} done, {len(results) / (now - started):.2f} req/s")
+
+        started = last_report = time.perf_counter()
+        for record in pending:
+            try:
+                prompt, n = build_prompt(record)
+            except (TypeError, ValueError) as e:
+                write(record, {"ok": False, "text": f"Invalid record: {e}", "attempts": 0, "latency": 0.0,
+                               "cached": False, "prompt_tokens": None, "completion_tokens": None})
+                continue
+            if n:
+                sampled.append((record, prompt, n))
+                continue
+            prompts.append(prompt)
+            record_projects.append(record["project"])
+            runnable.append(record)
+
+        with ThreadPoolExecutor(args.concurrency or batch.SETTINGS["concurrency"],
+                                thread_name_prefix="run-batch-samples") as pool:
+            def sample(record, prompt, n):
+                write(record, run_samples(prompt, n, record["project"], api_key, api_endpoint))
+
+            for record, prompt, n in sampled:
+                pool.submit(sample, record, prompt, n)
+            if prompts:
+                batch.query_llm_batch(prompts, api_key, api_endpoint, concurrency=args.concurrency,
+                                      project=record_projects,
+                                      on_result=lambda index, result: write(runnable[index], result))
+
+    if results:
+        print(summarize(results, time.perf_counter() - started), file=sys.stderr)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
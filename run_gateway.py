@@ -0,0 +1,48 @@
+"""
+Runs the shared LLM gateway (see krikri.gateway) that the app's processes
+send their requests to when [LLM_GATEWAY] url is set in secrets.toml.
+
+It reads the same secrets.toml as the app: the credentials and endpoint of
+the API, and the tuning sections (cache, rate limit, replicas...), which
+apply to all the app's processes together.
+
+    python run_gateway.py --port 8100
+    python run_gateway.py --socket /run/krikri/gateway.sock
+"""
+import argparse
+import logging
+import sys
+
+from krikri.gateway import Gateway
+
+logger = logging.getLogger("run_gateway")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the shared LLM gateway for the app's processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--socket", default="", help="Listen on this Unix socket instead of host:port")
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--endpoint", default="")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    from krikri.settings import load_credentials  # Applies secrets.toml too
+
+    api_key, api_endpoint = load_credentials(args.api_key, args.endpoint)
+    if not api_endpoint:
+        parser.error("no API endpoint: set it in secrets.toml, KRIKRI_API_ENDPOINT or --endpoint")
+    gateway = Gateway(api_key, api_endpoint, args.host, args.port, args.socket)
+    logger.info(f"Gateway listening on {gateway.url}, forwarding to {api_endpoint}")
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,485 +1,134 @@
 import streamlit as st
 import logging
 import base64
+import json
+import time
 from pathlib import Path
-from openai import OpenAI, OpenAIError
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import projects
+import warm_cache
+from krikri import (admission, budget, cache, clients, conversation, endpoints, gateway, hedging, history, jobs,
+                    metrics, routing, singleflight)
+from krikri.llm import current_project, current_session
+from krikri.settings import SECTIONS as SETTINGS_SECTIONS, apply as apply_settings
+from projects.ui import leave_other_pages, show_history, show_pending
 
 # Configure logging
 logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuration Constants
-MODEL_NAME = "krikri-dpo-context"
-
-def query_llm(prompt: str, api_key: str, api_endpoint: str) -> str:
+def read_settings() -> str:
     """
-    Executes a request to the Krikri API using the OpenAI client library.
+    Collects the tuning sections of secrets.toml as a JSON string
+    (hashable, so it can key the cached initialisation below).
     """
-    if not api_key:
-        return "Error: API Key is missing. Please configure the application."
-    
-    if not api_endpoint:
-        return "Error: API Endpoint is missing."
-
-    try:
-        # Initialize the client with the custom endpoint
-        client = OpenAI(
-            api_key=api_key,
-            base_url=api_endpoint
-        )
-
-        logger.info(f"Sending request to {api_endpoint} using model {MODEL_NAME}")
-        
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7, 
-            max_tokens=500
-        )
-
-        return response.choices[0].message.content
-
-    except OpenAIError as e:
-        logger.error(f"OpenAI API Error: {e}")
-        return f"API Error: {str(e)}"
-    except Exception as e:
-        logger.error(f"General Error: {e}")
-        return f"An unexpected error occurred: {str(e)}"
-
-def project_concept_explainer(api_key: str, api_endpoint: str):
+    settings = {}
+    for section in SETTINGS_SECTIONS:
+        try:
+            if section in st.secrets:
+                settings[section] = st.secrets[section].to_dict()
+        except FileNotFoundError:
+            break
+    return json.dumps(settings, sort_keys=True)
+
+@st.cache_resource(show_spinner=False)
+def init_llm_backend(api_key: str, api_endpoint: str, settings: str = "{}") -> bool:
     """
-    Complete Implementation: Concept Explainer.
+    Runs once per server process (and per credentials): applies the settings
+    and opens the first connection before any user clicks a button.
     """
-    st.header("Concept Explainer")
-    st.write("Enter a complex topic and select an audience.")
+    apply_settings(json.loads(settings))
+    connected = [clients.preconnect(api_key, url) for url in endpoints.split(api_endpoint)]
+    return any(connected)
 
-    # Main Input
-    topic_input = st.text_area("Enter the concept to explain", height=100)
-    
-    # Configuration Options (Vertical Layout)
-    complexity_level = st.selectbox(
-        "Target Audience",
-        ["Five-year-old", "High School Student", "University Professor"]
-    )
-    
-    output_language = st.radio(
-        "Output Language",
-        ["English", "Greek"],
-        horizontal=True 
-    )
-
-    if st.button("Generate Explanation"):
-        if not topic_input:
-            st.warning("Please enter a topic first.")
-            return
-        
-        # Updated Prompt with Language Instruction
-        final_prompt = (
-            f"Explain the concept of '{topic_input}' "
-            f"specifically to a {complexity_level}. "
-            f"Provide the explanation in {output_language}."
-        )
-        
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-            
-        st.subheader("Result")
-        st.markdown(result)
-
-
-def project_symptom_explainer(api_key: str, api_endpoint: str):
-    st.header("Symptom Explainer")
-    st.caption("Γιώργος Τσαφούλης • Φώτης Μαμούδης")
-
-    st.write("Describe the symptoms of a medical condition.")
-
-    # Main Input
-    symptoms_input = st.text_area("Describe your symptoms", height=100)
-    
-    # Configuration Options (Vertical Layout)
-    symptoms_duration = st.selectbox(
-        "How long have you had the symptoms?",
-        ["1 Day", "3 Days", "1 week", "more than a week" ]
-    )
-    
-    user_age = st.slider("Age", 1, 100, 5)
-    user_weight=st.slider("Weight (KGs)", 1, 200, 5)
-    user_height=st.slider("Height (CMs)", 1, 250, 5)
-
-    output_language = st.radio(
-        "Output Language",
-        ["English", "Greek"],
-        horizontal=True # Makes the radio buttons sit side-by-side
-    )
-
-    if st.button("Generate Explanation"):
-        if not symptoms_input:
-            st.warning("Please enter a symptom description.")
-            return
-        
-        # Updated Prompt with Language Instruction
-        final_prompt = (
-            f"Explain the symptoms: '{symptoms_input}' "
-            f"Take into account the user's height ({user_height}), weight ({user_weight}), and age ({user_age}). "
-            f"Explain everything specifically to a {user_age} year-old."
-            f"Provide the explanation in {output_language}."
-        )
-        
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-            
-        st.subheader("Result")
-        st.markdown(result)
-
-
-def ideal_sport_advisor(api_key: str, api_endpoint: str):
+@st.cache_resource(show_spinner=False)
+def logo_html(logo_path: str, target_url: str) -> str | None:
     """
-    Ideal Sport Advisor.
-    Φώτης Μαμούδης 
-    Παναγιώτης Τσιτίνης
-    Γιώργος Συργιαμιώτης
+    The clickable sidebar logo, with the image inlined. Built once per
+    process instead of re-reading and re-encoding the file on every rerun.
     """
-    st.header("Ideal Sport Advisor")
-    st.caption("Φώτης Μαμούδης • Παναγιώτης Τσιτίνης • Γιώργος Συργιαμιώτης")
-
-    st.write("Enter information about yourself.")
-    # Main Input
-    info = st.text_area("Input", height=100)
-
-    # Configuration Options (Vertical Layout)
-    age = st.selectbox(
-        "Age",
-        ["10-20", "20-30", "40-80"]
-    )
-
-    output_language = st.radio(
-        "Output Language",
-        ["English", "Greek"],
-        horizontal=True # Makes the radio buttons sit side-by-side
-    )
-    if st.button("Generate Explanation"):
-        if not age:
-            st.warning("Please enter your information.")
-            return
-        
-        # Updated Prompt with Language Instruction
-        final_prompt = (
-            f"This is the user input about the user, their habits and their vital status: '{info}' "
-            f"His age range is {age}. "
-            f"Provide the ideal sport recommendation based on the inpt in {output_language}."
-        )
-
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        
-        st.subheader("Result")
-        st.markdown(result)
-
-def project_how_to_persuade_my_parents(api_key: str, api_endpoint: str):
+    path = Path(logo_path)
+    if not path.exists():
+        return None
+    try:
+        encoded = base64.b64encode(path.read_bytes()).decode()
+    except Exception as e:
+        logger.error(f"Failed to process logo image: {e}")
+        return None
+    return f'''
+        <a href="{target_url}" target="_blank">
+            <img src="data:image/jpeg;base64,{encoded}" width="150" style="margin-top: 10px; margin-bottom: 10px;">
+        </a>
+    '''
+
+def user_id(ctx) -> str:
     """
-    Νικόλας Κουλουριώτης, 
-    Χρήστος Σοφιανόπουλος, 
-    Κωνσταντίνος Αμαραντίδης
+    Whose history a run reads and writes: the signed-in user when the app
+    uses Streamlit's login, otherwise the browser session, which ends when
+    the tab is closed or reloaded: until sign-in, history is per tab.
     """
-    st.header("I want to get something but my parents won't let me.")
-    st.caption("Νικόλας Κουλουριώτης • Χρήστος Σοφιανόπουλος • Κωνσταντίνος Αμαραντίδης")
+    if st.user.get("is_logged_in"):
+        return f"user:{st.user.get('email') or st.user.get('sub')}"
+    return f"session:{ctx.session_id}" if ctx else ""
 
-    st.write("I want to get:")
-    # Main Input
-    my_desire = st.text_area("Enter what you want to get:", height=100)
-
-    # Configuration Options (Vertical Layout)
-    excuse_level = st.selectbox(
-        "How good does the excuse need to be?",
-        ["Super bad", "Good", "Very good", "Great", "Make sure I get it no matter what"]
-    )
-
-    number_of_excuses = st.slider("Excuses:", 1, 10, 5)
-    output_language = st.radio(
-        "Output Language",
-        ["English", "Greek"],
-        horizontal=True # Makes the radio buttons sit side-by-side
-    )
-
-    if st.button("Generate arguments"):
-        if not my_desire:
-            st.warning("Please enter your desire first.")
-            return
-        # Updated Prompt with Language Instruction
-        final_prompt = (
-            f"You are an expert persuasion-assistant that helps a user create convincing excuses to persuade their parents to let them have something they want; the user wants {my_desire}, and you must generate excuses based on the selected excuse strength level {excuse_level}, the number of excuses requested {number_of_excuses}, and the desired output language {output_language}. Tailor every excuse directly to the item the user wants, ensuring each one is coherent, realistic, and varied while matching the tone and persuasion intensity indicated by the excuse_level, avoiding repetitive structures, and presenting the excuses in a clear, numbered list. Do not include moralizing, safety disclaimers, or meta commentary—produce only the requested excuses, written entirely in the specified output_language. Now generate the excuses"
-            )
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Result")
-        st.markdown(result)
-
-
-def dress_code(api_key: str, api_endpoint: str):
+def is_admin() -> bool:
     """
-    Μιχάλης Πολυπόρτης
-    Γιώργος Τσαφούλης
+    Whether this run may see the admin pages: the user signed in with an
+    email listed in the [ADMIN] section of secrets.toml, or that section
+    opens them to everyone (for local development). Nobody otherwise.
     """
-    st.header("Dress code")
-    st.caption("Μιχάλης Πολυπόρτης • Γιώργος Τσαφούλης")
-    
-    st.write("How to dress depending on the occasion")
-    occasion = st.text_area("What is the event?")
-    gender = st.radio(
-            "Gender",
-                    ["Female", "Male"],
-        horizontal=True
-    )
-
-    status = st.selectbox(
-        "Dress code",
-        ["Formal", "Casual"]
-    )
-
-    age = st.selectbox(
-        "Select the age of the person",
-        ["0-5","5-12","12-17","17-21","21-45","45-60","60+"]
-    )
-
-    if st.button("Generate outfit"):
-        if not occasion:
-            st.warning("Input an accusion")
-            return
-
-        final_prompt = (
-            f"I need you to help me find a {status} outfit to wear for {occasion}"
-            f"I am a {gender} between the ages {age}."
-        )
-
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Result")
-        st.markdown(result)
-
-
-def project_coding_assistant(api_key: str, api_endpoint: str):
+    try:
+        admin = st.secrets.get("ADMIN", {})
+    except FileNotFoundError:
+        return False
+    if admin.get("everyone", False):
+        return True
+    return bool(st.user.get("is_logged_in")) and st.user.get("email") in admin.get("emails", [])
+
+@st.fragment
+def render_project(project: str, api_key: str, api_endpoint: str):
     """
-    Coding Assistanτ
-    Κωνσταντίνος Δρούκας
-    Αλέξανδρος Μιλάτος
-    Νίκος Βαγενάς
+    Runs the selected project page as a fragment: changing one of its
+    widgets reruns only the page, not the sidebar and the rest of main().
+    The project's module is imported the first time its page is opened.
+    Answers still running for another page are cancelled, and the page's
+    latest answer is shown again if the run did not show it.
     """
-    
-    st.header("Coding Assistant")
-    st.caption("Κωνσταντίνος Δρούκας • Αλέξανδρος Μιλάτος • Νίκος Βαγενάς")
-
-    st.write("Explain code, fix bugs, or generate code.")
-    mode = st.selectbox(
-        "Task",
-        ["Explain Code", "Fix Bugs", "Generate"]
-    )
-    
-    user_input = st.text_area("Input Code / Description", height=220)
-    language = st.selectbox("Response Language", ["English", "Greek"])
-    if st.button("Run"):
-        if not user_input:
-            st.warning("Please enter code.")
-            return
-        if mode == "Explain Code":
-            prompt = (
-                f"Explain the following code step by step. Output in {language}.\n\n"
-                f"--- CODE START ---\n{user_input}\n--- CODE END ---"
-            )
-        elif mode == "Fix Bugs":
-            prompt = (
-            f"Identify all bugs in the following code and propose corrected code. "
-            f"Output in {language}.\n\n"
-            f"--- CODE START ---\n{user_input}\n--- CODE END ---"
-            )
+    try:
+        if project in ADMIN_PAGES:
+            if not is_admin():
+                st.error("This page is only for the app's admins.")
+                return
+            page = ADMIN_PAGES[project][1]
         else:
-            prompt = (
-            f"Generate a complete, correct piece of code based on the following description. "
-            f"Output in {language}.\n\n"
-            f"Description:\n{user_input}"
-        )
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(prompt, api_key, api_endpoint)
-            
-        st.subheader("Result")
-        st.markdown(result)
-
-def project_translator(api_key: str, api_endpoint: str):
-    """
-    Stub: Translator.
-    """
-    st.header("Translator")
-    st.caption("Ευαγγελία Κορκοβέλου • Θωμάς Τσολάκης")
-
-    st.write("Let the AI do its work")
-    
-    text = st.text_area("Write your text")
-    language = st.radio(
-        "Output Language",
-        ["🌎English", "🌍Greek"],
-        horizontal=False # Makes the radio buttons sit side-by-side
-    )
-    user_input = f"Translate this'{text}' to {language} text"
-    if st.button("Translate!"):
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(user_input, api_key, api_endpoint)   
-            st.subheader("Result")
-            st.markdown(result)
-
-def project_jokes(api_key: str, api_endpoint: str):
-    """
-    Stub: Jokes.
-    """
-    st.header("Jokes")
-    st.caption("Ευαγγελία Κορκοβέλου • Θωμάς Τσολάκης")
-
-    st.write("Let the AI do its work")
-    
-    text = st.text_area("Write your text")
-    intensity = st.slider("Craziness Level", 1, 10, 5)
-    language = st.radio(
-        "Output Language",
-        ["🌎English", "🌍Greek"],
-        horizontal=False # Makes the radio buttons sit side-by-side
-    )
-    user_input = f"Make a joke about '{text}' with {intensity} craziness level to {language} language"
-    if st.button("Laugh!"):
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(user_input, api_key, api_endpoint)   
-            st.subheader("Result")
-            st.markdown(result)
-            
-def project_orderlist(api_key: str, api_endpoint: str):
-    """
-    Stub: Order List.
-    """
-    st.header("Order List")
-    st.caption("Ευαγγελία Κορκοβέλου • Θωμάς Τσολάκης")
-
-    st.write("Let the AI do its work")
-    text = st.text_area("Write your text")
-    language = st.radio(
-        "Output Language",
-        ["🌎English", "🌍Greek"],
-        horizontal=False # Makes the radio buttons sit side-by-side
-    )
-    user_input = f"Using google make a list with this {text} things for the first one = best and the last one = worse in {language} language (NOT AS A CODE AS A TEXT)"
-    if st.button("Laugh!"):
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(user_input, api_key, api_endpoint)   
-            st.subheader("Result")
-            st.markdown(result) 
-
-def zodiac_signs(api_key: str, api_endpoint: str):
-    """
-    Ευτυχία Διώνη Γιαννούτσου, Ελευθεριος Μουσταφερης, Ιάσωνας Σταυρος Κωνσταντόπουλος, Γρηγόρης Ανάργυρος
-    Stub: Ζωδιακός ερευνητής
-    """
-    st.header("Ζωδιακός ερευνητής")
-    st.caption("Ευτυχία Διώνη Γιαννούτσου • Ελευθεριος Μουσταφερης • Ιάσωνας Σταυρος Κωνσταντόπουλος • Γρηγόρης Ανάργυρος")
-    st.write("Βρες το ζώδιό μου!")
-    situation = st.text_input("Πες μου χαρακτηριστικά του χαρακτήρα σου; (π.χ., 'ευέξαπτος')")
-    if st.button("Βρες το ζώδιο"):
-        if not situation:
-            st.warning("Please enter a topic first.")
-            return
-        final_prompt = (f"Βρες το ζώδιό μου."
-                        f"Ο χαρακτήρας μου είναι: '{situation}'."
-        )
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Result")
-        st.markdown(result)
-
-def project_excuse_generator(api_key: str, api_endpoint: str):
-    """
-    Κωνσταντίνος Εμμανουήλ, Χρυσούλα Ουζούνη, Αναστασία Ορφανίδου
-    Stub: The Excuse Generator.
-    """
-    st.header("Η αλεπού 🦊")
-    st.caption("Κωνσταντίνος Εμμανουήλ • Χρυσούλα Ουζούνη • Αναστασία Ορφανίδου")
-    
-    st.write("Δώσε μου έναν δημιουργικό λόγο για να ξεφύγω από μια δύσκολη κατάσταση!")
-    situation = st.text_input("Τι έκανες; (π.χ., 'Ξέχασα τις ασκήσεις για το σπίτι')")
-    intensity = st.slider("Επίπεδο τρέλας", 1, 10, 5)
-    if st.button("Φτιάξε την δικαιολογία"):
-        final_prompt = (
-            f"Είμαι σε μια δύσκολη κατάσταση. Αυτό που έγινε είναι '{situation}' "
-            f"Δώσε μου μια λογική και ρεαλιστική δικαιολογία για να δώσω. Στην απάντηση δώσε μόνο μια καλη και μεγαλη δικαιολογια, τίποτα άλλο."
-            )
-        st.info("Ετοιμάζοντας την δικαιολογία")
-        # Main Input
-        if intensity == 1:
-            final_prompt = (
-            f"Είμαι σε μια δύσκολη κατάσταση. Αυτό που έγινε είναι '{situation}' "
-            f"Δώσε μου μια λογική και ρεαλιστική δικαιολογία για να δώσω. Στην απάντηση δώσε μόνο μια καλη και μεγαλη δικαιολογια, τίποτα άλλο."
-            )
-        elif intensity == 5:
-            final_prompt = (
-            f"Είμαι σε μια δύσκολη κατάσταση. Αυτό που έγινε είναι '{situation}' "
-            f"Στην δικαιολογία που θα μου δώσεις στην κλίμακα επιπέδου φαντασίας από το 1 εως το 10 δώσε μου δικαιολογία που βρίσκεται στο επίπεδο 5. Να μην είναι λογικό αλλά να είναι ρεαλιστικό. Στην απάντηση δώσε μόνο μια καλη και μεγαλη δικαιολογια, τίποτα άλλο."
-            )
-        elif intensity == 10:
-            final_prompt = (
-            f"I am in a diffucult situation. The thing is that I '{situation}' "
-            f"Στην δικαιολογία που θα μου δώσεις στην κλίμακα επιπέδου φαντασίας από το 1 εως το 10 δώσε μου δικαιολογία που βρίσκεται στο επίπεδο 10. Να μην είναι λογικό και να είναι μη ρεαλιστικό. Στην απάντηση δώσε μόνο μια καλη και μεγαλη δικαιολογια, τίποτα άλλο."
-            )
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Απάντηση")
-        st.markdown(result)
+            plugin = projects.load(project)
+            if plugin.error:
+                st.error(f"The page '{plugin.title}' could not be loaded: {plugin.error}")
+                if plugin.traceback:
+                    with st.expander("Details"):
+                        st.code(plugin.traceback, language="text")
+                return
+            page = plugin.page
+        ctx = get_script_run_ctx()
+        project_token = current_project.set(project)
+        session_token = current_session.set(ctx.session_id if ctx else "")
+        user_token = history.current_user.set(user_id(ctx))
+        leave_other_pages(project)
+        try:
+            with metrics.page_run(project):
+                page(api_key, api_endpoint)
+                show_pending(project)
+            if project not in ADMIN_PAGES:
+                show_history(project)
+        finally:
+            history.current_user.reset(user_token)
+            current_session.reset(session_token)
+            current_project.reset(project_token)
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
 
-def music_recommendator(api_key : str , api_endpoint : str) :
-    """
-    Βασίλης Αναστασιάδης, Λιάπη Ελευθερία, Κουλερής Νικόλαος
-    Stub: Music recommendator 
-    """
-    st.header("Music Recommender")
-    st.caption("Βασίλης Αναστασιάδης • Λιάπη Ελευθερία • Κουλερής Νικόλαος")
-
-    st.write("Select your mood and your music style and I will recommend you a song")
-    mood = st.selectbox("Mood" , ["Happy" , "Sad" , "angry" , "bored" , "sleepy" , "upset" , "anxious" , "productive" , "work out"])
-    type = st.selectbox("Type of music" , ["Metal" , "Pop" , "Rap" , "Disco" ,"Hip Hop" , "Movie soundtracks" , "Classical" , "Jazz" , "Rock"])
-    output_language = st.radio(
-        "Output Language",
-        ["English", "Greek"], )
-    final_prompt = (f"Select on song in {output_language} whose type is {type} based on the mood {mood} , make it into bullet points have as a header the song title followed by the artist, make sure when choosing Greek the song you choose is not translated and actually originated in Greek, do not translate titles and artist names, the language choosen should only be in {output_language} ")
-    if st.button("Recommend a song"):
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Result")
-        st.markdown(result)
-
-def project_christmas_wishlist(api_key: str, api_endpoint: str):
-    """
-    Ηλεκτρα Φερρεττι,Δαφνη Φερρεττι, Στρατής, Νικη Ερατω Συντριβανη
-    Stub: christmas.wishlist
-    """
-    st.header("Christmas Presents Ideas")
-    st.caption("Ηλεκτρα Φερρέττι • Δαφνη Φερρέττι • Νίκη Ερατώ Συντριβάνη • Στρατής Τζαμπαζάκης")
-
-    st.write("Write your interests and budget and get ideas about your christmas wishlist")
-    gender = st.selectbox("Gender",["Male", "Female"])
-    categories = st.radio("Categories",["Tech", "Sports", "Fashion", "Cooking", "Art", "Reading", "Decoration"])
-    age = st.text_input("Age (e.g., \"12\", \"67\", \"3\")")
-    budget = st.radio("Budget",("0-50", "50-100", "100+"))
-    if st.button("HO HO HO!!!"):
-        if not age:
-            st.warning("Please enter your age first.")
-            return
-        final_prompt = (
-            f"I want to buy a Christmas gift for a friend. Give me a few ideas for gifts for a person whose "
-            f"gender is {gender}, and their age is {age}."
-            f"The gift should be something from the category {categories}. "
-            f"Finally my budget is {budget} dollars."
-            f"Please give me a couple of ideas for a gift based on the above."
-        )
-        with st.spinner(f"Consulting {MODEL_NAME}..."):
-            result = query_llm(final_prompt, api_key, api_endpoint)
-        st.subheader("Result")
-        st.markdown(result)
-    
 # def project_excuse_generator(api_key: str, api_endpoint: str):
 #     """
 #     Stub: The Excuse Generator.
@@ -518,6 +167,70 @@ def project_christmas_wishlist(api_key: str, api_endpoint: str):
 #     if st.button("Encode"):
 #         st.info("Student implementation required here.")
 
+def admin_metrics(api_key: str, api_endpoint: str):
+    """
+    Admin page: per-project requests, latency and tokens since the server started.
+    """
+    st.header("📊 Metrics")
+    st.write("Requests, latency and token usage per project page, since the server started.")
+
+    rows = metrics.snapshot()
+    if rows:
+        st.dataframe(rows, hide_index=True)
+    else:
+        st.info("No requests recorded yet.")
+
+    cache_stats = cache.stats()
+    admission_stats = admission.stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cache hit rate", f"{cache_stats['hit_rate']:.0%}")
+    col2.metric("Running upstream", admission_stats["active"])
+    col3.metric("Queued", admission_stats["queued"])
+    col4.metric("Shared in flight", singleflight.stats()["followers"])
+
+    exposition = metrics.render()
+    st.download_button("Download (Prometheus format)", exposition, file_name="krikri_metrics.prom", mime="text/plain")
+    with st.expander("Prometheus text"):
+        st.code(exposition, language="text")
+
+    st.subheader("Model routes")
+    st.caption("Which model serves each project; a route over its SLO sends its requests to its fallback.")
+    st.dataframe(routing.stats(), hide_index=True)
+
+    st.subheader("Answer length budgets")
+    st.caption("max_tokens per project, from the p95 length of recent answers.")
+    budget_rows = budget.stats()
+    if budget_rows:
+        st.dataframe(budget_rows, hide_index=True)
+    else:
+        st.info("No answers recorded yet.")
+
+    st.subheader("Pre-generated answers")
+    st.caption(f"Filled by warm_cache.py; answers older than {warm_cache.REFRESH_AFTER / 3600:.0f}h count as stale.")
+    # Imports every warm project and looks up each of their combinations, so only when asked
+    if st.button("Check coverage", key="admin_check_coverage"):
+        st.session_state["admin_coverage"] = (time.strftime("%H:%M:%S"), warm_cache.coverage())
+    if "admin_coverage" in st.session_state:
+        checked_at, coverage = st.session_state["admin_coverage"]
+        st.dataframe(coverage, hide_index=True)
+        st.caption(f"Checked at {checked_at}.")
+
+    st.subheader("Answer history")
+    history_stats = history.stats()
+    st.caption(
+        f"{history_stats['entries']} earlier answers kept for users to search ({history_stats['kb']:.0f} KB), "
+        f"{history_stats['deleted']} deleted by retention or by their users, {history_stats['dropped']} not written."
+    )
+
+    st.subheader("Project pages")
+    st.caption("Pages are imported the first time someone opens them.")
+    st.dataframe(projects.stats(), hide_index=True)
+
+# Pages that are part of the app rather than student projects: id -> (menu title, page)
+ADMIN_PAGES = {
+    "admin_metrics": ("📊 Metrics (admin)", admin_metrics),
+}
+
 def main():
     # Set the browser tab title
     st.set_page_config(
@@ -525,24 +238,10 @@ def main():
         layout="wide"
     )
     
-    # Define available projects
-    project_modules = {
-        "Symptom Explainer": project_symptom_explainer,
-        "Ideal Sport Advisor": ideal_sport_advisor,
-        "How to persuade my parents": project_how_to_persuade_my_parents,  
-        "Dress code": dress_code,
-        "Coding Assistant": project_coding_assistant,
-        "Translator": project_translator,
-        "Jokes": project_jokes,
-        "Order List": project_orderlist,
-        "Concept Explainer": project_concept_explainer,
-        "Ζωδιακός ερευνητής": zodiac_signs,
-        "Η αλεπού 🦊": project_excuse_generator,
-        "Music Recommender" : music_recommendator,
-        "Christmas Presents Ideas":project_christmas_wishlist,
-        # "Hip-Hop Lyricist": project_lyricist,
-        # "Emoji Encoder": project_emoji_encoder,
-    }
+    # The menu comes from the projects' metadata; a page's module is imported when it is opened
+    menu = {project: plugin.title for project, plugin in projects.discover().items()}
+    if is_admin():
+        menu.update({page: title for page, (title, _) in ADMIN_PAGES.items()})
 
     # Retrieve Secrets
     # These variables hold the *actual* credentials
@@ -553,7 +252,7 @@ def main():
     if "LLM_CREDENTIALS" in st.secrets:
         try:
             actual_api_key = st.secrets["LLM_CREDENTIALS"]["API_KEY"]
-            actual_endpoint = st.secrets["LLM_CREDENTIALS"]["API_ENDPOINT"]
+            actual_endpoint = endpoints.from_setting(st.secrets["LLM_CREDENTIALS"]["API_ENDPOINT"])
             credentials_loaded = True
         except KeyError:
             logger.warning("Secrets found but keys are missing.")
@@ -562,24 +261,11 @@ def main():
         # --- BRANDING SECTION ---
         st.title("PML 2025 students using an LLM named")
         
-        logo_path = Path("logo.jpg")
         target_url = "https://chat.ilsp.gr"
 
-        if logo_path.exists():
-            try:
-                with open(logo_path, "rb") as f:
-                    img_bytes = f.read()
-                encoded = base64.b64encode(img_bytes).decode()
-                
-                # Clickable Logo
-                html_code = f'''
-                    <a href="{target_url}" target="_blank">
-                        <img src="data:image/jpeg;base64,{encoded}" width="150" style="margin-top: 10px; margin-bottom: 10px;">
-                    </a>
-                '''
-                st.markdown(html_code, unsafe_allow_html=True)
-            except Exception as e:
-                logger.error(f"Failed to process logo image: {e}")
+        html_code = logo_html("logo.jpg", target_url)
+        if html_code:
+            st.markdown(html_code, unsafe_allow_html=True)
         
         # URL Link below the logo
         st.markdown(f"[{target_url}]({target_url})")
@@ -588,7 +274,7 @@ def main():
         
         # --- APP SELECTOR ---
         st.subheader("Select App")
-        selection = st.radio("Available Tools:", list(project_modules.keys()))
+        selection = st.radio("Available Tools:", list(menu), format_func=menu.get)
         
         st.divider()
         
@@ -616,20 +302,53 @@ def main():
                 "LLM Endpoint URL", 
                 value=endpoint_for_display,
                 disabled=credentials_loaded,
-                help="Loaded from st.secrets" if credentials_loaded else "Enter endpoint"
+                help="Loaded from st.secrets" if credentials_loaded else "Enter endpoint (several replicas: comma-separated)"
+            )
+
+            st.caption(f"Pooled LLM clients: {clients.stats()['clients']}")
+            gateway_stats = gateway.stats()
+            if gateway_stats["enabled"]:
+                st.caption(
+                    f"Gateway {'down, calling the API directly' if gateway_stats['down'] else 'up'}: "
+                    f"{gateway_stats['relayed']} relayed, {gateway_stats['fallbacks']} direct"
+                )
+            cache_stats = cache.stats()
+            st.caption(
+                f"Response cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+                f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})"
             )
+            st.caption(f"Requests sharing an identical call in flight: {singleflight.stats()['followers']}")
+            job_stats = jobs.stats()
+            st.caption(f"Answers in progress: {job_stats['running']}, {job_stats['cancelled']} cancelled")
+            conversation_stats = conversation.stats()
+            st.caption(f"Conversations kept: {conversation_stats['threads']} ({conversation_stats['kb']:.0f} KB)")
+            admission_stats = admission.stats()
+            st.caption(
+                f"Upstream: {admission_stats['active']} running, {admission_stats['queued']} queued, "
+                f"{admission_stats['retries']} retries, {admission_stats['rejected']} rejected"
+            )
+            if hedging.SETTINGS["enabled"]:
+                hedging_stats = hedging.stats()
+                st.caption(
+                    f"Hedging after {hedging_stats['delay']:.2f}s: {hedging_stats['hedges']} hedges "
+                    f"({hedging_stats['hedge_rate']:.0%}), {hedging_stats['hedge_wins']} won"
+                )
+            endpoint_stats = endpoints.stats()
+            if len(endpoint_stats) > 1:
+                st.dataframe(endpoint_stats, hide_index=True)
     
     # Determine the *final* credentials to pass to the function
     # If loaded from secrets, use the actual secret. Otherwise, use the manual input.
     final_key = actual_api_key if credentials_loaded else api_key_input
     final_endpoint = actual_endpoint if credentials_loaded else endpoint_input
 
+    # Warm up the shared client pool (cached, so only the first run pays for it)
+    if final_key and final_endpoint:
+        init_llm_backend(final_key, final_endpoint, read_settings())
+
     # Execute Selected Project
-    if selection in project_modules:
-        try:
-            project_modules[selection](final_key, final_endpoint)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
+    if selection in menu:
+        render_project(selection, final_key, final_endpoint)
 
 if __name__ == "__main__":
     main()
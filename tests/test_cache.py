@@ -0,0 +1,76 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from krikri import cache
+from krikri.prompts import Prompt
+
+
+class MakeKeyTest(unittest.TestCase):
+    def test_accents_case_of_whitespace_and_compatibility_forms_do_not_matter(self):
+        self.assertEqual(cache.make_key("Ζώδιο  μου\n", "m", 0.7), cache.make_key("Ζωδιο μου", "m", 0.7))
+        self.assertEqual(cache.make_key("ﬁne", "m", 0.7), cache.make_key("fine", "m", 0.7))
+
+    def test_every_generation_parameter_is_part_of_the_key(self):
+        key = cache.make_key("prompt", "m", 0.7)
+        self.assertNotEqual(key, cache.make_key("prompt", "other", 0.7))
+        self.assertNotEqual(key, cache.make_key("prompt", "m", 0.2))
+        self.assertNotEqual(key, cache.make_key("prompt", "m", 0.7, top_p=0.9))
+        self.assertNotEqual(key, cache.make_key("Prompt", "m", 0.7))
+
+    def test_system_part_and_history_are_part_of_the_key(self):
+        key = cache.make_key(Prompt("Be brief.", "prompt"), "m", 0.7)
+        self.assertNotEqual(key, cache.make_key("prompt", "m", 0.7))
+        self.assertNotEqual(key, cache.make_key(Prompt("Be long.", "prompt"), "m", 0.7))
+        self.assertNotEqual(key, cache.make_key(Prompt("Be brief.", "prompt", [("user", "hi")]), "m", 0.7))
+        self.assertEqual(key, cache.make_key(Prompt("Be  brief.", "prompt"), "m", 0.7))
+
+
+class TiersTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings = dict(cache.SETTINGS)
+        cache.configure(path=str(Path(self.directory.name) / "cache.sqlite3"), max_entries=2, enabled=True)
+        cache.clear()
+
+    def tearDown(self):
+        cache.configure(**self.settings)
+        self.directory.cleanup()
+
+    def test_least_recently_used_entry_leaves_memory_first(self):
+        cache.put("a", "A", 60)
+        cache.put("b", "B", 60)
+        cache.get("a")
+        cache.put("c", "C", 60)
+        self.assertEqual(list(cache._memory), ["a", "c"])
+        hits = cache.stats()["disk_hits"]
+        self.assertEqual(cache.get("b"), "B")  # Still on disk
+        self.assertEqual(cache.stats()["disk_hits"], hits + 1)
+
+    def test_entries_survive_a_restart_in_the_disk_tier(self):
+        cache.put("a", "A", 60, variants=["A", "A2"])
+        cache.configure(path=cache.SETTINGS["path"])  # Reopens the file
+        cache._memory.clear()
+        self.assertIn(cache.get("a"), {"A", "A2"})
+        self.assertEqual(cache.info("a")["variants"], 2)
+
+    def test_expired_entries_are_misses(self):
+        cache.put("a", "A", 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.info("a"))
+
+    def test_projects_can_opt_out_or_set_their_own_ttl(self):
+        cache.configure(projects={"test_off": False, "test_short": 5})
+        try:
+            self.assertIsNone(cache.ttl_for("test_off"))
+            self.assertEqual(cache.ttl_for("test_short"), 5.0)
+            self.assertEqual(cache.ttl_for("test_other"), cache.SETTINGS["ttl"])
+        finally:
+            cache.PROJECTS.pop("test_off")
+            cache.PROJECTS.pop("test_short")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from krikri.chunking import estimate_tokens, split_text
+
+PARAGRAPH = "Η φωτοσύνθεση γίνεται στα φύλλα. Plants turn light into sugar! Is that all? Not quite; there is more."
+
+
+def joined(chunks: list[tuple[str, str]]) -> str:
+    return "".join(separator + chunk for separator, chunk in chunks)
+
+
+class SplitTextTest(unittest.TestCase):
+    def test_empty_text_has_no_chunks(self):
+        self.assertEqual(split_text("  \n\n ", 100), [])
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_text(PARAGRAPH, 1000), [("", PARAGRAPH)])
+
+    def test_chunks_join_back_to_the_text(self):
+        text = "\n\n".join([PARAGRAPH] * 6) + "\n \n\n" + "word " * 300 + "end."
+        for max_tokens in (10, 40, 100, 10000):
+            with self.subTest(max_tokens=max_tokens):
+                self.assertEqual(joined(split_text(text, max_tokens)), text.strip())
+
+    def test_chunks_fit(self):
+        text = "\n\n".join([PARAGRAPH] * 10) + "\n\n" + "word " * 500
+        for separator, chunk in split_text(text, 50):
+            self.assertLessEqual(estimate_tokens(chunk), 50)
+
+    def test_short_paragraphs_are_packed_together(self):
+        text = "\n\n".join(f"Paragraph {index}." for index in range(20))
+        chunks = split_text(text, 40)
+        self.assertLess(len(chunks), 5)
+        for _, chunk in chunks:
+            self.assertTrue(chunk.startswith("Paragraph") and chunk.endswith("."))
+
+    def test_long_paragraph_is_cut_between_sentences(self):
+        chunks = split_text(PARAGRAPH, 20)
+        self.assertGreater(len(chunks), 1)
+        for _, chunk in chunks:
+            self.assertRegex(chunk, r"[.!?;]$")
+
+    def test_later_chunks_keep_their_separators(self):
+        chunks = split_text("First.\n\nSecond.", 2)
+        self.assertEqual(chunks, [("", "First."), ("\n\n", "Second.")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from openai import OpenAI
+
+from benchmarks.mock_server import MockServer
+from krikri import cache, gateway, history
+
+PROMPT = [{"role": "user", "content": "Tell me a story"}]
+HEADERS = {"X-Krikri-Project": "test_gateway"}
+
+
+class UsageTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(latency=0.0, token_rate=10000.0, completion_tokens=50).start()
+        cls.gateway = gateway.Gateway("key", cls.server.url, port=0).start()
+        cls.client = OpenAI(api_key="key", base_url=cls.gateway.url)
+        cache.configure(path="")
+        history.configure(enabled=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+        cls.gateway.stop()
+        cls.server.stop()
+        gateway._serving = False
+
+    def setUp(self):
+        cache.clear()
+
+    def ask(self, max_tokens: int):
+        return self.client.chat.completions.create(model="krikri", messages=PROMPT, max_tokens=max_tokens,
+                                                   extra_headers=HEADERS)
+
+    def test_answer_carries_usage_and_finish_reason(self):
+        response = self.ask(20)
+        self.assertEqual(response.choices[0].finish_reason, "length")
+        self.assertEqual(response.usage.completion_tokens, 20)
+        self.assertGreater(response.usage.prompt_tokens, 0)
+
+    def test_stream_ends_with_usage(self):
+        chunks = list(self.client.chat.completions.create(
+            model="krikri", messages=PROMPT, max_tokens=100, stream=True,
+            stream_options={"include_usage": True}, extra_headers=HEADERS))
+        self.assertEqual(chunks[-1].choices, [])
+        self.assertEqual(chunks[-1].usage.completion_tokens, 50)
+        self.assertEqual(chunks[-2].choices[0].finish_reason, "stop")
+
+    def test_stream_without_include_usage_has_none(self):
+        chunks = list(self.client.chat.completions.create(
+            model="krikri", messages=PROMPT, max_tokens=100, stream=True, extra_headers=HEADERS))
+        self.assertTrue(all(chunk.usage is None for chunk in chunks))
+
+    def test_cached_answer_has_no_usage(self):
+        first = self.ask(100)
+        second = self.ask(100)
+        self.assertEqual(second.choices[0].message.content, first.choices[0].message.content)
+        self.assertIsNotNone(first.usage)
+        self.assertIsNone(second.usage)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from benchmarks.mock_server import MockServer
+from krikri import batch, budget, cache, history, llm, routing
+
+
+class TruncatedAnswersTest(unittest.TestCase):
+    PROJECT = "test_truncated"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = MockServer(latency=0.0, token_rate=10000.0, completion_tokens=50).start()
+        cache.configure(path="")
+        history.configure(enabled=False)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        cache.clear()
+        route = routing.route_for(self.PROJECT)
+        self.key = cache.make_key("Tell me a story", route.model, route.temperature, route.top_p)
+
+    def tearDown(self):
+        budget.PROJECTS.pop(self.PROJECT, None)
+
+    def ask(self, max_tokens: int, stream: bool = False) -> str:
+        budget.configure(projects={self.PROJECT: max_tokens})
+        if stream:
+            return "".join(llm.query_llm_stream("Tell me a story", "key", self.server.url, project=self.PROJECT))
+        return llm.query_llm("Tell me a story", "key", self.server.url, project=self.PROJECT)
+
+    def test_cut_off_answer_is_not_cached(self):
+        self.assertEqual(len(self.ask(20).split()), 20)
+        self.assertIsNone(cache.get(self.key))
+
+    def test_cut_off_stream_is_not_cached(self):
+        self.assertEqual(len(self.ask(20, stream=True).split()), 20)
+        self.assertIsNone(cache.get(self.key))
+
+    def test_cut_off_batch_item_is_not_cached(self):
+        budget.configure(projects={self.PROJECT: 20})
+        [result] = batch.query_llm_batch(["Tell me a story"], "key", self.server.url, project=self.PROJECT)
+        self.assertTrue(result["ok"] and result["truncated"])
+        self.assertIsNone(cache.get(self.key))
+
+    def test_larger_budget_gets_the_whole_answer(self):
+        self.ask(20)
+        answer = self.ask(100)
+        self.assertEqual(len(answer.split()), 50)
+        self.assertEqual(cache.get(self.key), answer)
+
+
+if __name__ == "__main__":
+    unittest.main()
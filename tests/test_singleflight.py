@@ -0,0 +1,50 @@
+import threading
+import unittest
+
+from krikri import singleflight
+
+
+class RunTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def producer(self, report):
+        self.calls += 1
+        yield "first "
+        self.release.wait(5)
+        yield "second"
+
+    def test_followers_join_a_call_in_flight(self):
+        leader = singleflight.run("key", self.producer)
+        self.assertEqual(next(leader), "first ")
+        follower = singleflight.run("key", self.producer)
+        self.release.set()
+        self.assertEqual("".join(follower), "first second")
+        self.assertEqual("".join(leader), "second")
+        self.assertEqual(self.calls, 1)
+
+    def test_different_keys_do_not_share(self):
+        self.release.set()
+        self.assertEqual("".join(singleflight.run("a", self.producer)), "first second")
+        self.assertEqual("".join(singleflight.run("b", self.producer)), "first second")
+        self.assertEqual(self.calls, 2)
+
+    def test_followers_get_the_error(self):
+        def failing(report):
+            yield "partial"
+            self.release.wait(5)
+            raise RuntimeError("upstream failed")
+
+        leader = singleflight.run("failing", failing)
+        next(leader)
+        follower = singleflight.run("failing", failing)
+        self.release.set()
+        with self.assertRaises(RuntimeError):
+            "".join(follower)
+        with self.assertRaises(RuntimeError):
+            "".join(leader)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+Pre-generates the answers of pages whose inputs can all be enumerated, so
+that clicking their button is answered from the response cache.
+
+A project opts in with `warm = true` in its TOML file and lists every value
+of each input in a CHOICES dict in its module; music_recommendator has
+9 moods x 9 types x 2 languages = 162 answers. They are stored in the same
+SQLite cache the app reads, optionally as several variants per combination,
+one of which is picked at random on every click.
+
+    python warm_cache.py --report                  # coverage and staleness
+    python warm_cache.py --variants 3              # fill in what is missing or stale
+    python warm_cache.py --every 6                 # keep refreshing, every 6 hours
+
+Requests go through the same admission queue as the app's users, so a
+running warm-up never takes more than its fair share of the service.
+"""
+import argparse
+import itertools
+import logging
+import sys
+import time
+
+import projects
+from krikri import batch, cache, routing
+
+logger = logging.getLogger("warm_cache")
+
+# Entries older than this are generated again
+REFRESH_AFTER = 12 * 3600.0
+
+
+def warmable() -> list[projects.Plugin]:
+    """
+    The projects that opted in and load without errors.
+    """
+    plugins = [plugin.load() for plugin in projects.discover().values() if plugin.warm]
+    return [plugin for plugin in plugins if not plugin.error and plugin.choices and plugin.prompt]
+
+
+def combinations(plugin: projects.Plugin) -> list[dict]:
+    names = list(plugin.choices)
+    return [dict(zip(names, values)) for values in itertools.product(*plugin.choices.values())]
+
+
+def entries(plugin: projects.Plugin) -> list[tuple[str, str]]:
+    """
+    (prompt, cache key) for every combination of the project's inputs, for
+    the model of the project's configured route.
+    """
+    route = routing.route_for(plugin.id)
+    prompts = [plugin.prompt(**inputs) for inputs in combinations(plugin)]
+    return [(prompt, cache.make_key(prompt, route.model, route.temperature, route.top_p)) for prompt in prompts]
+
+
+def coverage(refresh_after: float = REFRESH_AFTER) -> list[dict]:
+    """
+    One row per warmable project: how many combinations are cached, how
+    many are stale, the fewest variants any has and the oldest entry's age.
+    """
+    now = time.time()
+    rows = []
+    for plugin in warmable():
+        infos = [cache.info(key) for _, key in entries(plugin)]
+        cached = [info for info in infos if info is not None]
+        ages = [now - info["created_at"] if info["created_at"] else float("inf") for info in cached]
+        rows.append({
+            "project": plugin.id,
+            "combinations": len(infos),
+            "cached": len(cached),
+            "coverage": round(len(cached) / len(infos), 3) if infos else 0.0,
+            "stale": sum(age > refresh_after for age in ages),
+            "variants": min((info["variants"] for info in cached), default=0),
+            "oldest (h)": round(max(ages) / 3600, 1) if ages and max(ages) != float("inf") else None,
+        })
+    return rows
+
+
+def warm(api_key: str, api_endpoint: str, variants: int = 1, refresh_after: float = REFRESH_AFTER,
+         ttl: float | None = None, concurrency: int | None = None, only: list[str] | None = None) -> dict:
+    """
+    Generates the answers that are missing, stale or short of variants, and
+    returns how many combinations were stored per project.
+    """
+    now = time.time()
+    stored = {}
+    for plugin in warmable():
+        if only and plugin.id not in only:
+            continue
+        entry_ttl = ttl or cache.ttl_for(plugin.id)
+        if entry_ttl is None:
+            logger.warning(f"Skipping {plugin.id}: the response cache is off for it")
+            continue
+        todo = []
+        for prompt, key in entries(plugin):
+            info = cache.info(key)
+            if (info is None or info["variants"] < variants or not info["created_at"]
+                    or now - info["created_at"] > refresh_after):
+                todo.append((prompt, key))
+        logger.info(f"{plugin.id}: {len(todo)} of {len(combinations(plugin))} combinations to generate")
+        if not todo:
+            stored[plugin.id] = 0
+            continue
+
+        prompts = [prompt for prompt, _ in todo for _ in range(variants)]
+        results = batch.query_llm_batch(prompts, api_key, api_endpoint, concurrency=concurrency,
+                                        project=plugin.id, session="warm", fresh=True)
+        stored[plugin.id] = 0
+        model = routing.route_for(plugin.id).model
+        for index, (_, key) in enumerate(todo):
+            # Answers from a fallback model would be stored under the primary model's key, and cut-off
+            # ones would still be served after the project's max_tokens grows
+            texts = [result["text"] for result in results[index * variants:(index + 1) * variants]
+                     if result["ok"] and result["text"] and not result["truncated"] and result["model"] == model]
+            texts = list(dict.fromkeys(texts))  # Identical variants add nothing
+            if texts:
+                cache.put(key, texts[0], entry_ttl, variants=texts)
+                stored[plugin.id] += 1
+    return stored
+
+
+def print_report(rows: list[dict]):
+    for row in rows:
+        oldest = f"{row['oldest (h)']}h" if row["oldest (h)"] is not None else "-"
+        print(f"{row['project']:<24} {row['cached']:>4}/{row['combinations']:<4} cached ({row['coverage']:.0%}), "
+              f"{row['stale']} stale, >= {row['variants']} variants, oldest {oldest}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate answers for pages with enumerable inputs.")
+    parser.add_argument("--report", action="store_true", help="Print coverage and staleness, and exit")
+    parser.add_argument("--projects", default="", help="Comma-separated project names (default: all that opted in)")
+    parser.add_argument("--variants", type=int, default=1, help="Answers kept per combination")
+    parser.add_argument("--refresh-after", type=float, default=REFRESH_AFTER / 3600,
+                        help="Hours after which an answer is generated again")
+    parser.add_argument("--ttl", type=float, default=0.0, help="Hours an answer stays valid (default from [LLM_CACHE])")
+    parser.add_argument("--every", type=float, default=0.0, help="Keep running, refreshing every this many hours")
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--api-key", default="")
+    parser.add_argument("--endpoint", default="")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    from krikri.settings import load_credentials  # Applies secrets.toml (including [LLM_CACHE]) too
+
+    api_key, api_endpoint = load_credentials(args.api_key, args.endpoint)
+    refresh_after = args.refresh_after * 3600
+    if args.report:
+        print_report(coverage(refresh_after))
+        return 0
+
+    while True:
+        started = time.perf_counter()
+        stored = warm(api_key, api_endpoint, variants=args.variants, refresh_after=refresh_after,
+                      ttl=args.ttl * 3600 or None, concurrency=args.concurrency,
+                      only=[name for name in args.projects.split(",") if name])
+        logger.info(f"Stored {sum(stored.values())} answers in {time.perf_counter() - started:.1f}s: {stored}")
+        print_report(coverage(refresh_after))
+        if not args.every:
+            return 0
+        time.sleep(args.every * 3600)
+
+
+if __name__ == "__main__":
+    sys.exit(main())